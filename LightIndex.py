@@ -0,0 +1,360 @@
+import fnmatch
+import heapq
+import math
+import re
+
+"""
+Indexes over the lights in a LightStore, used to filter the Lighting Manager
+
+NameIndex finds lights by name without looking at every light. Every name is
+broken into trigrams ("key_light" -> "key", "ey_", "y_l"...), each trigram
+points at the lights whose name contains it, and a search only checks the
+lights that share every trigram of what was typed. Light types and
+namespaces are kept as facets, sets of lights that can be intersected with
+any search.
+
+SpatialGrid finds lights by where they are. Space is cut into cubes, each
+cube knows the lights inside it, and radius, box and nearest light queries
+only look at the cubes they overlap. Moving a light is a dictionary update,
+so it can follow lights around as they're moved.
+
+Lights are keyed by their full DAG path, which doesn't change when rows move.
+
+Nothing in here talks to Maya, so it can be used outside of it.
+
+"""
+
+# search modes
+TEXT, GLOB, REGEX = 'text', 'glob', 'regex'
+
+# characters with a special meaning in glob patterns
+_globSpecial = re.compile(r'[*?\[\]]')
+# a [...] or [!...] class in a glob pattern, a ] straight after the [ is part of it
+_globClass = re.compile(r'\[!?\]?[^\]]*\]')
+
+
+def namespace(name):
+    # "set01:lamps:key" lives in the "set01:lamps" namespace, "key" in the root ""
+    return name.rpartition(':')[0]
+
+
+class NameIndex(object):
+
+    def __init__(self, size=3):
+        # length of the n-grams names are broken into
+        self.size = size
+        # key -> (lowercase name, light type, namespace)
+        self.entries = {}
+        # n-gram -> keys of the lights whose lowercase name contains it
+        self.grams = {}
+        # facet value -> keys
+        self.byType = {}
+        self.byNamespace = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def nGrams(self, text):
+        return set(text[i:i + self.size] for i in range(len(text) - self.size + 1))
+
+    def add(self, key, name, lightType):
+        # index a light, gives back True if it brought in a new type or namespace
+        if key in self.entries:
+            self.discard(key)
+
+        lowered = name.lower()
+        ns = namespace(name)
+        self.entries[key] = (lowered, lightType, ns)
+
+        for gram in self.nGrams(lowered):
+            self.grams.setdefault(gram, set()).add(key)
+
+        newFacet = lightType not in self.byType or ns not in self.byNamespace
+        self.byType.setdefault(lightType, set()).add(key)
+        self.byNamespace.setdefault(ns, set()).add(key)
+        return newFacet
+
+    def discard(self, key):
+        # drop a light, gives back True if that emptied out a type or namespace
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+
+        lowered, lightType, ns = entry
+        for gram in self.nGrams(lowered):
+            keys = self.grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self.grams[gram]
+
+        emptied = False
+        for facets, value in ((self.byType, lightType), (self.byNamespace, ns)):
+            keys = facets[value]
+            keys.discard(key)
+            if not keys:
+                del facets[value]
+                emptied = True
+        return emptied
+
+    def clear(self):
+        self.entries.clear()
+        self.grams.clear()
+        self.byType.clear()
+        self.byNamespace.clear()
+
+    def types(self):
+        return sorted(self.byType)
+
+    def namespaces(self):
+        return sorted(self.byNamespace)
+
+    def candidates(self, literal):
+        # keys whose name contains every n-gram of literal, or None when literal
+        # is too short to have any and every light is a candidate
+        grams = self.nGrams(literal)
+        if not grams:
+            return None
+
+        # intersect starting from the rarest n-gram so the working set stays small
+        postings = sorted((self.grams.get(gram, ()) for gram in grams), key=len)
+        keys = set(postings[0])
+        for posting in postings[1:]:
+            if not keys:
+                break
+            keys &= posting
+        return keys
+
+    def matcher(self, text, mode=TEXT):
+        # gives back (literal, test), literal narrows down candidates and
+        # test(name) has the final say. Raises re.error for a bad regex.
+        text = text.lower()
+
+        if mode == TEXT:
+            return text, lambda name: text in name
+
+        if mode == GLOB:
+            pattern = re.compile(fnmatch.translate(text))
+            # the longest run of plain characters in the pattern has to be in the
+            # name. What's in a class is one character out of many, not a run.
+            literal = max(_globSpecial.split(_globClass.sub('*', text)), key=len)
+            return literal, lambda name: pattern.match(name) is not None
+
+        pattern = re.compile(text, re.IGNORECASE)
+        return '', lambda name: pattern.search(name) is not None
+
+    def search(self, text='', mode=TEXT, lightType=None, ns=None):
+        # keys of every light matching the search, or None if nothing is filtered out
+        if not text and lightType is None and ns is None:
+            return None
+
+        keys = None
+        for facets, value in ((self.byType, lightType), (self.byNamespace, ns)):
+            if value is not None:
+                facet = facets.get(value, set())
+                keys = set(facet) if keys is None else keys & facet
+
+        if not text:
+            return keys
+
+        literal, test = self.matcher(text, mode)
+        candidates = self.candidates(literal)
+        if candidates is None:
+            candidates = self.entries if keys is None else keys
+        elif keys is not None:
+            candidates &= keys
+
+        # a name holding every trigram still needs checking, "abcab" has the
+        # trigrams of "abcabc" but doesn't contain it
+        entries = self.entries
+        return set(key for key in candidates if test(entries[key][0]))
+
+    def matches(self, key, text='', mode=TEXT, lightType=None, ns=None):
+        # does a single light pass the search
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+
+        lowered, entryType, entryNs = entry
+        if lightType is not None and entryType != lightType:
+            return False
+        if ns is not None and entryNs != ns:
+            return False
+        if not text:
+            return True
+        return self.matcher(text, mode)[1](lowered)
+
+
+class SpatialGrid(object):
+
+    def __init__(self, cellSize=10.0):
+        self.cellSize = float(cellSize)
+        # key -> (x, y, z)
+        self.positions = {}
+        # (i, j, k) cell -> keys of the lights in it
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    @classmethod
+    def fit(cls, items, perCell=2):
+        # a grid for (key, position) items with a cell size that puts around
+        # perCell lights in every occupied cell. Flat layouts like a city set
+        # are sized on the axes they spread over.
+        items = list(items)
+        cellSize = 10.0
+        if items:
+            extents = [max(p[axis] for key, p in items) - min(p[axis] for key, p in items) for axis in range(3)]
+            extents = [extent for extent in extents if extent > 1e-6]
+            if extents:
+                volume = 1.0
+                for extent in extents:
+                    volume *= extent
+                cellSize = (volume * perCell / len(items)) ** (1.0 / len(extents))
+
+        grid = cls(cellSize or 10.0)
+        for key, position in items:
+            grid.move(key, position)
+        return grid
+
+    def cell(self, position):
+        size = self.cellSize
+        return (int(math.floor(position[0] / size)),
+                int(math.floor(position[1] / size)),
+                int(math.floor(position[2] / size)))
+
+    def move(self, key, position):
+        # add a light, or move one that's already in
+        position = tuple(position)
+        cell = self.cell(position)
+        old = self.positions.get(key)
+        if old is not None:
+            oldCell = self.cell(old)
+            if oldCell != cell:
+                self.discardFromCell(oldCell, key)
+                self.cells.setdefault(cell, set()).add(key)
+        else:
+            self.cells.setdefault(cell, set()).add(key)
+        self.positions[key] = position
+
+    def discard(self, key):
+        position = self.positions.pop(key, None)
+        if position is not None:
+            self.discardFromCell(self.cell(position), key)
+
+    def discardFromCell(self, cell, key):
+        keys = self.cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self.cells[cell]
+
+    def clear(self):
+        self.positions.clear()
+        self.cells.clear()
+
+    def cellRange(self, low, high):
+        # keys of every light in the cells overlapping the low - high box
+        first = self.cell(low)
+        last = self.cell(high)
+        count = 1
+        for axis in range(3):
+            count *= last[axis] - first[axis] + 1
+
+        if count > len(self.cells):
+            # the box covers more cells than are in use, check the used ones instead
+            for cell, keys in self.cells.items():
+                if all(first[axis] <= cell[axis] <= last[axis] for axis in range(3)):
+                    for key in keys:
+                        yield key
+            return
+
+        cells = self.cells
+        for i in range(first[0], last[0] + 1):
+            for j in range(first[1], last[1] + 1):
+                for k in range(first[2], last[2] + 1):
+                    for key in cells.get((i, j, k), ()):
+                        yield key
+
+    def box(self, low, high):
+        # keys of the lights inside the box from low to high
+        positions = self.positions
+        return set(key for key in self.cellRange(low, high)
+                   if all(low[axis] <= positions[key][axis] <= high[axis] for axis in range(3)))
+
+    def radius(self, center, radius):
+        # keys of the lights within radius of center
+        x, y, z = center
+        low = (x - radius, y - radius, z - radius)
+        high = (x + radius, y + radius, z + radius)
+        limit = radius * radius
+        positions = self.positions
+        return set(key for key in self.cellRange(low, high)
+                   if distance2(center, positions[key]) <= limit)
+
+    def nearest(self, point, count=1):
+        # (distance, key) of the count lights closest to point, closest first.
+        # Cells are searched in growing shells around point, a light in a shell
+        # past ring r is at least r cells away, so the search stops once the
+        # lights found so far are all closer than that.
+        count = min(count, len(self.positions))
+        if count <= 0:
+            return []
+
+        positions = self.positions
+        center = self.cell(point)
+        found = []
+        ring = 0
+        while True:
+            if shellSize(ring) > len(self.cells):
+                # the shells have grown past the lights, just look at all of them
+                found = [(distance2(point, position), key) for key, position in positions.items()]
+                break
+
+            for cell in shell(center, ring):
+                for key in self.cells.get(cell, ()):
+                    found.append((distance2(point, positions[key]), key))
+
+            if len(found) >= count:
+                reach = ring * self.cellSize
+                if heapq.nsmallest(count, found)[-1][0] <= reach * reach:
+                    break
+            ring += 1
+
+        return [(math.sqrt(d), key) for d, key in heapq.nsmallest(count, found)]
+
+
+def distance2(a, b):
+    # squared distance, saves a square root when only comparing
+    dx = a[0] - b[0]
+    dy = a[1] - b[1]
+    dz = a[2] - b[2]
+    return dx * dx + dy * dy + dz * dz
+
+
+def shellSize(ring):
+    # number of cells in the shell ring cells out from a cell
+    if ring == 0:
+        return 1
+    return (2 * ring + 1) ** 3 - (2 * ring - 1) ** 3
+
+
+def shell(center, ring):
+    # cells exactly ring cells out from center, the surface of a cube
+    ci, cj, ck = center
+    for di in range(-ring, ring + 1):
+        for dj in range(-ring, ring + 1):
+            if abs(di) == ring or abs(dj) == ring:
+                # on a face, the whole column is in the shell
+                for dk in range(-ring, ring + 1):
+                    yield (ci + di, cj + dj, ck + dk)
+            elif ring:
+                yield (ci + di, cj + dj, ck - ring)
+                yield (ci + di, cj + dj, ck + ring)
+            else:
+                yield (ci, cj, ck)
@@ -0,0 +1,182 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+"""
+Profiling spans for the Lighting Manager
+
+Set the LIGHTING_MANAGER_PROFILE environment variable before starting Maya to
+record how long every manager operation takes:
+
+    LIGHTING_MANAGER_PROFILE=1 maya
+
+Spans are recorded with span() or the profiled() decorator. When profiling is
+off span() hands back a shared do-nothing object and profiled() returns the
+function untouched, so instrumented code costs next to nothing.
+
+Recorded spans can be written out as a Chrome trace (open chrome://tracing or
+https://ui.perfetto.dev and load the file) or summarized as a text table.
+
+"""
+
+logger = logging.getLogger('LightingManager.LightProfiler')
+
+
+def _limit(value, default):
+    # a span limit from the environment, a bad one mustn't stop the manager from opening
+    if not value:
+        return default
+    try:
+        limit = int(value)
+        if limit < 0:
+            raise ValueError(value)
+    except ValueError:
+        logger.warning('LIGHTING_MANAGER_PROFILE_LIMIT should be a whole number of spans, not %r. Using %d'
+                       % (value, default))
+        return default
+    return limit
+
+
+# flags from environment variables
+PROFILE = bool(os.getenv('LIGHTING_MANAGER_PROFILE'))
+PROFILE_LIMIT = _limit(os.getenv('LIGHTING_MANAGER_PROFILE_LIMIT'), 100000)
+
+# perf_counter doesn't exist in python 2, fall back to the wall clock there
+_clock = getattr(time, 'perf_counter', time.time)
+
+# finished spans as (name, start, duration, threadId, args) tuples.
+# Oldest spans fall off the end so a long session can't eat all the memory.
+_events = collections.deque(maxlen=PROFILE_LIMIT)
+
+
+class _Span(object):
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        end = _clock()
+        _events.append((self.name, self.start, end - self.start,
+                        threading.current_thread().ident, self.args))
+        return False
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# a single instance is handed out for every span while profiling is off
+_nullSpan = _NullSpan()
+
+
+def span(name, **args):
+    # time a block of code: with span('populate'): ...
+    if not PROFILE:
+        return _nullSpan
+    return _Span(name, args or None)
+
+
+def profiled(name=None):
+    # decorator version of span, named after the function unless told otherwise
+    def decorator(func):
+        if not PROFILE:
+            return func
+
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(label, None):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def clear():
+    _events.clear()
+
+
+def events():
+    return list(_events)
+
+
+def summary():
+    # gives back (name, count, total, mean, max) rows with the most expensive span first
+    totals = {}
+    for name, start, duration, tid, args in list(_events):
+        row = totals.get(name)
+        if row is None:
+            totals[name] = [1, duration, duration]
+        else:
+            row[0] += 1
+            row[1] += duration
+            row[2] = max(row[2], duration)
+
+    rows = [(name, count, total, total / count, longest)
+            for name, (count, total, longest) in totals.items()]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows
+
+
+def summaryTable(limit=None):
+    # text table of summary(), times are in milliseconds
+    rows = summary()
+    if limit:
+        rows = rows[:limit]
+
+    width = max([len(row[0]) for row in rows] + [4])
+    lines = ['%-*s %7s %10s %10s %10s' % (width, 'span', 'count', 'total', 'mean', 'max')]
+    for name, count, total, mean, longest in rows:
+        lines.append('%-*s %7d %10.2f %10.2f %10.2f' % (
+            width, name, count, total * 1000.0, mean * 1000.0, longest * 1000.0))
+    return '\n'.join(lines)
+
+
+def summaryLine(limit=3):
+    # one line version of the summary that fits in a status bar
+    return ' | '.join('%s %.1fms x%d' % (name, total * 1000.0, count)
+                      for name, count, total, mean, longest in summary()[:limit])
+
+
+def exportChromeTrace(path):
+    # write the recorded spans in the Chrome trace event format
+    pid = os.getpid()
+    traceEvents = []
+    for name, start, duration, tid, args in list(_events):
+        event = {
+            'name': name,
+            'cat': 'LightingManager',
+            'ph': 'X',
+            # trace timestamps and durations are in microseconds
+            'ts': start * 1e6,
+            'dur': duration * 1e6,
+            'pid': pid,
+            'tid': tid,
+        }
+        if args:
+            event['args'] = args
+        traceEvents.append(event)
+
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': traceEvents, 'displayTimeUnit': 'ms'}, f, default=str)
+
+    return path
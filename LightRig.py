@@ -0,0 +1,1419 @@
+import argparse
+import bz2
+import gzip
+import io
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+try:
+    import lzma
+except ImportError:
+    # python 2 doesn't come with lzma
+    lzma = None
+
+"""
+Light rig files for the Lighting Manager
+
+A rig file is a JSON dictionary of light name -> light, in the format
+LightStore.toDict() writes. Lights saved with animation also have an
+"animation" dictionary of channel -> [frames, values]: keys that rebuild the
+sampled animation with linear interpolation. Channels that never change
+aren't stored at all, their value is already in the light.
+
+Rig files carry the version of their light format under "#version", written
+ahead of the lights. JSON rigs are decoded a light at a time straight from the
+file, and lights from older files are brought up to date one at a time as
+they're read and checked against the schema before anything is made from them.
+
+Rigs can also be written to and read from USD text files (.usda) as UsdLux
+lights, without needing USD's own pxr library. Both directions stream a
+light at a time, a 50k light layer never has to be in memory as a whole.
+
+Binary rig files (.lrig) hold the same lights as typed arrays, a column per
+value, which reads and writes much faster than JSON for big rigs.
+
+JSON rigs can be written compact: attributes holding the value most lights
+have are left out, light types are listed once, and values that come up
+more than once are kept in a palette the lights point into. Reading one
+expands every light back to exactly what was saved.
+
+Any of them can be compressed with gzip, bz2 or lzma. A compressed rig keeps
+its extension, it's recognised by the bytes it starts with and read through
+the codec as it goes. Find out what each codec buys on a rig of your own:
+
+    python LightRig.py benchmark big.json --levels 1 6 9
+
+Run as a script to validate, convert, merge or diff rig files in bulk, every
+file is handled in a process pool:
+
+    python LightRig.py convert rigs/ --to usda --jobs 8 --report report.jsonl
+    python LightRig.py diff old.json new.json
+
+usda files hold a single frame, a conversion that leaves animation out is
+reported as "lossy".
+
+Nothing in here talks to Maya, so it can be used outside of it.
+
+"""
+
+
+# channels keyed with stepped tangents, each key holds until the next one
+STEPPED_CHANNELS = ('visibility',)
+
+
+def compressChannel(frames, values, tolerance=0.0, stepped=False):
+    # [frames, values] of the keys that rebuild a sampled channel to within
+    # tolerance, or None when the channel holds still. A tolerance of 0 only
+    # drops keys that sit on a straight line (linear runs become their two
+    # ends), anything above that also drops keys that are close enough.
+    # A stepped channel keeps a key wherever its value changes, leaving one
+    # out would be off by the whole step whatever the tolerance.
+    if stepped:
+        if not values or min(values) == max(values):
+            return None
+        keep = [0] + [i for i in range(1, len(values)) if values[i] != values[i - 1]]
+        return [[frames[i] for i in keep], [values[i] for i in keep]]
+
+    if not values or max(values) - min(values) <= tolerance:
+        return None
+
+    # tiny slack so floating point noise on a straight line doesn't keep keys
+    tolerance = max(tolerance, 1e-9 * max(abs(value) for value in values))
+    keep = simplify(frames, values, tolerance)
+    return [[frames[i] for i in keep], [values[i] for i in keep]]
+
+
+def simplify(frames, values, tolerance):
+    # indexes of the samples to key, Ramer-Douglas-Peucker: keep both ends, then
+    # keep splitting at the sample furthest from the line between the kept
+    # samples until every sample is within tolerance of it. Distances are
+    # measured in value only, the same as the error of the rebuilt curve.
+    keep = set([0, len(values) - 1])
+    # a stack instead of recursion, long animations would run out of frames
+    spans = [(0, len(values) - 1)]
+    while spans:
+        first, last = spans.pop()
+        if last - first < 2:
+            continue
+
+        start = values[first]
+        slope = (values[last] - start) / float(frames[last] - frames[first])
+        worst = 0.0
+        split = None
+        for i in range(first + 1, last):
+            error = abs(values[i] - (start + slope * (frames[i] - frames[first])))
+            if error > worst:
+                worst = error
+                split = i
+
+        if worst > tolerance:
+            keep.add(split)
+            spans.append((first, split))
+            spans.append((split, last))
+
+    return sorted(keep)
+
+
+def evaluateChannel(keys, frame, stepped=False):
+    # value of a compressed channel on frame, held flat past either end
+    frames, values = keys
+    if frame <= frames[0]:
+        return values[0]
+    if frame >= frames[-1]:
+        return values[-1]
+
+    # bisect for the keys either side of frame
+    low, high = 0, len(frames) - 1
+    while high - low > 1:
+        middle = (low + high) // 2
+        if frames[middle] <= frame:
+            low = middle
+        else:
+            high = middle
+
+    if stepped:
+        return values[low]
+    blend = (frame - frames[low]) / float(frames[high] - frames[low])
+    return values[low] + (values[high] - values[low]) * blend
+
+
+# UsdLux prim type each Maya light type is written as, plugin light types are
+# written as sphere lights. The Maya type is kept in a custom attribute so it
+# comes back the same.
+USD_LIGHT_TYPES = {
+    'pointLight': 'SphereLight',
+    'spotLight': 'SphereLight',
+    'volumeLight': 'SphereLight',
+    'areaLight': 'RectLight',
+    'directionalLight': 'DistantLight',
+}
+# and back, for files that didn't come from here
+MAYA_LIGHT_TYPES = {
+    'SphereLight': 'pointLight',
+    'DiskLight': 'areaLight',
+    'RectLight': 'areaLight',
+    'DistantLight': 'directionalLight',
+}
+# USD rotate ops for Maya's rotateOrder values
+ROTATE_OPS = ('rotateXYZ', 'rotateYZX', 'rotateZXY', 'rotateXZY', 'rotateYXZ', 'rotateZYX')
+# keys of a light a usda file keeps, animation and anything else is left out
+USDA_KEYS = ('lightType', 'intensity', 'color', 'visibility', 'translate', 'rotation', 'rotateOrder', 'matrix',
+             'parent')
+
+_primNameInvalid = re.compile(r'[^A-Za-z0-9_]')
+_primHeader = re.compile(r'^(def|over|class)\s+(?:(\w+)\s+)?"([^"]*)"')
+_attribute = re.compile(r'^(?:custom\s+)?(?:uniform\s+)?([\w\[\]]+)\s+([\w:.]+)\s*=\s*(.*)$')
+_words = {'inf': 'Infinity', '-inf': '-Infinity', 'nan': 'NaN'}
+
+
+def writeUsda(f, lights, metersPerUnit=0.01):
+    # write (name, light) pairs to an open text file as UsdLux prims under /Lights,
+    # lights can be any iterable and are written as they come
+    f.write('#usda 1.0\n(\n    defaultPrim = "Lights"\n    doc = "Lighting Manager light rig"\n'
+            '    metersPerUnit = %r\n    upAxis = "Y"\n)\n\ndef Xform "Lights"\n{\n' % float(metersPerUnit))
+
+    # prim names have to be unique, only their names are kept around
+    used = set()
+    for name, light in lights:
+        f.write(usdaPrim(primName(name, used), name, light))
+
+    f.write('}\n')
+
+
+def primName(name, used):
+    # a valid, unused prim name for a Maya name, "set01:key" becomes "set01_key"
+    base = _primNameInvalid.sub('_', name) or '_'
+    if base[0].isdigit():
+        base = '_' + base
+    unique = base
+    count = 1
+    while unique in used:
+        unique = '%s_%d' % (base, count)
+        count += 1
+    used.add(unique)
+    return unique
+
+
+def usdaPrim(prim, name, light):
+    # a single light as a usda prim block
+    lightType = light.get('lightType') or 'pointLight'
+    lines = [
+        '    def %s "%s"' % (USD_LIGHT_TYPES.get(lightType, 'SphereLight'), prim),
+        '    {',
+        '        custom string lightingManager:lightType = %s' % json.dumps(lightType),
+        '        custom string lightingManager:name = %s' % json.dumps(name),
+        '        color3f inputs:color = %s' % usdaValue(light.get('color') or (1.0, 1.0, 1.0)),
+        '        float inputs:intensity = %s' % usdaValue(light.get('intensity', 1.0)),
+    ]
+    if lightType == 'pointLight':
+        lines.append('        bool treatAsPoint = 1')
+    lines.append('        token visibility = "%s"' % ('inherited' if light.get('visibility', True) else 'invisible'))
+
+    if 'parent' in light:
+        # no parent is written as ""
+        lines.append('        custom string lightingManager:parent = %s' % json.dumps(light['parent'] or ''))
+
+    matrix = light.get('matrix')
+    if matrix:
+        # the world matrix, rows are 4 values each the same way as Maya's. The
+        # rotate order it's decomposed with on import rides along.
+        if 'rotateOrder' in light:
+            lines.append('        custom int lightingManager:rotateOrder = %d' % light['rotateOrder'])
+        rows = [matrix[i:i + 4] for i in range(0, 16, 4)]
+        lines.append('        matrix4d xformOp:transform = %s' % usdaValue(rows))
+        lines.append('        uniform token[] xformOpOrder = ["xformOp:transform"]')
+    else:
+        rotateOp = ROTATE_OPS[light.get('rotateOrder') or 0]
+        lines.append('        double3 xformOp:translate = %s' % usdaValue(light.get('translate') or (0.0, 0.0, 0.0)))
+        lines.append('        float3 xformOp:%s = %s' % (rotateOp, usdaValue(light.get('rotation') or (0.0, 0.0, 0.0))))
+        lines.append('        uniform token[] xformOpOrder = ["xformOp:translate", "xformOp:%s"]' % rotateOp)
+
+    lines.append('    }')
+    lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def usdaValue(value):
+    # numbers as they were, exact doubles round trip through repr. Tuples in usda
+    # use parentheses.
+    if isinstance(value, (list, tuple)):
+        return '(%s)' % ', '.join(usdaValue(item) for item in value)
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value))
+
+
+def readUsda(f):
+    # (name, light) for every light prim in an open usda file, read a line at a
+    # time. Handles the files writeUsda writes and the plain UsdLux layers other
+    # tools write, time samples and anything else that isn't a plain value is skipped.
+    # open blocks, a dict of attributes for a light prim or None for anything else
+    stack = []
+    header = None
+    statement = ''
+    depth = 0
+
+    for line in f:
+        line = _stripComment(line).strip()
+        if not line:
+            continue
+
+        if statement or depth:
+            # a value or metadata running on over several lines
+            statement += ' ' + line
+            depth += _depth(line)
+            if depth > 0:
+                continue
+            line, statement, depth = statement, '', 0
+            if header is not None and line.startswith('('):
+                # the metadata of the prim whose block is coming up, not needed
+                if line.endswith('{'):
+                    stack.append(_newPrim(header))
+                    header = None
+                continue
+
+        match = _primHeader.match(line)
+        if match:
+            specifier, primType, prim = match.groups()
+            header = (primType or '', prim)
+            rest = line[match.end():].strip()
+            opens = rest.endswith('{')
+            if opens:
+                rest = rest[:-1]
+            depth = _depth(rest)
+            if depth > 0:
+                # metadata block opens on the header line
+                statement = rest
+            elif opens:
+                stack.append(_newPrim(header))
+                header = None
+            continue
+
+        if line == '(' and header is not None:
+            statement, depth = line, 1
+            continue
+
+        if line.startswith('{'):
+            stack.append(_newPrim(header) if header is not None else None)
+            header = None
+            continue
+
+        if line.startswith('}'):
+            if stack:
+                prim = stack.pop()
+                if prim is not None and prim['isLight']:
+                    yield _lightFromPrim(prim)
+            continue
+
+        match = _attribute.match(line)
+        if match and stack and stack[-1] is not None:
+            valueType, attr, value = match.groups()
+            depth = _depth(value)
+            if depth > 0:
+                statement = line
+                continue
+            stack[-1]['attributes'][attr] = _parseValue(value)
+
+
+def _newPrim(header):
+    primType, prim = header
+    return {'type': primType, 'name': prim, 'attributes': {}, 'isLight': primType.endswith('Light')}
+
+
+def _lightFromPrim(prim):
+    # a light in the format LightStore.appendDict takes
+    attributes = prim['attributes']
+    light = {
+        'lightType': attributes.get('lightingManager:lightType') or MAYA_LIGHT_TYPES.get(prim['type'], 'pointLight'),
+        'intensity': attributes.get('inputs:intensity', 1.0),
+        'color': list(attributes.get('inputs:color') or (1.0, 1.0, 1.0)),
+        'visibility': attributes.get('visibility', 'inherited') != 'invisible',
+    }
+    # exposure doubles the light per stop, Maya lights only have intensity
+    exposure = attributes.get('inputs:exposure')
+    if exposure:
+        light['intensity'] *= 2.0 ** exposure
+
+    if 'lightingManager:parent' in attributes:
+        light['parent'] = attributes['lightingManager:parent'] or None
+
+    matrix = attributes.get('xformOp:transform')
+    if matrix:
+        light['matrix'] = [value for row in matrix for value in row]
+        if 'lightingManager:rotateOrder' in attributes:
+            light['rotateOrder'] = attributes['lightingManager:rotateOrder']
+    translate = attributes.get('xformOp:translate') or (light['matrix'][12:15] if matrix else (0.0, 0.0, 0.0))
+    light['translate'] = list(translate)
+    for order, op in enumerate(ROTATE_OPS):
+        if 'xformOp:' + op in attributes:
+            light['rotation'] = list(attributes['xformOp:' + op])
+            light['rotateOrder'] = order
+            break
+    else:
+        light['rotation'] = [0.0, 0.0, 0.0]
+
+    return attributes.get('lightingManager:name') or prim['name'], light
+
+
+def _outsideStrings(text):
+    # (character, is it outside of a quoted string) for every character
+    quoted = False
+    escaped = False
+    for c in text:
+        if quoted:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                quoted = False
+            yield c, False
+        else:
+            if c == '"':
+                quoted = True
+                yield c, False
+            else:
+                yield c, True
+
+
+def _stripComment(line):
+    for i, (c, outside) in enumerate(_outsideStrings(line)):
+        if outside and c == '#':
+            return line[:i]
+    return line
+
+
+def _depth(text):
+    # how many more brackets text opens than it closes
+    depth = 0
+    for c, outside in _outsideStrings(text):
+        if outside:
+            if c in '([{':
+                depth += 1
+            elif c in ')]}':
+                depth -= 1
+    return depth
+
+
+def _parseValue(text):
+    # a usda value as python, tuples become lists. None for anything that isn't
+    # a plain value (connections, time sample dictionaries...)
+    chars = []
+    for c, outside in _outsideStrings(text.strip()):
+        if outside and c == '(':
+            c = '['
+        elif outside and c == ')':
+            c = ']'
+        chars.append(c)
+    text = ''.join(chars)
+    text = re.sub(r'(?<![\w"])-?(?:inf|nan)\b', lambda match: _words[match.group(0)], text)
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+# binary rig files: magic, version and light count, a JSON header with the
+# names, light types and anything that isn't a column, then the columns
+BINARY_MAGIC = b'LRIG'
+BINARY_VERSION = 1
+_binaryHeader = struct.Struct('<4sHI')
+_binaryLength = struct.Struct('<I')
+# (key, array type, values per light, default) of every column
+BINARY_COLUMNS = (
+    ('translate', 'd', 3, (0.0, 0.0, 0.0)),
+    ('rotation', 'd', 3, (0.0, 0.0, 0.0)),
+    ('intensity', 'd', 1, 1.0),
+    ('color', 'd', 3, (1.0, 1.0, 1.0)),
+    ('visibility', 'b', 1, True),
+    ('rotateOrder', 'b', 1, 0),
+)
+
+# rig file extension -> format
+FORMATS = {'.json': 'json', '.usda': 'usda', '.lrig': 'binary'}
+EXTENSIONS = dict((fileFormat, extension) for extension, fileFormat in FORMATS.items())
+
+
+def writeBinary(f, lights):
+    # write (name, light) pairs to a file opened in binary mode
+    lights = list(lights)
+    names = [name for name, light in lights]
+    typeNames = []
+    typeCodes = {}
+    types = array('H')
+    for name, light in lights:
+        lightType = light.get('lightType')
+        if lightType not in typeCodes:
+            typeCodes[lightType] = len(typeNames)
+            typeNames.append(lightType)
+        types.append(typeCodes[lightType])
+
+    columns = [('types', types)]
+    known = set(['lightType'])
+    for key, typecode, width, default in BINARY_COLUMNS:
+        values = array(typecode)
+        for name, light in lights:
+            value = light.get(key, default)
+            if width == 1:
+                values.append(value)
+            else:
+                values.extend(value)
+        columns.append((key, values))
+        known.add(key)
+
+    # world matrices are a column when every light has one
+    if lights and all(light.get('matrix') for name, light in lights):
+        matrices = array('d')
+        for name, light in lights:
+            matrices.extend(light['matrix'])
+        columns.append(('matrix', matrices))
+        known.add('matrix')
+
+    # parents, animation and anything else ride along in the header
+    extras = {}
+    for row, (name, light) in enumerate(lights):
+        extra = dict((key, value) for key, value in light.items() if key not in known)
+        if extra:
+            extras[str(row)] = extra
+
+    header = json.dumps({'names': names, 'typeNames': typeNames, 'columns': [key for key, values in columns],
+                         'extras': extras, 'rigVersion': RIG_VERSION}).encode('utf-8')
+    f.write(_binaryHeader.pack(BINARY_MAGIC, BINARY_VERSION, len(lights)))
+    f.write(_binaryLength.pack(len(header)))
+    f.write(header)
+    for key, values in columns:
+        if sys.byteorder == 'big':
+            values.byteswap()
+        f.write(_arrayBytes(values))
+
+
+def readBinary(f):
+    # the rig in a binary rig file opened in binary mode. A damaged file
+    # raises ValueError saying what's wrong with it.
+    magic, version, count = _binaryHeader.unpack(_readBytes(f, _binaryHeader.size, 'header'))
+    if magic != BINARY_MAGIC:
+        raise ValueError('not a binary light rig')
+    if version > BINARY_VERSION:
+        raise ValueError('binary light rig version %d is newer than this tool' % version)
+
+    length, = _binaryLength.unpack(_readBytes(f, _binaryLength.size, 'header'))
+    header = json.loads(_readBytes(f, length, 'header').decode('utf-8'))
+    if not isinstance(header, dict):
+        raise ValueError('binary light rig header is not a dictionary')
+    names = header.get('names')
+    typeNames = header.get('typeNames')
+    keys = header.get('columns')
+    extras = header.get('extras', {})
+    if not isinstance(names, list) or len(names) != count:
+        raise ValueError('binary light rig has %d lights but %s names' %
+                         (count, len(names) if isinstance(names, list) else 'no'))
+    if not all(_isString(name) for name in names):
+        raise ValueError('binary light rig has a name that is not a string')
+    if not isinstance(typeNames, list) or not isinstance(keys, list) or 'types' not in keys:
+        raise ValueError('binary light rig header has no light types')
+    if not isinstance(extras, dict) or not all(isinstance(extra, dict) for extra in extras.values()):
+        raise ValueError('binary light rig header has damaged extras')
+
+    layout = dict((key, (typecode, width)) for key, typecode, width, default in BINARY_COLUMNS)
+    layout['types'] = ('H', 1)
+    layout['matrix'] = ('d', 16)
+    columns = {}
+    for key in keys:
+        if key not in layout:
+            raise ValueError('binary light rig has an unknown column %r' % (key,))
+        typecode, width = layout[key]
+        values = array(typecode)
+        _arrayFromBytes(values, _readBytes(f, values.itemsize * width * count, key))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        columns[key] = (values, width)
+
+    types = columns['types'][0]
+    if types and max(types) >= len(typeNames):
+        raise ValueError('binary light rig has a light type that is not in its header')
+
+    lights = {}
+    for row, name in enumerate(names):
+        light = {'lightType': typeNames[types[row]]}
+        for key, (values, width) in columns.items():
+            if key == 'types':
+                continue
+            if width == 1:
+                light[key] = values[row]
+            else:
+                light[key] = list(values[row * width:row * width + width])
+        if 'visibility' in light:
+            light['visibility'] = bool(light['visibility'])
+        light.update(extras.get(str(row), {}))
+        lights[name] = light
+    lights[VERSION_KEY] = header.get('rigVersion', RIG_VERSION)
+    return lights
+
+
+def _readBytes(f, size, part):
+    # exactly size bytes, a file that ends early has been cut short
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('binary light rig is cut short in its %s' % part)
+    return data
+
+
+def _arrayBytes(values):
+    # tostring was renamed tobytes in python 3
+    return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+
+def _arrayFromBytes(values, data):
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+
+# streaming codecs rig files can be compressed with, and the bytes their files start with
+COMPRESSION = {'gzip': b'\x1f\x8b', 'bz2': b'BZh', 'lzma': b'\xfd7zXZ\x00'}
+
+
+# what the codecs raise reading a damaged or cut short file
+_codecErrors = (EOFError, IOError, OSError, zlib.error) + ((lzma.LZMAError,) if lzma else ())
+
+
+def rigCompression(path):
+    # the codec a rig file was compressed with, None for a plain file
+    with open(path, 'rb') as f:
+        start = f.read(6)
+    for compression, magic in COMPRESSION.items():
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def openRig(path, mode='r', compression=None, level=None):
+    # open a rig file ('r', 'w', 'rb' or 'wb') through the codec it's compressed
+    # with, None for a plain file. level is the codec's own, 1 is fastest and 9
+    # smallest. Reads and writes stream, nothing is decompressed up front.
+    if compression is None:
+        return open(path, mode)
+
+    writing = mode.startswith('w')
+    raw = 'wb' if writing else 'rb'
+    if compression == 'gzip':
+        f = gzip.GzipFile(path, raw, compresslevel=9 if level is None else level)
+    elif compression == 'bz2':
+        f = bz2.BZ2File(path, raw, compresslevel=9 if level is None else level)
+    elif compression == 'lzma':
+        if lzma is None:
+            raise ValueError('lzma compressed rig files need python 3')
+        f = lzma.LZMAFile(path, raw, preset=level if writing else None)
+    else:
+        raise ValueError('unknown compression %r' % compression)
+
+    # python 2 reads and writes text as bytes anyway
+    if mode.endswith('b') or bytes is str:
+        return f
+    return io.TextIOWrapper(f, encoding='utf-8')
+
+
+def rigFormat(path):
+    # json, usda or binary from a file's extension
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError('unknown light rig extension %r' % extension)
+    return FORMATS[extension]
+
+
+def readRig(path):
+    # the rig in a file of any format as it was saved, use iterLights or
+    # validateRig to get at its lights. A damaged file raises ValueError.
+    return dict(iterRig(path))
+
+
+def iterRig(path):
+    # (key, value) of every light and header entry of a rig file in the order
+    # they were saved, read a light at a time as they're asked for. JSON and
+    # usda files are never in memory as a whole, binary files are read in one
+    # go as their lights are stored a column at a time. Give it to iterLights
+    # or validateRig to get lights brought up to the current version as they're
+    # read. A damaged file raises ValueError.
+    fileFormat = rigFormat(path)
+    compression = rigCompression(path)
+    try:
+        if fileFormat == 'binary':
+            with openRig(path, 'rb', compression) as f:
+                rig = readBinary(f)
+            yield VERSION_KEY, rig.pop(VERSION_KEY)
+            for record in rig.items():
+                yield record
+            return
+
+        with openRig(path, 'r', compression) as f:
+            if fileFormat == 'usda':
+                # read in as the current version
+                records = readUsda(f)
+                yield VERSION_KEY, RIG_VERSION
+            else:
+                records = readJson(f)
+            for record in records:
+                yield record
+    except _codecErrors as error:
+        if compression is None:
+            raise
+        # the file could be opened, so it's the compressed data that's bad
+        raise ValueError('%s data is damaged or cut short: %s' % (compression, error or type(error).__name__))
+
+
+def readJson(f, size=65536):
+    # (key, value) of every entry of the JSON object in an open file, decoded
+    # an entry at a time from chunks of the file as they're asked for. What
+    # isn't a JSON object, or is cut short, raises ValueError.
+    chunks = _JsonChunks(f, size)
+    chunks.expect('{')
+    if chunks.peek() == '}':
+        chunks.expect('}')
+    else:
+        while True:
+            key = chunks.key()
+            yield key, chunks.decode()
+            if chunks.expect(',}') == '}':
+                break
+    if chunks.peek():
+        raise ValueError('extra data after the JSON object at character %d' % chunks.offset)
+
+
+class _JsonChunks(object):
+    # the text of a file read a chunk at a time, for decoding JSON a value at
+    # a time without the whole file ever being in memory
+    _space = re.compile(r'[ \t\n\r]*')
+    # a key with nothing in it to unescape, and the colon after it
+    _plainKey = re.compile(r'[ \t\n\r]*"([\w|:#.-]*)"[ \t\n\r]*:[ \t\n\r]*')
+
+    def __init__(self, f, size):
+        self.f = f
+        self.size = size
+        self.decoder = json.JSONDecoder()
+        self.text = ''
+        self.position = 0
+        self.ended = False
+        # characters of the file that came before text
+        self.dropped = 0
+
+    @property
+    def offset(self):
+        return self.dropped + self.position
+
+    def read(self):
+        # read on into text, at least as much again as what's waiting so a big
+        # value is only decoded over a few times. False at the end of the file.
+        if self.ended:
+            return False
+        if self.position:
+            self.dropped += self.position
+            self.text = self.text[self.position:]
+            self.position = 0
+        chunk = self.f.read(max(self.size, len(self.text)))
+        if not chunk:
+            self.ended = True
+            return False
+        self.text += chunk
+        return True
+
+    def peek(self):
+        # the next character that isn't white space, '' at the end of the file
+        while True:
+            self.position = self._space.match(self.text, self.position).end()
+            if self.position < len(self.text) or not self.read():
+                return self.text[self.position:self.position + 1]
+
+    def expect(self, characters):
+        # the next character, which has to be one of characters
+        found = self.peek()
+        if not found or found not in characters:
+            raise ValueError('expected %s at character %d of the JSON, found %r' %
+                             (' or '.join(repr(character) for character in characters), self.offset,
+                              found or 'the end of the file'))
+        self.position += 1
+        return found
+
+    def key(self):
+        # the key of an entry and the colon after it, plain names are matched
+        # as they are, the rest are decoded like any other string
+        match = self._plainKey.match(self.text, self.position)
+        if match and match.end() < len(self.text):
+            self.position = match.end()
+            return match.group(1)
+        key = self.decode()
+        if not _isString(key):
+            raise ValueError('a JSON key is not a string: %r' % (key,))
+        self.expect(':')
+        return key
+
+    def decode(self):
+        # the next JSON value. One that runs up to the end of the text might go
+        # on in the next chunk, a number could be cut in two.
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.position)
+            except ValueError:
+                # white space ahead of the value, or a value that goes on in the next chunk
+                start = self.offset
+                if not self.peek() or (self.offset == start and not self.read()):
+                    raise ValueError('the JSON is damaged or cut short at character %d' % self.offset)
+                continue
+            if end < len(self.text) or not self.read():
+                self.position = end
+                return value
+
+
+def writeRig(path, lights, metersPerUnit=0.01, compression=None, level=None, compact=False):
+    # write a name -> light dict of current version lights to a rig file, the
+    # format comes from the extension. The file is written next to path and
+    # moved over it once it's complete, nobody ever reads half a rig. compact
+    # only changes JSON files, the others are packed already. The header of a
+    # JSON file goes ahead of the lights, the version last, so a reader has
+    # everything it needs to bring a light up to date by the time it reads it.
+    fileFormat = rigFormat(path)
+    temp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+    try:
+        with openRig(temp, 'wb' if fileFormat == 'binary' else 'w', compression, level) as f:
+            if fileFormat == 'binary':
+                writeBinary(f, lights.items())
+            elif fileFormat == 'usda':
+                writeUsda(f, lights.items(), metersPerUnit)
+            elif compact:
+                lights = compactRig(lights)
+                rig = OrderedDict([(COMPACT_KEY, lights.pop(COMPACT_KEY)), (VERSION_KEY, RIG_VERSION)])
+                rig.update(lights)
+                json.dump(rig, f, separators=(',', ':'))
+            else:
+                rig = OrderedDict([(VERSION_KEY, RIG_VERSION)])
+                rig.update(lights)
+                json.dump(rig, f, indent=4)
+        _replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def _replace(source, destination):
+    # os.replace is python 3 only, and a rename won't go over a file on windows
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+        return
+    if os.name == 'nt' and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+
+# version of the lights rig files are written with. Files from before
+# versions were saved are version 0.
+RIG_VERSION = 1
+# where a rig file keeps its version, # can't be in a Maya name so no light has it
+VERSION_KEY = '#version'
+# where a compact rig keeps its light types, defaults and palette
+COMPACT_KEY = '#compact'
+# the defaults a light of a compact rig doesn't have
+MISSING_KEY = '#missing'
+# keys of a rig that aren't lights
+HEADER_KEYS = (COMPACT_KEY, VERSION_KEY)
+
+
+def _fromVersion0(light):
+    # the first rig files had no visibility, a color could come with an alpha
+    # and attributes that couldn't be read were saved as null
+    if not isinstance(light, dict):
+        return light
+    light = dict((key, value) for key, value in light.items() if value is not None or key == 'parent')
+    color = light.get('color')
+    if isinstance(color, (list, tuple)) and len(color) == 4:
+        light['color'] = list(color[:3])
+    light.setdefault('visibility', True)
+    return light
+
+
+# MIGRATIONS[n] brings a light from version n up to n + 1
+MIGRATIONS = (_fromVersion0,)
+
+
+def rigVersion(rig):
+    return rig.get(VERSION_KEY, 0)
+
+
+def iterLights(rig):
+    # (name, light) of every light in a rig brought up to the current version,
+    # one light at a time as they're asked for. Lights of a compact rig are
+    # expanded as they go. rig is a rig dict, or its records in the order they
+    # were saved as iterRig reads them: each light is then brought up to date
+    # as soon as it's read. Files with no version ahead of their lights, from
+    # before it was written first, have their lights held until the end.
+    # A version this tool doesn't read raises ValueError.
+    if isinstance(rig, dict):
+        header = dict((key, rig[key]) for key in HEADER_KEYS if key in rig)
+        records = rig.items()
+        update = _updater(header)
+    else:
+        header = {}
+        records = rig
+        update = None
+
+    held = []
+    for name, light in records:
+        if name in HEADER_KEYS:
+            header[name] = light
+            continue
+        if update is None:
+            if VERSION_KEY not in header:
+                held.append((name, light))
+                continue
+            update = _updater(header)
+        yield name, update(light)
+
+    if held:
+        update = _updater(header)
+        for name, light in held:
+            yield name, update(light)
+
+
+def _updater(header):
+    # update(light) bringing a light of a rig with this header up to the current version
+    version = header.get(VERSION_KEY, 0)
+    if not isinstance(version, int) or not 0 <= version <= RIG_VERSION:
+        raise ValueError('rig version %r is not one this tool reads (0 - %d)' % (version, RIG_VERSION))
+    steps = MIGRATIONS[version:]
+    expand = _expander(header[COMPACT_KEY]) if COMPACT_KEY in header else None
+
+    def update(light):
+        if expand is not None:
+            light = expand(light)
+        for step in steps:
+            light = step(light)
+        return light
+
+    return update
+
+
+def compactRig(lights):
+    # a name -> light dict as a compact rig. An attribute is left out where it
+    # holds the value most lights have, that value goes in "defaults" and a
+    # light without the attribute lists it under MISSING_KEY. Light types are
+    # an index into "types". Ints and any other value but a float, bool or null
+    # that comes up more than once are stored once in "palette" and written as
+    # their index, so a bare int in a light always points into the palette.
+    lights = list(lights.items())
+    # values are told apart by repr, == has 1, 1.0 and True, or 0.0 and -0.0, the same
+    reprs = [[(key, repr(value), value) for key, value in light.items()] for name, light in lights]
+
+    counts = {}
+    keyCounts = {}
+    values = {}
+    for attributes in reprs:
+        for key, text, value in attributes:
+            counts[key, text] = counts.get((key, text), 0) + 1
+            keyCounts[key] = keyCounts.get(key, 0) + 1
+            values[text] = value
+
+    # key -> (count, repr) of the value most lights have, when more lights have
+    # it than don't have the key at all, those are listed under MISSING_KEY
+    common = {}
+    for (key, text), count in counts.items():
+        if count > 1 and count > len(lights) - keyCounts[key] and count > common.get(key, (0, None))[0]:
+            common[key] = (count, text)
+    defaultTexts = dict((key, text) for key, (count, text) in common.items())
+    defaults = dict((key, values[text]) for key, text in defaultTexts.items())
+
+    # uses of every value that's still written once the defaults are left out
+    uses = {}
+    for attributes in reprs:
+        for key, text, value in attributes:
+            if key != 'lightType' and defaultTexts.get(key) != text:
+                uses[text] = uses.get(text, 0) + 1
+
+    palette = sorted((text for text, count in uses.items()
+                      if type(values[text]) is int or (count > 1 and not isinstance(values[text], (float, bool, type(None))))),
+                     key=lambda text: -uses[text])
+    indexes = dict((text, index) for index, text in enumerate(palette))
+
+    types = []
+    typeIndexes = {}
+    rig = {}
+    for (name, light), attributes in zip(lights, reprs):
+        record = {}
+        missing = [key for key in defaultTexts if key not in light]
+        if missing:
+            record[MISSING_KEY] = sorted(missing)
+        for key, text, value in attributes:
+            if defaultTexts.get(key) == text:
+                continue
+            if key == 'lightType':
+                if text not in typeIndexes:
+                    typeIndexes[text] = len(types)
+                    types.append(value)
+                record[key] = typeIndexes[text]
+            elif text in indexes:
+                record[key] = indexes[text]
+            else:
+                record[key] = value
+        rig[name] = record
+
+    rig[COMPACT_KEY] = {'types': types, 'defaults': defaults, 'palette': [values[text] for text in palette]}
+    return rig
+
+
+def _expander(compact):
+    # expand(record) giving back a light of a compact rig as it was saved,
+    # lights share the palette's values. A damaged light is given back as it
+    # is, validateLight says what's wrong with it.
+    try:
+        types = list(compact['types'])
+        defaults = dict(compact['defaults'])
+        palette = list(compact['palette'])
+    except (KeyError, TypeError, ValueError):
+        return lambda record: record
+
+    def expand(record):
+        if not isinstance(record, dict):
+            return record
+        light = defaults.copy()
+        try:
+            for key, value in record.items():
+                if key == MISSING_KEY:
+                    for missing in value:
+                        del light[missing]
+                elif key == 'lightType':
+                    light[key] = types[value]
+                elif type(value) is int:
+                    light[key] = palette[value]
+                else:
+                    light[key] = value
+        except (IndexError, KeyError, TypeError):
+            return record
+        return light
+
+    return expand
+
+
+def _isString(value):
+    return isinstance(value, str if sys.version_info[0] > 2 else basestring)
+
+
+def _isNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _isVector(value, size):
+    return isinstance(value, (list, tuple)) and len(value) == size and all(_isNumber(v) for v in value)
+
+
+def _isAnimation(value):
+    # channel -> [frames, values] as compressChannel makes them
+    if not isinstance(value, dict):
+        return False
+    for keys in value.values():
+        if not isinstance(keys, (list, tuple)) or len(keys) != 2:
+            return False
+        frames, values = keys
+        if not _isVector(frames, len(frames)) or not _isVector(values, len(frames)) or not frames:
+            return False
+    return True
+
+
+# kind -> (test, what the value should be)
+KINDS = {
+    'string': (_isString, 'a string'),
+    'number': (_isNumber, 'a number'),
+    'bool': (lambda value: isinstance(value, (bool, int)), 'a bool'),
+    'vector3': (lambda value: _isVector(value, 3), '3 numbers'),
+    'matrix': (lambda value: _isVector(value, 16), '16 numbers'),
+    'rotateOrder': (lambda value: _isNumber(value) and value in range(6), 'a rotate order from 0 to 5'),
+    'parent': (lambda value: value is None or _isString(value), 'a path or null'),
+    'animation': (_isAnimation, 'a dictionary of channel -> [frames, values]'),
+}
+
+# key -> (kind, required) of a current version light, other keys are let through
+SCHEMA = {
+    'lightType': ('string', True),
+    'intensity': ('number', False),
+    'color': ('vector3', False),
+    'visibility': ('bool', False),
+    'translate': ('vector3', False),
+    'rotation': ('vector3', False),
+    'rotateOrder': ('rotateOrder', False),
+    'matrix': ('matrix', False),
+    'parent': ('parent', False),
+    'animation': ('animation', False),
+}
+
+
+def compileSchema(schema):
+    # a validate(name, light) function giving back the problems with a light.
+    # The schema is looked up once here, checking a light is just the tests.
+    checks = tuple((key, required, KINDS[kind][0], '%s: ' + '%s is not %s' % (key, KINDS[kind][1]),
+                    '%s: ' + '%s is missing' % key)
+                   for key, (kind, required) in sorted(schema.items()))
+
+    def validate(name, light):
+        if not isinstance(light, dict):
+            return ['%s: is not a dictionary' % name]
+        problems = []
+        for key, required, test, wrong, missing in checks:
+            if key in light:
+                if not test(light[key]):
+                    problems.append(wrong % name)
+            elif required:
+                problems.append(missing % name)
+        return problems
+
+    return validate
+
+
+validateLight = compileSchema(SCHEMA)
+
+
+def validateRig(rig, limit=None):
+    # (lights, problems) of a rig: its lights brought up to the current version
+    # and what's wrong with them as "name: problem" strings. Stops reading
+    # after limit problems, a broken file is known to be broken soon enough.
+    # rig is a rig dict or the records iterRig reads from a file, a file that
+    # can't be read raises ValueError.
+    if isinstance(rig, dict):
+        version = rigVersion(rig)
+        if not isinstance(version, int) or not 0 <= version <= RIG_VERSION:
+            return {}, ['rig version %r is not one this tool reads (0 - %d)' % (version, RIG_VERSION)]
+
+    lights = {}
+    problems = []
+    for name, light in iterLights(rig):
+        found = validateLight(name, light)
+        if found:
+            problems.extend(found)
+            if limit and len(problems) >= limit:
+                break
+        lights[name] = light
+    return lights, problems[:limit]
+
+
+def mergeRigs(rigs):
+    # one rig from several, a light replaces one of the same name from an
+    # earlier rig. Gives back the rig and the names that were replaced.
+    merged = {}
+    replaced = []
+    for lights in rigs:
+        for name, light in lights.items():
+            if name in merged:
+                replaced.append(name)
+            merged[name] = light
+    return merged, replaced
+
+
+def diffRigs(old, new, tolerance=1e-6):
+    # {'added': names, 'removed': names, 'changed': {name: {key: [old, new]}}}
+    changed = {}
+    for name in set(old) & set(new):
+        a, b = old[name], new[name]
+        keys = dict((key, [a.get(key), b.get(key)]) for key in set(a) | set(b)
+                    if not _same(a.get(key), b.get(key), tolerance))
+        if keys:
+            changed[name] = keys
+    return {
+        'added': sorted(set(new) - set(old)),
+        'removed': sorted(set(old) - set(new)),
+        'changed': changed,
+    }
+
+
+def _same(a, b, tolerance):
+    # equal values, numbers within tolerance
+    if _isNumber(a) and _isNumber(b):
+        return abs(a - b) <= tolerance
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y, tolerance) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return set(a) == set(b) and all(_same(a[key], b[key], tolerance) for key in a)
+    return a == b
+
+
+def rigFiles(paths):
+    # files from a mix of files and directories, directories give every rig file under them
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in FORMATS:
+                    yield os.path.join(root, name)
+
+
+def _validateFile(path):
+    lights, problems = validateRig(iterRig(path))
+    return {'status': 'invalid' if problems else 'ok', 'lights': len(lights), 'problems': problems}
+
+
+def rigOutputs(paths, fileFormat, directory=None):
+    # path -> file to convert it to of every rig file under paths, in order.
+    # With a directory, files found in a directory given keep their path under
+    # it and files given as they are go straight in it, without one files are
+    # written next to themselves. Two files that would be written to the same
+    # place raise ValueError.
+    outputs = OrderedDict()
+    sources = {}
+    for given in paths:
+        for path in rigFiles([given]):
+            if directory is None:
+                folder = os.path.dirname(path)
+            elif os.path.isdir(given):
+                folder = os.path.join(directory, os.path.relpath(os.path.dirname(path), given))
+            else:
+                folder = directory
+            output = os.path.splitext(os.path.basename(path))[0] + EXTENSIONS[fileFormat]
+            output = os.path.normpath(os.path.join(folder, output))
+            key = os.path.normcase(os.path.abspath(output))
+            source = sources.setdefault(key, path)
+            if os.path.normcase(os.path.abspath(source)) != os.path.normcase(os.path.abspath(path)):
+                raise ValueError('%s and %s would both be written to %s' % (source, path, output))
+            outputs[path] = output
+    return outputs
+
+
+def _convertFile(path, fileFormat, outputs, compression=None, level=None, compact=False):
+    header = {}
+    lights, problems = validateRig(_noteHeader(iterRig(path), header))
+    if problems:
+        return {'status': 'invalid', 'lights': len(lights), 'problems': problems}
+
+    output = outputs[path]
+    # a file can be compressed, uncompressed or made compact in place
+    if (os.path.abspath(output) == os.path.abspath(path) and rigCompression(path) == compression and
+            (COMPACT_KEY in header) == (compact and fileFormat == 'json')):
+        return {'status': 'skipped', 'lights': len(lights), 'problems': ['already %s' % fileFormat]}
+    writeRig(output, lights, compression=compression, level=level, compact=compact)
+
+    # what the format can't hold is written without, say so
+    lost = set()
+    if fileFormat == 'usda':
+        for light in lights.values():
+            lost.update(key for key in light if key not in USDA_KEYS)
+    if lost:
+        dropped = [name for name, light in sorted(lights.items()) if any(key in light for key in lost)]
+        return {'status': 'lossy', 'lights': len(lights), 'output': output,
+                'problems': ['%s of %d lights left out of %s' % (', '.join(sorted(lost)), len(dropped), fileFormat)]}
+    return {'status': 'ok', 'lights': len(lights), 'output': output}
+
+
+def _noteHeader(records, header):
+    # records of a rig as they go by, keeping its header entries in header
+    for key, value in records:
+        if key in HEADER_KEYS:
+            header[key] = value
+        yield key, value
+
+
+def _readFile(path):
+    lights, problems = validateRig(iterRig(path))
+    if problems:
+        return {'status': 'invalid', 'lights': len(lights), 'problems': problems}
+    return {'status': 'ok', 'lights': len(lights), 'rig': lights}
+
+
+def benchmarkCompression(lights, fileFormat='json', levels=(1, 6, 9), compact=False):
+    # (compression, level, bytes, save seconds, load seconds) of lights saved
+    # with no compression and with every codec at every level. Loading is
+    # reading and validating, the same as an import.
+    clock = getattr(time, 'perf_counter', time.time)
+    codecs = [(None, None)]
+    for compression in sorted(COMPRESSION):
+        if compression != 'lzma' or lzma is not None:
+            codecs.extend((compression, level) for level in levels)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'benchmark' + EXTENSIONS[fileFormat])
+    rows = []
+    try:
+        for compression, level in codecs:
+            start = clock()
+            writeRig(path, lights, compression=compression, level=level, compact=compact)
+            saved = clock()
+            validateRig(iterRig(path))
+            loaded = clock()
+            rows.append((compression, level, os.path.getsize(path), saved - start, loaded - saved))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(directory)
+    return rows
+
+
+def _job(function, path, *args):
+    # run function on a file in a worker, failures become part of the report
+    start = time.time()
+    try:
+        result = function(path, *args)
+    except Exception as error:
+        result = {'status': 'error', 'problems': ['%s: %s' % (type(error).__name__, error)]}
+    result['path'] = path
+    result['seconds'] = time.time() - start
+    return result
+
+
+def runBatch(function, paths, args=(), jobs=None, report=None, progress=None):
+    # run function over every path in a process pool, gives back the results
+    # in the order they finish. Each result is written to report as a line
+    # of JSON as soon as it's in, so a report survives a cancelled run.
+    # concurrent.futures only comes with python 3, python 2 needs the futures backport
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    paths = list(paths)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_job, function, path, *args) for path in paths]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if report is not None:
+                report.write(json.dumps(dict((key, value) for key, value in result.items() if key != 'rig')) + '\n')
+                report.flush()
+            if progress is not None:
+                progress.write('[%d/%d] %s %s\n' % (done, len(paths), result['status'], result['path']))
+                progress.flush()
+    return results
+
+
+def _cli(args):
+    parser = argparse.ArgumentParser('LightRig', description='Validate, convert, merge and diff light rig files.')
+    parser.add_argument('--jobs', type=int, help='number of files to work on at once, every core by default')
+    parser.add_argument('--report', help='file to write a line of JSON to for every file')
+    # the same options after the command, left unset there so they don't hide
+    # ones given before it
+    shared = argparse.ArgumentParser(add_help=False)
+    shared.add_argument('--jobs', type=int, default=argparse.SUPPRESS,
+                        help='number of files to work on at once, every core by default')
+    shared.add_argument('--report', default=argparse.SUPPRESS, help='file to write a line of JSON to for every file')
+    commands = parser.add_subparsers(dest='command')
+
+    validate = commands.add_parser('validate', parents=[shared],
+                                   help='check rig files can be read and hold good lights')
+    validate.add_argument('paths', nargs='+', help='rig files or directories of them')
+
+    convert = commands.add_parser('convert', parents=[shared], help='write rig files out in another format')
+    convert.add_argument('paths', nargs='+', help='rig files or directories of them')
+    convert.add_argument('--to', required=True, choices=sorted(EXTENSIONS))
+    convert.add_argument('--output', help='directory to write to, next to each file by default')
+
+    merge = commands.add_parser('merge', parents=[shared], help='combine rig files, later files win')
+    merge.add_argument('paths', nargs='+', help='rig files or directories of them')
+    merge.add_argument('--output', required=True, help='rig file to write')
+
+    for command in (convert, merge):
+        command.add_argument('--compress', choices=sorted(COMPRESSION), help='codec to compress written files with')
+        command.add_argument('--level', type=int, help='compression level, 1 is fastest and 9 smallest')
+
+    benchmark = commands.add_parser('benchmark', parents=[shared],
+                                    help='compare file size against save and load time of every codec')
+    benchmark.add_argument('path', help='rig file to take the lights from')
+    benchmark.add_argument('--to', choices=sorted(EXTENSIONS), help="format to save in, the file's own by default")
+    benchmark.add_argument('--levels', type=int, nargs='+', default=[1, 6, 9])
+
+    for command in (convert, merge, benchmark):
+        command.add_argument('--compact', action='store_true',
+                             help='write JSON files compact, defaults left out and repeated values kept once')
+
+    diff = commands.add_parser('diff', parents=[shared],
+                               help='list the lights added, removed and changed between two rig files')
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--tolerance', type=float, default=1e-6)
+
+    options = parser.parse_args(args)
+    if options.command is None:
+        parser.error('a command is needed')
+
+    report = open(options.report, 'w') if options.report else None
+    try:
+        return _run(options, report)
+    finally:
+        if report is not None:
+            report.close()
+
+
+def _run(options, report):
+    progress = sys.stderr
+    if options.command == 'validate':
+        results = runBatch(_validateFile, rigFiles(options.paths), (), options.jobs, report, progress)
+    elif options.command == 'convert':
+        try:
+            outputs = rigOutputs(options.paths, options.to, options.output)
+        except ValueError as error:
+            progress.write('%s\n' % error)
+            return 1
+        for folder in set(os.path.dirname(output) for output in outputs.values()):
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+        results = runBatch(_convertFile, outputs,
+                           (options.to, outputs, options.compress, options.level, options.compact),
+                           options.jobs, report, progress)
+    elif options.command == 'benchmark':
+        lights, problems = validateRig(iterRig(options.path))
+        if problems:
+            progress.write('%s: %s\n' % (options.path, '; '.join(problems)))
+            return 1
+
+        rows = benchmarkCompression(lights, options.to or rigFormat(options.path), options.levels, options.compact)
+        plain = float(rows[0][2])
+        sys.stdout.write('%-11s %5s %12s %7s %9s %9s\n' % ('compression', 'level', 'bytes', 'ratio', 'save ms', 'load ms'))
+        for compression, level, size, save, load in rows:
+            sys.stdout.write('%-11s %5s %12d %6.1fx %9.1f %9.1f\n' % (compression or 'none', level or '-', size,
+                                                                       plain / size, save * 1000, load * 1000))
+            if report is not None:
+                report.write(json.dumps({'compression': compression, 'level': level, 'bytes': size,
+                                         'save': save, 'load': load}) + '\n')
+        return 0
+    else:
+        paths = list(rigFiles(options.paths)) if options.command == 'merge' else [options.old, options.new]
+        results = runBatch(_readFile, paths, (), options.jobs, report, progress)
+        failed = [result for result in results if result['status'] != 'ok']
+        if failed:
+            for result in failed:
+                progress.write('%s: %s\n' % (result['path'], '; '.join(result['problems'])))
+            return 1
+
+        # files finish in any order, put them back in the order they were given
+        rigs = dict((result['path'], result['rig']) for result in results)
+        if options.command == 'merge':
+            lights, replaced = mergeRigs(rigs[path] for path in paths)
+            writeRig(options.output, lights, compression=options.compress, level=options.level,
+                     compact=options.compact)
+            summary = {'summary': 'merge', 'output': options.output, 'lights': len(lights), 'replaced': replaced}
+        else:
+            summary = diffRigs(rigs[options.old], rigs[options.new], options.tolerance)
+            json.dump(summary, sys.stdout, indent=4, sort_keys=True)
+            sys.stdout.write('\n')
+            summary['summary'] = 'diff'
+
+        if report is not None:
+            report.write(json.dumps(summary) + '\n')
+        if options.command == 'diff':
+            return 1 if summary['added'] or summary['removed'] or summary['changed'] else 0
+        return 0
+
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    progress.write(', '.join('%d %s' % (count, status) for status, count in sorted(counts.items())) + '\n')
+    if report is not None:
+        report.write(json.dumps({'summary': options.command, 'counts': counts}) + '\n')
+    return 1 if counts.get('invalid') or counts.get('error') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(_cli(sys.argv[1:]))
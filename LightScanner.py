@@ -0,0 +1,323 @@
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+
+import LightStore
+
+"""
+Lights in Maya ASCII scenes, read without Maya
+
+Auditing lights across a sequence shouldn't mean opening every shot. The
+scanner reads .ma files a statement at a time and picks out the light shapes,
+their transforms and the setAttr values the manager saves, giving back lights
+in the same format as a rig file saved by the Lighting Manager:
+
+    python LightScanner.py /shows/abc/shots --output audit.json
+
+Scenes are scanned in a process pool, one scene per process at a time.
+
+Only values stored in the file are seen: lights in referenced files, values
+driven by connections or expressions, and pivots aren't taken into account.
+Binary .mb files can't be read.
+
+"""
+
+# tokens of a MEL statement: quoted strings, statement ends and plain words
+_tokens = re.compile(r'"(?:[^"\\]|\\.)*"|;|[^\s;"]+')
+
+# short and long attribute names -> name in the saved record
+_lightAttributes = {
+    'in': 'intensity', 'intensity': 'intensity',
+    'cl': 'color', 'color': 'color',
+    'v': 'visibility', 'visibility': 'visibility',
+}
+_transformAttributes = {
+    't': 'translate', 'translate': 'translate',
+    'r': 'rotate', 'rotate': 'rotate',
+    's': 'scale', 'scale': 'scale',
+    'ro': 'rotateOrder', 'rotateOrder': 'rotateOrder',
+}
+# single channels of a vector attribute, "tx" is the first of "t"
+_channels = {}
+for _short, _long in (('t', 'translate'), ('r', 'rotate'), ('s', 'scale')):
+    for _axis, _letter in enumerate('xyz'):
+        _channels[_short + _letter] = _channels[_long + _letter.upper()] = (_long, _axis)
+
+_booleans = {'yes': True, 'on': True, 'true': True, 'no': False, 'off': False, 'false': False}
+
+# setAttr flags that come with a value of their own
+_setAttrFlags = set(['-k', '-keyable', '-l', '-lock', '-cb', '-channelBox', '-ca', '-caching',
+                     '-c', '-clamp', '-s', '-size', '-type'])
+
+
+# the light types the manager lists
+LIGHT_TYPES = ('areaLight', 'spotLight', 'pointLight', 'directionalLight', 'volumeLight')
+
+
+class SceneScanner(object):
+
+    def __init__(self, lightTypes=LIGHT_TYPES):
+        self.lightTypes = set(lightTypes)
+        # full path -> [parent path, {attribute: value}] of every transform
+        self.transforms = {}
+        # short name -> full paths, parents are given by name or partial path
+        self.names = {}
+        # (shape path, node type, {attribute: value}) of every light, in file order
+        self.lights = []
+        # attributes of the node setAttr statements go to, None when it's not one we keep
+        self.current = None
+        self.angleScale = math.pi / 180.0
+
+    def scan(self, lines):
+        # read a scene a line at a time, big meshes are skipped over without
+        # being split into tokens
+        statement = []
+        skipping = False
+        for line in lines:
+            if not statement and not skipping:
+                stripped = line.lstrip()
+                if not stripped or stripped.startswith('//'):
+                    continue
+                if self.current is None and stripped.startswith('setAttr'):
+                    skipping = True
+
+            if skipping:
+                if ';' in line and _endsStatement(line):
+                    skipping = False
+                continue
+
+            for token in _tokens.findall(line):
+                if token == ';':
+                    if statement:
+                        self.statement(statement)
+                    statement = []
+                else:
+                    statement.append(token)
+
+    def statement(self, tokens):
+        command = tokens[0]
+        if command == 'createNode':
+            self.createNode(tokens)
+        elif command == 'setAttr':
+            if self.current is not None:
+                self.setAttr(tokens)
+        elif command == 'select':
+            # select -ne name, following setAttrs go to an existing node
+            self.current = None
+        elif command == 'currentUnit':
+            flags = dict(zip(tokens[1::2], tokens[2::2]))
+            angle = flags.get('-a', flags.get('-angle', 'degree'))
+            self.angleScale = 1.0 if angle.startswith('rad') else math.pi / 180.0
+
+    def createNode(self, tokens):
+        nodeType = tokens[1]
+        flags = {}
+        for flag, value in zip(tokens[2:], tokens[3:]):
+            if flag in ('-n', '-name', '-p', '-parent'):
+                flags[flag[:2]] = _unquote(value)
+
+        name = flags.get('-n', nodeType)
+        parent = self.resolve(flags.get('-p'))
+
+        if nodeType == 'transform':
+            path = (parent or '') + '|' + name
+            attributes = {}
+            self.transforms[path] = [parent, attributes]
+            self.names.setdefault(name, []).append(path)
+            self.current = (_transformAttributes, attributes)
+        elif nodeType in self.lightTypes and parent in self.transforms:
+            attributes = {}
+            self.lights.append((parent + '|' + name, nodeType, attributes))
+            self.current = (_lightAttributes, attributes)
+        else:
+            self.current = None
+
+    def resolve(self, name):
+        # full path of a transform given by name or partial path, None for the world
+        if not name:
+            return None
+        if name.startswith('|'):
+            return name
+        paths = self.names.get(name.rsplit('|', 1)[-1], ())
+        for path in paths:
+            if path.endswith('|' + name):
+                return path
+        return None
+
+    def setAttr(self, tokens):
+        names, attributes = self.current
+        attr = None
+        values = []
+        i = 1
+        while i < len(tokens):
+            token = tokens[i]
+            if token in _setAttrFlags:
+                i += 2
+                continue
+            if token.startswith('-') and not _isNumber(token):
+                i += 1
+                continue
+            if attr is None:
+                attr = _unquote(token).lstrip('.')
+            else:
+                values.append(token)
+            i += 1
+
+        if attr is None or not values:
+            return
+
+        channel = _channels.get(attr)
+        if channel is not None and names is _transformAttributes:
+            column, axis = channel
+            vector = attributes.setdefault(column, [0.0, 0.0, 0.0] if column != 'scale' else [1.0, 1.0, 1.0])
+            vector[axis] = _value(values[0])
+            return
+
+        column = names.get(attr)
+        if column is None:
+            return
+        parsed = [_value(value) for value in values]
+        attributes[column] = parsed if len(parsed) > 1 else parsed[0]
+
+    def records(self):
+        # name -> light for every light found, in the format saveLights writes
+        # saved under the same unique partial names the manager uses,
+        # lights called the same in different groups don't replace each other
+        transformPaths = [path.rsplit('|', 1)[0] for path, nodeType, attributes in self.lights]
+        lights = {}
+        for (path, nodeType, attributes), transformPath, name in zip(self.lights, transformPaths,
+                                                                    LightStore.uniqueNames(transformPaths)):
+            parent, transform = self.transforms[transformPath]
+            rotateOrder = int(transform.get('rotateOrder', 0))
+            lights[name] = {
+                'lightType': nodeType,
+                'intensity': float(attributes.get('intensity', 1.0)),
+                'color': [float(c) for c in attributes.get('color', (1.0, 1.0, 1.0))],
+                'visibility': bool(attributes.get('visibility', True)),
+                'translate': [float(t) for t in transform.get('translate', (0.0, 0.0, 0.0))],
+                'rotation': [float(r) for r in transform.get('rotate', (0.0, 0.0, 0.0))],
+                'rotateOrder': rotateOrder,
+                'matrix': list(self.worldMatrix(transformPath)),
+                'parent': parent,
+            }
+        return lights
+
+    def worldMatrix(self, path):
+        # local matrices multiplied up the hierarchy
+        matrix = None
+        while path is not None:
+            parent, transform = self.transforms[path]
+            local = LightStore.composeMatrix(transform.get('translate', (0.0, 0.0, 0.0)),
+                                             [r * self.angleScale for r in transform.get('rotate', (0.0, 0.0, 0.0))],
+                                             transform.get('scale', (1.0, 1.0, 1.0)),
+                                             int(transform.get('rotateOrder', 0)))
+            matrix = local if matrix is None else LightStore.multiplyMatrices(matrix, local)
+            path = parent
+        return matrix
+
+
+def _endsStatement(line):
+    # does a ; outside of quotes end a statement on this line
+    if '"' not in line:
+        return True
+    return ';' in _tokens.findall(line)
+
+
+def _unquote(token):
+    if token.startswith('"'):
+        return token[1:-1]
+    return token
+
+
+def _isNumber(token):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def _value(token):
+    token = _unquote(token)
+    if token in _booleans:
+        return _booleans[token]
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+def scanFile(path):
+    # name -> light of every light in a Maya ASCII file
+    scanner = SceneScanner()
+    with io.open(path, 'r', encoding='utf-8', errors='replace') as f:
+        scanner.scan(f)
+    return scanner.records()
+
+
+def _scan(path):
+    # scanFile for the process pool, an unreadable scene shouldn't stop the rest
+    try:
+        return path, scanFile(path), None
+    except Exception as error:
+        return path, None, '%s: %s' % (type(error).__name__, error)
+
+
+def sceneFiles(directory):
+    # every .ma file under directory
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.ma'):
+                yield os.path.join(root, name)
+
+
+def scanDirectory(directory, processes=None):
+    # (path, lights, error) for every scene under directory as each one
+    # finishes, lights is None and error says why when a scene couldn't be read
+    paths = list(sceneFiles(directory))
+    if not paths:
+        return
+
+    pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(paths)))
+    try:
+        for result in pool.imap_unordered(_scan, paths):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def _cli(args):
+    parser = argparse.ArgumentParser('LightScanner', description='List the lights of every Maya ASCII scene in a directory.')
+    parser.add_argument('directory')
+    parser.add_argument('--output', help='JSON file to write, scene path -> lights. Printed when not given.')
+    parser.add_argument('--processes', type=int, help='number of scenes to scan at once, every core by default')
+    options = parser.parse_args(args)
+
+    scenes = {}
+    failed = 0
+    for path, lights, error in scanDirectory(options.directory, options.processes):
+        if error:
+            failed += 1
+            sys.stderr.write('%s: %s\n' % (path, error))
+        else:
+            scenes[path] = lights
+            sys.stderr.write('%s: %d lights\n' % (path, len(lights)))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(scenes, f, indent=4, sort_keys=True)
+    else:
+        json.dump(scenes, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write('\n')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(_cli(sys.argv[1:]))
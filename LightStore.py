@@ -0,0 +1,480 @@
+import math
+from array import array
+
+"""
+Columnar light data for the Lighting Manager
+
+Light values are kept as flat typed arrays, one per attribute, so whole-rig
+edits are a single pass over an array instead of a call per light.
+Vectors and colors are stored flat as x, y, z, x, y, z...
+
+Intensity and color are floats in Maya so they are stored as 32 bit floats,
+transforms are doubles. A light costs roughly 66 bytes of array space plus
+its path.
+
+Nothing in here talks to Maya, so it can be used outside of it.
+
+"""
+
+
+class LightStore(object):
+
+    # array type and number of slots per light of every column
+    columns = {
+        'translate': ('d', 3),
+        'rotate': ('d', 3),
+        'intensity': ('f', 1),
+        'color': ('f', 3),
+        'visibility': ('b', 1),
+    }
+
+    def __init__(self):
+        # full DAG path of each light shape, row numbers index every column
+        self.paths = []
+        # light type names are interned, types holds an index into typeNames
+        self.typeNames = []
+        self.typeCodes = {}
+        self.types = array('H')
+
+        for column, (typecode, width) in self.columns.items():
+            setattr(self, column, array(typecode))
+
+        # path -> row lookup, rebuilt the first time it's needed after rows move
+        self._rows = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, row):
+        return LightRecord(self, row)
+
+    def __iter__(self):
+        for row in range(len(self.paths)):
+            yield LightRecord(self, row)
+
+    def typeCode(self, lightType):
+        # intern the light type name, plugin light types get a code as they turn up
+        code = self.typeCodes.get(lightType)
+        if code is None:
+            code = self.typeCodes[lightType] = len(self.typeNames)
+            self.typeNames.append(lightType)
+        return code
+
+    def append(self, path, lightType, translate=(0.0, 0.0, 0.0), rotate=(0.0, 0.0, 0.0),
+               intensity=1.0, color=(1.0, 1.0, 1.0), visibility=True):
+        row = len(self.paths)
+        self.paths.append(path)
+        self.types.append(self.typeCode(lightType))
+        self.translate.extend(translate)
+        self.rotate.extend(rotate)
+        self.intensity.append(intensity)
+        self.color.extend(color)
+        self.visibility.append(bool(visibility))
+
+        if self._rows is not None:
+            self._rows[path] = row
+        return row
+
+    def extend(self, lights):
+        # lights are (path, lightType, translate, rotate, intensity, color, visibility) tuples
+        for light in lights:
+            self.append(*light)
+
+    def assign(self, row, path, lightType, translate, rotate, intensity, color, visibility):
+        # overwrite a row in place with freshly read values
+        if self.paths[row] != path:
+            self.paths[row] = path
+            self._rows = None
+        self.types[row] = self.typeCode(lightType)
+        self.translate[row * 3:row * 3 + 3] = array('d', translate)
+        self.rotate[row * 3:row * 3 + 3] = array('d', rotate)
+        self.intensity[row] = intensity
+        self.color[row * 3:row * 3 + 3] = array('f', color)
+        self.visibility[row] = bool(visibility)
+
+    def removeRange(self, first, last):
+        # drop rows first to last (inclusive), each column is one slice delete
+        del self.paths[first:last + 1]
+        del self.types[first:last + 1]
+        for column, (typecode, width) in self.columns.items():
+            del getattr(self, column)[first * width:(last + 1) * width]
+        self._rows = None
+
+    def remove(self, rows):
+        # remove any rows, bottom up in contiguous runs so the rows above keep their numbers
+        for first, last in runs(rows):
+            self.removeRange(first, last)
+
+    def row(self, path):
+        if self._rows is None:
+            self._rows = dict((path, row) for row, path in enumerate(self.paths))
+        return self._rows.get(path)
+
+    def lightType(self, row):
+        return self.typeNames[self.types[row]]
+
+    def transformPath(self, row):
+        # the light shape sits directly under its transform
+        return self.paths[row].rsplit('|', 1)[0]
+
+    def name(self, row):
+        # short name of the transform, the name shown in the manager
+        return self.transformPath(row).rsplit('|', 1)[-1]
+
+    def savedNames(self):
+        # the names lights are saved under, row by row
+        return uniqueNames([self.transformPath(row) for row in range(len(self.paths))])
+
+    def vector(self, column, row):
+        return tuple(getattr(self, column)[row * 3:row * 3 + 3])
+
+    def take(self, column, rows):
+        # a new array holding column for just the given rows, a snapshot of a selection
+        values = getattr(self, column)
+        typecode, width = self.columns[column]
+        snapshot = array(typecode)
+        if width == 1:
+            snapshot.extend([values[row] for row in rows])
+        else:
+            for row in rows:
+                snapshot.extend(values[row * width:row * width + width])
+        return snapshot
+
+    def put(self, column, rows, snapshot):
+        # write a take() sized array back into column for the given rows
+        values = getattr(self, column)
+        typecode, width = self.columns[column]
+        if width == 1:
+            for i, row in enumerate(rows):
+                values[row] = snapshot[i]
+        else:
+            for i, row in enumerate(rows):
+                values[row * width:row * width + width] = array(typecode, snapshot[i * width:i * width + width])
+
+    def copy(self):
+        # a store of its own with the same lights, each column is copied in one go
+        store = type(self)()
+        store.paths = list(self.paths)
+        store.typeNames = list(self.typeNames)
+        store.typeCodes = dict(self.typeCodes)
+        store.types = self.types[:]
+        for column in self.columns:
+            setattr(store, column, getattr(self, column)[:])
+        return store
+
+    def toDict(self, row):
+        # a single light in the format saveLights writes
+        return {
+            'translate': list(self.vector('translate', row)),
+            'rotation': list(self.vector('rotate', row)),
+            'lightType': self.lightType(row),
+            'intensity': self.intensity[row],
+            'color': list(self.vector('color', row)),
+            'visibility': bool(self.visibility[row]),
+        }
+
+    def toDicts(self, names=None):
+        # saved name -> light of every light, names are savedNames() unless given
+        if names is None:
+            names = self.savedNames()
+        return dict((name, self.toDict(row)) for row, name in enumerate(names))
+
+    def appendDict(self, name, info):
+        # add a light as read from a saved file, anything missing keeps its default
+        return self.append(name, info.get('lightType'),
+                           translate=info.get('translate') or (0.0, 0.0, 0.0),
+                           rotate=info.get('rotation') or (0.0, 0.0, 0.0),
+                           intensity=info.get('intensity', 1.0),
+                           color=info.get('color') or (1.0, 1.0, 1.0),
+                           visibility=info.get('visibility', True))
+
+    @classmethod
+    def fromDicts(cls, properties):
+        store = cls()
+        for name, info in properties.items():
+            store.appendDict(name, info)
+        return store
+
+
+class LightRecord(object):
+    # a view of one row of a LightStore, it holds no light data itself
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __repr__(self):
+        return 'LightRecord(%r)' % self.path
+
+    @property
+    def path(self):
+        return self.store.paths[self.row]
+
+    @property
+    def name(self):
+        return self.store.name(self.row)
+
+    @property
+    def transformPath(self):
+        return self.store.transformPath(self.row)
+
+    @property
+    def lightType(self):
+        return self.store.lightType(self.row)
+
+    @property
+    def translate(self):
+        return self.store.vector('translate', self.row)
+
+    @property
+    def rotate(self):
+        return self.store.vector('rotate', self.row)
+
+    @property
+    def intensity(self):
+        return self.store.intensity[self.row]
+
+    @property
+    def color(self):
+        return self.store.vector('color', self.row)
+
+    @property
+    def visibility(self):
+        return bool(self.store.visibility[self.row])
+
+    def toDict(self):
+        return self.store.toDict(self.row)
+
+
+def runs(rows):
+    # group row numbers into contiguous (first, last) runs, last run first
+    rows = sorted(set(rows), reverse=True)
+    i = 0
+    while i < len(rows):
+        last = first = rows[i]
+        i += 1
+        while i < len(rows) and rows[i] == first - 1:
+            first = rows[i]
+            i += 1
+        yield first, last
+
+
+def uniqueNames(paths):
+    # the shortest end of every full DAG path that none of the others end in,
+    # like Maya's unique partial paths: "key" unless two are called that, then
+    # "grpA|key" and "grpB|key"
+    names = [path.rsplit('|', 1)[-1] for path in paths]
+    depth = 1
+    while True:
+        rows = {}
+        for row, name in enumerate(names):
+            rows.setdefault(name, []).append(row)
+        clashes = [row for same in rows.values() if len(same) > 1 for row in same]
+        depth += 1
+        # the same path twice would clash all the way up
+        if not clashes or all(depth > paths[row].count('|') + 1 for row in clashes):
+            return names
+        for row in clashes:
+            # a full path starts with | and can't clash
+            names[row] = '|'.join(paths[row].split('|')[-depth:])
+
+
+def scaleIntensity(intensity, scale=1.0, offset=0.0):
+    # intensity * scale + offset for every light, lights can't go below 0
+    return array(intensity.typecode, [max(value * scale + offset, 0.0) for value in intensity])
+
+
+def multiplyColor(color, rgb):
+    # multiply every color by an r, g, b tint
+    result = array(color.typecode, color)
+    for channel, factor in enumerate(rgb):
+        result[channel::3] = array(color.typecode, [value * factor for value in color[channel::3]])
+    return result
+
+
+def fillValue(count, value):
+    # the same value for count lights, used when setting something like exposure
+    return array('d', [value]) * count
+
+
+# light types that don't fall off like a point light, see contribution()
+DIRECTIONAL, SPOT, AREA = 'directionalLight', 'spotLight', 'areaLight'
+
+
+def luminance(color):
+    # how bright every r, g, b color looks (Rec. 709 weights)
+    return array('d', [0.2126 * r + 0.7152 * g + 0.0722 * b
+                       for r, g, b in zip(color[0::3], color[1::3], color[2::3])])
+
+
+def contribution(lightTypes, intensity, color, position, direction, decay, cone, penumbra, points):
+    # rough brightness of every light at whichever of points it lights best:
+    # intensity x color luminance x decay falloff x spot cone. Shadows, bounce
+    # light and the light's own shape are ignored, it's for ranking lights.
+    # direction is the way each light aims, cone and penumbra are in radians.
+    result = array('d', [0.0]) * len(intensity)
+    brightness = luminance(color)
+
+    for i, lightType in enumerate(lightTypes):
+        strength = intensity[i] * brightness[i]
+        if strength <= 0.0:
+            continue
+        if lightType == DIRECTIONAL:
+            # directional lights reach everything at full strength
+            result[i] = strength
+            continue
+
+        px, py, pz = position[i * 3:i * 3 + 3]
+        dx, dy, dz = direction[i * 3:i * 3 + 3]
+        # light is full strength inside inner and gone past outer
+        half = cone[i] * 0.5
+        inner = min(half, half + penumbra[i])
+        outer = max(half, half + penumbra[i])
+
+        best = 0.0
+        for x, y, z in points:
+            vx, vy, vz = x - px, y - py, z - pz
+            distance = math.sqrt(vx * vx + vy * vy + vz * vz)
+            if distance < 1e-6:
+                best = strength
+                break
+
+            value = strength / distance ** decay[i]
+            if lightType == SPOT:
+                cosine = (vx * dx + vy * dy + vz * dz) / distance
+                angle = math.acos(max(-1.0, min(1.0, cosine)))
+                if angle >= outer:
+                    value = 0.0
+                elif angle > inner:
+                    value *= (outer - angle) / (outer - inner)
+            elif lightType == AREA:
+                # area lights only light what's in front of them
+                value *= max(0.0, (vx * dx + vy * dy + vz * dz) / distance)
+            best = max(best, value)
+        result[i] = best
+
+    return result
+
+
+def rank(values):
+    # positions of values from the biggest to the smallest
+    return sorted(range(len(values)), key=values.__getitem__, reverse=True)
+
+
+# axes in the order they're rotated for each of Maya's rotateOrder values,
+# xyz, yzx, zxy, xzy, yxz, zyx
+ROTATE_ORDERS = ((0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (1, 0, 2), (2, 1, 0))
+
+
+def multiplyMatrices(a, b):
+    # a x b for every pair of 4x4 matrices, flat and row major like Maya's
+    result = array('d')
+    for offset in range(0, len(a), 16):
+        m = a[offset:offset + 16]
+        n = b[offset:offset + 16]
+        for row in range(0, 16, 4):
+            m0, m1, m2, m3 = m[row:row + 4]
+            result.extend([m0 * n[col] + m1 * n[col + 4] + m2 * n[col + 8] + m3 * n[col + 12]
+                           for col in range(4)])
+    return result
+
+
+def decompose(matrices, rotateOrders):
+    # split every 4x4 matrix into translate, rotate (radians, in each rotate
+    # order), scale and shear, the way Maya builds a transform's matrix:
+    # scale x shear x rotate x translate with row vectors
+    translate = array('d')
+    rotate = array('d')
+    scale = array('d')
+    shear = array('d')
+
+    for i, order in enumerate(rotateOrders):
+        m = matrices[i * 16:i * 16 + 16]
+        rows = [m[0:3], m[4:7], m[8:11]]
+
+        # Gram-Schmidt down the rows gives the scale and shear, whatever is left is the rotation
+        sx = _length(rows[0])
+        r0 = [v / sx for v in rows[0]]
+        a = _dot(rows[1], r0)
+        r1 = [v - a * w for v, w in zip(rows[1], r0)]
+        sy = _length(r1)
+        r1 = [v / sy for v in r1]
+        b = _dot(rows[2], r0)
+        c = _dot(rows[2], r1)
+        r2 = [v - b * w - c * u for v, w, u in zip(rows[2], r0, r1)]
+        sz = _length(r2)
+        r2 = [v / sz for v in r2]
+
+        # a mirrored matrix, put the flip in the z scale so the rest is a rotation
+        if _dot(r2, _cross(r0, r1)) < 0:
+            sz = -sz
+            r2 = [-v for v in r2]
+
+        translate.extend(m[12:15])
+        rotate.extend(eulerAngles((r0, r1, r2), order))
+        scale.extend((sx, sy, sz))
+        shear.extend((a / sy, b / sz, c / sz))
+
+    return translate, rotate, scale, shear
+
+
+def eulerAngles(rotation, order=0):
+    # x, y, z angles in radians of a row vector rotation matrix for a rotateOrder.
+    # The rows and columns are shuffled so every order reads like xyz, orders
+    # that shuffle into a mirror image turn the other way.
+    axes = ROTATE_ORDERS[order]
+    # the usual column vector form is the transpose
+    p = [[rotation[axes[col]][axes[row]] for col in range(3)] for row in range(3)]
+
+    cosine = math.sqrt(p[0][0] * p[0][0] + p[1][0] * p[1][0])
+    first = math.atan2(p[2][1], p[2][2])
+    second = math.atan2(-p[2][0], cosine)
+    third = math.atan2(p[1][0], p[0][0])
+    if cosine < 1e-12:
+        # gimbal lock, the first and last axis line up, put all of it on the last
+        first = 0.0
+        third = math.atan2(-p[0][1], p[1][1])
+
+    angles = [0.0, 0.0, 0.0]
+    sign = 1.0 if order < 3 else -1.0
+    for axis, angle in zip(axes, (first, second, third)):
+        angles[axis] = sign * angle
+    return angles
+
+
+def composeMatrix(translate, rotate, scale=(1.0, 1.0, 1.0), order=0):
+    # flat 4x4 matrix of a transform from its channels, rotate in radians,
+    # built scale x rotate x translate the same way Maya does without pivots
+    rotation = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    for axis in ROTATE_ORDERS[order]:
+        c = math.cos(rotate[axis])
+        s = math.sin(rotate[axis])
+        # the rotation about one axis, row vector form
+        first, second = [(1, 2), (2, 0), (0, 1)][axis]
+        step = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+        step[first][first] = c
+        step[first][second] = s
+        step[second][first] = -s
+        step[second][second] = c
+        rotation = [[sum(rotation[row][k] * step[k][col] for k in range(3)) for col in range(3)]
+                    for row in range(3)]
+
+    matrix = array('d')
+    for row in range(3):
+        matrix.extend([scale[row] * value for value in rotation[row]] + [0.0])
+    matrix.extend([translate[0], translate[1], translate[2], 1.0])
+    return matrix
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _length(a):
+    return math.sqrt(_dot(a, a))
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
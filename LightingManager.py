@@ -1,16 +1,22 @@
-import json
 import os
+import re
 import Qt
+import threading
 import time
 from Qt import QtWidgets, QtCore, QtGui
 import logging
+import LightIndex
+import LightProfiler
+import LightRig
+import LightStore
+from LightProfiler import span, profiled
 
 """
 Lighting Manager By Chase Miller
 
 INSTALLATION:
 
-Place python files "Qt.py" and "LightingManager.py" in the MayaYEAR scripts folder.
+Place python files "Qt.py", "LightIndex.py", "LightProfiler.py", "LightRig.py", "LightStore.py" and "LightingManager.py" in the MayaYEAR scripts folder.
 To run script, type into Maya Python console the following:
 
 import lightingManager
@@ -18,6 +24,19 @@ reload(lightingManager)
 
 lightingManager.LightingManager(dock=False)
 
+PROFILING:
+
+Set LIGHTING_MANAGER_PROFILE=1 in the environment before starting Maya to time
+every manager operation. A summary is shown at the bottom of the manager and the
+Trace button writes a Chrome trace JSON file to the lightManager directory.
+
+SCANNING:
+
+LightScanner.py lists the lights of every .ma scene in a directory without
+Maya, in the same format Save writes. It runs with a plain python:
+
+python LightScanner.py /path/to/shots --output audit.json
+
 """
 
 logging.basicConfig()
@@ -27,136 +46,1402 @@ logger.setLevel(logging.INFO)
 
 # checks Qt binding
 if Qt.__binding__.startswith('PyQt'):
-    # If using PyQt4 or PyQt5 we need to import sip
+    # PyQt4 and PyQt5 name their signals differently
     logger.debug('Using sip')
-    from sip import wrapinstance as wrapInstance
     from Qt.QtCore import pyqtSignal as Signal
-elif Qt.__binding__ == 'PySide':
-    # If using PySide (Maya 2016 and earlier), user needs shiboken instead
-    logger.debug('Using shiboken')
-    from shiboken import wrapInstance
-    from Qt.QtCore import Signal
 else:
-    # PySide2(Maya 2017 and higher) uses shiboken2
-    logger.debug('Using shiboken2')
-    from shiboken2 import wrapInstance
+    # PySide (Maya 2016 and earlier) and PySide2 (Maya 2017 and higher)
+    logger.debug('Using shiboken')
     from Qt.QtCore import Signal
 
+# Qt.py remembers what it wrapped, so asking again for the main window or a
+# dock is a lookup
+wrapInstance = Qt.QtCompat.wrapInstance
+
 from maya import OpenMayaUI as omui
+from maya import cmds
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
 import pymel.core as pm
 
 # functional tools library, partial is for craeting temporary functions
 from functools import partial
+# contextmanager turns a generator into something usable in a with statement
+from contextlib import contextmanager
+# typed arrays hold columns of light values
+from array import array
+# bisect finds where a number belongs in a sorted list without walking it
+from bisect import bisect_left
+
+# every light shape type the manager knows how to list
+LIGHT_TYPES = ["areaLight", "spotLight", "pointLight", "directionalLight", "volumeLight"]
+
+
+@contextmanager
+def undoChunk(name):
+    # everything done inside the with block undoes in a single ctrl+z
+    pm.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        pm.undoInfo(closeChunk=True)
+
+
+def readLights(paths):
+    # read everything the store keeps for each light shape straight from the API,
+    # one selection list for the lot instead of a getAttr per attribute
+    selection = om2.MSelectionList()
+    for path in paths:
+        selection.add(path)
+
+    distanceUnit = om2.MDistance.uiUnit()
+    angleUnit = om2.MAngle.uiUnit()
+
+    for i in range(selection.length()):
+        shape = selection.getDagPath(i)
+        shapeFn = om2.MFnDagNode(shape)
+
+        transform = om2.MDagPath(shape)
+        transform.pop()
+        transformFn = om2.MFnDagNode(transform)
+
+        translate = transformFn.findPlug('translate', False)
+        rotate = transformFn.findPlug('rotate', False)
+        color = shapeFn.findPlug('color', False)
+
+        yield (shape.fullPathName(),
+               shapeFn.typeName,
+               # values in the same units getAttr and setAttr use
+               tuple(translate.child(c).asMDistance().asUnits(distanceUnit) for c in range(3)),
+               tuple(rotate.child(c).asMAngle().asUnits(angleUnit) for c in range(3)),
+               shapeFn.findPlug('intensity', False).asFloat(),
+               tuple(color.child(c).asFloat() for c in range(3)),
+               shapeFn.findPlug('visibility', False).asBool())
+
+
+def readPositions(paths):
+    # world space position of each light, in the same units as the channel box
+    selection = om2.MSelectionList()
+    for path in paths:
+        selection.add(path)
+
+    # world matrices are in centimeters whatever the scene is set to
+    scale = om2.MDistance(1.0, om2.MDistance.kCentimeters).asUnits(om2.MDistance.uiUnit())
+    for i in range(selection.length()):
+        matrix = selection.getDagPath(i).inclusiveMatrix()
+        yield tuple(matrix.getElement(3, c) * scale for c in range(3))
+
+
+def readEmitters(paths):
+    # world position and aim, decay rate and spot cone of each light, as the
+    # columns LightStore.contribution() takes
+    selection = om2.MSelectionList()
+    for path in paths:
+        selection.add(path)
+
+    emitters = {
+        'position': array('d'),
+        'direction': array('d'),
+        'decay': array('b'),
+        'cone': array('d'),
+        'penumbra': array('d'),
+    }
+    scale = om2.MDistance(1.0, om2.MDistance.kCentimeters).asUnits(om2.MDistance.uiUnit())
+    for i in range(selection.length()):
+        shape = selection.getDagPath(i)
+        matrix = shape.inclusiveMatrix()
+        emitters['position'].extend(matrix.getElement(3, c) * scale for c in range(3))
+        # lights shine down their -Z axis
+        aim = (om2.MVector(0.0, 0.0, -1.0) * matrix).normal()
+        emitters['direction'].extend((aim.x, aim.y, aim.z))
+
+        shapeFn = om2.MFnDagNode(shape)
+        # directional and ambient lights have no decay, area lights always decay quadratically
+        decay = 2 if shapeFn.typeName == 'areaLight' else 0
+        if shapeFn.hasAttribute('decayRate'):
+            decay = shapeFn.findPlug('decayRate', False).asShort()
+        emitters['decay'].append(decay)
+
+        for attr in ('cone', 'penumbra'):
+            value = 0.0
+            if shapeFn.hasAttribute(attr + 'Angle'):
+                value = shapeFn.findPlug(attr + 'Angle', False).asMAngle().asRadians()
+            emitters[attr].append(value)
+
+    return emitters
+
+
+def readPlacements(paths):
+    # world matrix, parent and rotate order of every light's transform, with one
+    # selection list for the lot. Matrices are flat and row major, translation
+    # in the same units as the channel box.
+    selection = om2.MSelectionList()
+    for path in paths:
+        selection.add(path)
+
+    matrices = array('d')
+    parents = []
+    orders = array('b')
+    scale = om2.MDistance(1.0, om2.MDistance.kCentimeters).asUnits(om2.MDistance.uiUnit())
+    for i in range(selection.length()):
+        transform = selection.getDagPath(i)
+        transform.pop()
+        matrix = transform.inclusiveMatrix()
+        matrices.extend(matrix.getElement(row, col) for row in range(4) for col in range(4))
+        matrices[-4:-1] = array('d', [value * scale for value in matrices[-4:-1]])
+
+        parent = om2.MDagPath(transform)
+        parent.pop()
+        parents.append(parent.fullPathName() if parent.length() else None)
+        orders.append(om2.MFnDagNode(transform).findPlug('rotateOrder', False).asShort())
+
+    return matrices, parents, orders
+
+
+def readParentInverses(paths):
+    # inverse world matrix of whatever each light's transform is parented under,
+    # flat like readPlacements, identity for lights at the top of the scene
+    selection = om2.MSelectionList()
+    for path in paths:
+        selection.add(path)
+
+    matrices = array('d')
+    scale = om2.MDistance(1.0, om2.MDistance.kCentimeters).asUnits(om2.MDistance.uiUnit())
+    for i in range(selection.length()):
+        transform = selection.getDagPath(i)
+        transform.pop()
+        matrix = transform.exclusiveMatrixInverse()
+        matrices.extend(matrix.getElement(row, col) for row in range(4) for col in range(4))
+        matrices[-4:-1] = array('d', [value * scale for value in matrices[-4:-1]])
+
+    return matrices
+
+
+# channels saved with animation, and whether they live on the light's transform
+ANIMATED_CHANNELS = (
+    ('intensity', False), ('colorR', False), ('colorG', False), ('colorB', False), ('visibility', False),
+    ('translateX', True), ('translateY', True), ('translateZ', True),
+    ('rotateX', True), ('rotateY', True), ('rotateZ', True),
+    ('scaleX', True), ('scaleY', True), ('scaleZ', True),
+)
+
+
+def animatedPlugs(paths):
+    # (light number, channel, plug) of every keyed channel of the lights
+    selection = om2.MSelectionList()
+    for path in paths:
+        selection.add(path)
+
+    plugs = []
+    for i in range(selection.length()):
+        shape = selection.getDagPath(i)
+        transform = om2.MDagPath(shape)
+        transform.pop()
+        nodes = {False: om2.MFnDagNode(shape), True: om2.MFnDagNode(transform)}
+
+        for channel, onTransform in ANIMATED_CHANNELS:
+            plug = nodes[onTransform].findPlug(channel, False)
+            if oma2.MAnimUtil.isAnimated(plug):
+                plugs.append((i, channel, plug))
+    return plugs
+
+
+def channelUnits(channel):
+    # how many of Maya's internal units (centimeters, radians) make one UI unit
+    if channel.startswith('translate'):
+        return om2.MDistance(1.0, om2.MDistance.uiUnit()).asUnits(om2.MDistance.kCentimeters)
+    if channel.startswith('rotate'):
+        return om2.MAngle(1.0, om2.MAngle.uiUnit()).asUnits(om2.MAngle.kRadians)
+    return 1.0
+
+
+def sampleChannels(plugs, start, end):
+    # value of every plug on every frame from start to end, in UI units. The
+    # timeline is walked once with every plug read on each frame, and the
+    # scene's current time is never changed. Each read is given the frame's
+    # context, MDGContext.makeCurrent only came in Maya 2018.
+    scales = [1.0 / channelUnits(channel) for row, channel, plug in plugs]
+    samples = [array('d') for plug in plugs]
+    timeUnit = om2.MTime.uiUnit()
+
+    for frame in range(start, end + 1):
+        context = om2.MDGContext(om2.MTime(frame, timeUnit))
+        for (row, channel, plug), scale, values in zip(plugs, scales, samples):
+            values.append(plug.asDouble(context) * scale)
+
+    return samples
+
+
+def compressAnimation(names, properties, frames, channels, samples, tolerance):
+    # keep just enough keys of every sampled (light number, channel) to rebuild
+    # it, into the properties of the light saved under names[row]. Doesn't touch Maya.
+    with span('compressChannels', count=len(channels)):
+        for (row, channel), values in zip(channels, samples):
+            keys = LightRig.compressChannel(frames, values, tolerance, channel in LightRig.STEPPED_CHANNELS)
+            # channels that hold still are left at the value saved with the light
+            if keys is not None:
+                properties[names[row]].setdefault('animation', {})[channel] = keys
+
+
+def setKeys(path, animation):
+    # rebuild a light's saved animation, one curve per channel with every key
+    # added in a single call
+    onTransform = dict(ANIMATED_CHANNELS)
+    timeUnit = om2.MTime.uiUnit()
+    for channel, (frames, values) in animation.items():
+        if channel not in onTransform:
+            logger.info('Skipping unknown animated channel %s on %s' % (channel, path))
+            continue
+
+        node = path.rsplit('|', 1)[0] if onTransform[channel] else path
+        selection = om2.MSelectionList()
+        selection.add('%s.%s' % (node, channel))
+        plug = selection.getPlug(0)
+
+        times = om2.MTimeArray()
+        for frame in frames:
+            times.append(om2.MTime(frame, timeUnit))
+        scale = channelUnits(channel)
+
+        curve = oma2.MFnAnimCurve()
+        curve.create(plug)
+        # visibility holds each value until the next key instead of blending
+        if channel in LightRig.STEPPED_CHANNELS:
+            tangent = oma2.MFnAnimCurve.kTangentStep
+        else:
+            tangent = oma2.MFnAnimCurve.kTangentLinear
+        curve.addKeys(times, om2.MDoubleArray([value * scale for value in values]),
+                      oma2.MFnAnimCurve.kTangentLinear, tangent)
+
 
-# Basic contoller for lights
-class LightWidget(QtWidgets.QWidget):
+def cameraPosition():
+    # world position of the camera in the viewport that was used last
+    editor = cmds.playblast(activeEditor=True)
+    camera = cmds.modelEditor(editor, query=True, camera=True)
+    return cmds.xform(camera, query=True, worldSpace=True, translation=True)
 
-    # solo signal created for connecting to other Qt objects
-    onSolo = Signal(bool)
 
-    def __init__(self, light):
+def selectionPivots(selection):
+    # world pivot of every selected transform
+    return [cmds.xform(node, query=True, worldSpace=True, rotatePivot=True)
+            for node in cmds.ls(selection, long=True, type='transform')]
 
-        super(LightWidget, self).__init__()
 
-        # If light is a string, convert it to a PyMel object 
-        if isinstance(light, basestring):
-            logger.debug('Converting node to a PyNode')
+def setAttrs(nodes, attr, values):
+    # write one value per node, wrap in undoChunk to undo them all together
+    for node, value in zip(nodes, values):
+        cmds.setAttr('%s.%s' % (node, attr), value)
+
+
+def setColors(nodes, colors, attr='color'):
+    # colors are flat r, g, b, r, g, b...
+    for i, node in enumerate(nodes):
+        r, g, b = colors[i * 3:i * 3 + 3]
+        cmds.setAttr('%s.%s' % (node, attr), r, g, b, type='double3')
+
+
+def lightPath(light):
+    # If light is a string, convert it to a PyMel object 
+    if isinstance(light, basestring):
+        logger.debug('Converting node to a PyNode')
+        with span('pm.PyNode'):
             light = pm.PyNode(light)
 
-        # if transform make it a light shape, 
-        if isinstance(light, pm.nodetypes.Transform):
-            light = light.getShape()
+    # if transform make it a light shape, 
+    if isinstance(light, pm.nodetypes.Transform):
+        light = light.getShape()
 
-        self.light = light
-        self.buildUI()
+    # the full path is the only name guaranteed to be unique
+    return light.fullPath()
 
-    # THE UI 
-    def buildUI(self):
-        layout = QtWidgets.QGridLayout(self)
 
-        self.name = name = QtWidgets.QCheckBox(str(self.light.getTransform()))
-        name.setChecked(self.light.visibility.get())
-        
-        # lambdas are one time use functions. 
-        name.toggled.connect(lambda val: self.light.visibility.set(val))
-        # (row 0, column 0)
-        layout.addWidget(name, 0, 0)
-
-        # button to solo the light
-        solo = QtWidgets.QPushButton('Solo')
-        solo.setCheckable(True)
-        solo.toggled.connect(lambda val: self.onSolo.emit(val))
-        layout.addWidget(solo, 0, 1)
-
-        # delete light button 
-        delete = QtWidgets.QPushButton('X')
-        delete.clicked.connect(self.deleteLight)
-        delete.setMaximumWidth(20)
-        delete.setStyleSheet('background-color: rgba(255, 0, 0, 1.0);')
-        layout.addWidget(delete, 0, 2)
-
-        # slider for intensity of light
-        intensity = QtWidgets.QSlider(QtCore.Qt.Horizontal)
-        intensity.setMinimum(1)
-        intensity.setMaximum(1000)
-        # set its current value based on the intensity of the light itself
-        intensity.setValue(self.light.intensity.get())
-        intensity.valueChanged.connect(lambda val: self.light.intensity.set(val))
-        # row 1, column 2, take 1 row and 2 columns of space.
-        layout.addWidget(intensity, 1, 0, 1, 2)
-
-        # color light button 
-        self.colorBtn = QtWidgets.QPushButton()
-        self.colorBtn.setMaximumWidth(20)
-        self.colorBtn.setMaximumHeight(20)
-        self.setButtonColor()
-        self.colorBtn.clicked.connect(self.setColor)
-        layout.addWidget(self.colorBtn, 1, 2)
-
-        # widget should never be larger than the maximum space it needs
-        self.setSizePolicy(QtWidgets.QSizePolicy.Maximum, QtWidgets.QSizePolicy.Maximum)
-
-    def disableLight(self, val):
-        # takes a value, converts it to bool, then sets checkbox to value
-        self.name.setChecked(not bool(val))
-
-    def deleteLight(self):
-        # set parent to Nothing, will remove it from the manager UI and tells Qt to drop it
-        self.setParent(None)
-        # awkward period of time before Qt deletes it after clicking X..
-        # So mark its visibility to False
-        self.setVisible(False)
-        # delete it later just in case it hasn't gotten the hint yet
-        self.deleteLater()
-        pm.delete(self.light.getTransform())
-
-    def setColor(self):
-        lightColor = self.light.color.get()
-        color = pm.colorEditor(rgbValue=lightColor)
+# columns of every light list, the flat list and the tree share them
+NAME, TYPE, INTENSITY, COLOR = range(4)
 
-        # it gives back a string instead of a list of numbers.
-        # split the string, then convert it to floats
-        r, g, b, a = [float(c) for c in color.split()]
 
-        color = (r, g, b)
-        self.light.color.set(color)
-        self.setButtonColor(color)
+def lightFlags(column):
+    flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+    if column == NAME:
+        # the checkbox next to the name turns the light on and off
+        flags |= QtCore.Qt.ItemIsUserCheckable
+    elif column == INTENSITY:
+        flags |= QtCore.Qt.ItemIsEditable
+    return flags
 
-    def setButtonColor(self, color=None):
 
-        # If no color, use color from the light
-        if not color:
-            color = self.light.color.get()
+def lightData(store, row, column, role):
+    # what a view shows for one light of a LightStore
+    if role == QtCore.Qt.DisplayRole:
+        if column == NAME:
+            return store.name(row)
+        elif column == TYPE:
+            return store.lightType(row)
+        elif column == INTENSITY:
+            return '%.2f' % store.intensity[row]
+
+    elif role == QtCore.Qt.EditRole and column == INTENSITY:
+        return store.intensity[row]
+
+    elif role == QtCore.Qt.CheckStateRole and column == NAME:
+        return QtCore.Qt.Checked if store.visibility[row] else QtCore.Qt.Unchecked
+
+    elif role == QtCore.Qt.DecorationRole and column == COLOR:
+        # QColor only takes 0-1 values, lights can go brighter than that
+        r, g, b = [min(max(c, 0.0), 1.0) for c in store.vector('color', row)]
+        return QtGui.QColor.fromRgbF(r, g, b)
+
+    elif role == QtCore.Qt.ToolTipRole and column == COLOR:
+        return '%.3f, %.3f, %.3f' % store.vector('color', row)
 
-        assert len(color) == 3, "You must provide a list of 3 colors"
+    elif role == QtCore.Qt.ToolTipRole and column == NAME:
+        return store.paths[row]
+
+    return None
+
+
+def setLightData(store, row, column, value, role):
+    # write an edit made in a view to the scene and the store, False if it isn't editable
+    path = store.paths[row]
+
+    if role == QtCore.Qt.CheckStateRole and column == NAME:
+        visible = value == QtCore.Qt.Checked
+        cmds.setAttr('%s.visibility' % path, visible)
+        store.visibility[row] = visible
+    elif role == QtCore.Qt.EditRole and column == INTENSITY:
+        cmds.setAttr('%s.intensity' % path, float(value))
+        store.intensity[row] = float(value)
+    elif role == QtCore.Qt.EditRole and column == COLOR:
+        setColors([path], value)
+        store.put('color', [row], value)
+    else:
+        return False
+    return True
+
+
+# Table of lights, one row per light, that the manager's view displays.
+# Every value shown comes out of a LightStore, Maya is only touched on edits.
+class LightModel(QtCore.QAbstractTableModel):
+
+    # also on the class, views refer to LightModel.COLOR and friends
+    NAME, TYPE, INTENSITY, COLOR = NAME, TYPE, INTENSITY, COLOR
+    headers = ('Name', 'Type', 'Intensity', 'Color')
+
+    def __init__(self, parent=None):
+        super(LightModel, self).__init__(parent)
+        self.store = LightStore.LightStore()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        # a table has no children under its rows
+        if parent.isValid():
+            return 0
+        return len(self.store)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        return lightFlags(index.column())
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        return lightData(self.store, index.row(), index.column(), role)
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or not setLightData(self.store, index.row(), index.column(), value, role):
+            return False
+
+        self.dataChanged.emit(index, index)
+        return True
+
+    def setLights(self, paths):
+        # swap the whole table in one go, views rebuild once instead of per light
+        store = LightStore.LightStore()
+        with span('readLights', count=len(paths)):
+            store.extend(readLights(paths))
+
+        self.beginResetModel()
+        self.store = store
+        self.endResetModel()
+
+    def addLights(self, paths):
+        if not paths:
+            return
+
+        first = len(self.store)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(paths) - 1)
+        with span('readLights', count=len(paths)):
+            self.store.extend(readLights(paths))
+        self.endInsertRows()
+
+    def refreshRows(self, rows):
+        # re-read rows from the scene, picks up edits made outside the manager
+        if not rows:
+            return
+
+        store = self.store
+        with span('readLights', count=len(rows)):
+            for row, light in zip(rows, readLights([store.paths[row] for row in rows])):
+                store.assign(row, *light)
+
+        self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(self.headers) - 1))
+
+    def removeLights(self, rows):
+        # remove rows in contiguous runs, bottom up, so every run is one removal
+        # and the rows above it keep their numbers.
+        for first, last in LightStore.runs(rows):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            self.store.removeRange(first, last)
+            self.endRemoveRows()
+
+    def updateLights(self, paths, column, values):
+        # values is a take() sized array of column for paths, lights not listed are skipped
+        store = self.store
+        found = [(i, store.row(path)) for i, path in enumerate(paths) if store.row(path) is not None]
+        if not found:
+            return
+
+        typecode, width = store.columns[column]
+        rows = [row for i, row in found]
+        store.put(column, rows, [v for i, row in found for v in values[i * width:i * width + width]])
+        self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(self.headers) - 1))
+
+    def lightAt(self, index):
+        return self.store, index.row()
+
+    def removePaths(self, paths):
+        store = self.store
+        self.removeLights([row for row in map(store.row, paths) if row is not None])
+
+
+# keys the light list can be sorted by, and ways it can be grouped
+SORT_NAME, SORT_TYPE, SORT_INTENSITY, SORT_VISIBILITY = 'name', 'type', 'intensity', 'visibility'
+GROUP_TYPE, GROUP_NAMESPACE, GROUP_PARENT = 'type', 'namespace', 'parent'
+
+
+def descendingText(text):
+    # a key that sorts text backwards: every character negated, plus an end
+    # marker that puts "ab" after "abc"
+    return tuple(-ord(c) for c in text) + (1,)
+
+
+class LightGroup(object):
+    # lights under one group row, order is kept sorted
+
+    __slots__ = ('name', 'order')
+
+    def __init__(self, name):
+        self.name = name
+        self.order = []
+
+
+# Filters, sorts and groups the LightModel.
+# Every light that passes the search is a (sort key, sequence, path) tuple in
+# the sorted order list of its group, so a changed light is a bisect out and a
+# bisect back in. Lights are tracked by path, rows moving in the source model
+# don't touch anything here. A NameIndex finds the lights matching a search so
+# a search never has to look at every row.
+class LightProxyModel(QtCore.QAbstractProxyModel):
+
+    # emitted when a light type or namespace turns up or disappears
+    facetsChanged = Signal()
+
+    # changes to more rows than this are applied with one relayout or reset, not row by row
+    incrementalLimit = 64
+
+    def __init__(self, parent=None):
+        super(LightProxyModel, self).__init__(parent)
+        self.nameIndex = LightIndex.NameIndex()
+        # text, mode, light type and namespace of the current search
+        self.query = ('', LightIndex.TEXT, None, None)
+        # (sort key, descending) pairs, most important first
+        self.sortKeys = []
+        self.grouping = None
+
+        # path -> order the light came in, the unsorted order and the tie breaker
+        self.sequence = {}
+        self.nextSequence = 0
+        # path -> (order entry, group) of every light that passes the search
+        self.entries = {}
+
+        # lights hang straight off the root from flat when not grouping, otherwise
+        # group rows (internal pointer top) hold the lights
+        self.flat = LightGroup(None)
+        self.top = LightGroup(None)
+        self.groups = {}
+        self.groupNames = []
+
+        # paths a spatial query limited the list to, None when there is no limit
+        self.region = None
+
+        # set while the source is removing rows
+        self.resetting = False
+        self.emptied = False
+
+    def setSourceModel(self, model):
+        super(LightProxyModel, self).setSourceModel(model)
+        model.modelReset.connect(self.sourceReset)
+        model.rowsInserted.connect(self.sourceRowsInserted)
+        model.rowsAboutToBeRemoved.connect(self.sourceRowsAboutToBeRemoved)
+        model.rowsRemoved.connect(self.sourceRowsRemoved)
+        model.dataChanged.connect(self.sourceDataChanged)
+        self.sourceReset()
+
+    # -- sort keys and groups
+
+    def sortKey(self, row):
+        store = self.sourceModel().store
+        key = []
+        for sortKey, descending in self.sortKeys:
+            if sortKey == SORT_NAME:
+                value = store.name(row).lower()
+            elif sortKey == SORT_TYPE:
+                value = store.lightType(row)
+            elif sortKey == SORT_INTENSITY:
+                value = store.intensity[row]
+            else:
+                value = store.visibility[row]
+
+            if descending:
+                value = -value if isinstance(value, (int, float)) else descendingText(value)
+            key.append(value)
+        return tuple(key)
+
+    def entry(self, row):
+        path = self.sourceModel().store.paths[row]
+        return (self.sortKey(row), self.sequence[path], path)
+
+    def groupName(self, row):
+        store = self.sourceModel().store
+        if self.grouping == GROUP_TYPE:
+            return store.lightType(row)
+        elif self.grouping == GROUP_NAMESPACE:
+            return LightIndex.namespace(store.name(row)) or ':'
+        elif self.grouping == GROUP_PARENT:
+            return store.transformPath(row).rsplit('|', 1)[0] or '|'
+        return None
+
+    def parentIndex(self, group):
+        # the index the lights of group hang under
+        if group is self.flat:
+            return QtCore.QModelIndex()
+        return self.createIndex(bisect_left(self.groupNames, group.name), 0, self.top)
+
+    def search(self, query):
+        # keys passing the search and the region, None if nothing is filtered out
+        keys = self.nameIndex.search(*query)
+        if self.region is not None:
+            keys = set(self.region) if keys is None else keys & self.region
+        return keys
+
+    def rebuild(self):
+        self.rebuildFrom(self.search(self.query))
+
+    def rebuildFrom(self, keys):
+        # put every light in keys (None for all of them) in its group, in order
+        store = self.sourceModel().store
+        rows = range(len(store)) if keys is None else [store.row(key) for key in keys]
+
+        self.entries = {}
+        self.flat = LightGroup(None)
+        self.groups = {}
+        for row in rows:
+            entry = self.entry(row)
+            if self.grouping is None:
+                group = self.flat
+            else:
+                name = self.groupName(row)
+                group = self.groups.get(name)
+                if group is None:
+                    group = self.groups[name] = LightGroup(name)
+            group.order.append(entry)
+            self.entries[entry[-1]] = (entry, group)
+
+        for group in [self.flat] + list(self.groups.values()):
+            group.order.sort()
+        self.groupNames = sorted(self.groups)
+
+    def persistentKey(self, index):
+        # what an index points at, in a form that survives a rebuild
+        group = index.internalPointer()
+        if group is self.top:
+            return (True, self.groupNames[index.row()], index.column())
+        return (False, group.order[index.row()][-1], index.column())
+
+    def indexFromKey(self, key):
+        isGroup, name, column = key
+        if isGroup:
+            if name not in self.groups:
+                return QtCore.QModelIndex()
+            return self.createIndex(bisect_left(self.groupNames, name), column, self.top)
+
+        item = self.entries.get(name)
+        if item is None:
+            return QtCore.QModelIndex()
+        entry, group = item
+        return self.createIndex(bisect_left(group.order, entry), column, group)
+
+    def relayout(self):
+        # re-sort everything in one go, selection and expanded groups follow their lights
+        with span('relayout'):
+            self.layoutAboutToBeChanged.emit()
+            persistent = self.persistentIndexList()
+            keys = [self.persistentKey(index) for index in persistent]
+            self.rebuild()
+            self.changePersistentIndexList(persistent, [self.indexFromKey(key) for key in keys])
+            self.layoutChanged.emit()
+
+    def setFilter(self, text='', mode=LightIndex.TEXT, lightType=None, ns=None):
+        # raises re.error for a bad regex, leaving the current search in place
+        with span('filter'):
+            keys = self.search((text, mode, lightType, ns))
+            self.beginResetModel()
+            self.query = (text, mode, lightType, ns)
+            self.rebuildFrom(keys)
+            self.endResetModel()
+
+    def setRegion(self, keys):
+        # only show the lights in keys, found with a spatial query. None shows them all.
+        region = None if keys is None else set(keys)
+        if region == self.region:
+            # lights moved around without leaving or entering the region
+            return
+
+        with span('region'):
+            self.beginResetModel()
+            self.region = region
+            self.rebuild()
+            self.endResetModel()
+
+    def setSort(self, sortKeys):
+        self.sortKeys = list(sortKeys)
+        self.relayout()
+
+    def setGrouping(self, grouping):
+        self.beginResetModel()
+        self.grouping = grouping
+        self.rebuild()
+        self.endResetModel()
+
+    def accepts(self, key):
+        if self.region is not None and key not in self.region:
+            return False
+        return self.nameIndex.matches(key, *self.query)
+
+    # -- keeping up with the source model one light at a time
+
+    def insertLight(self, row):
+        entry = self.entry(row)
+        group = self.flat
+        if self.grouping is not None:
+            name = self.groupName(row)
+            group = self.groups.get(name)
+            if group is None:
+                position = bisect_left(self.groupNames, name)
+                self.beginInsertRows(QtCore.QModelIndex(), position, position)
+                group = self.groups[name] = LightGroup(name)
+                self.groupNames.insert(position, name)
+                self.endInsertRows()
+
+        position = bisect_left(group.order, entry)
+        self.beginInsertRows(self.parentIndex(group), position, position)
+        group.order.insert(position, entry)
+        self.entries[entry[-1]] = (entry, group)
+        self.endInsertRows()
+
+    def removeLight(self, path):
+        item = self.entries.get(path)
+        if item is None:
+            return
+
+        entry, group = item
+        position = bisect_left(group.order, entry)
+        self.beginRemoveRows(self.parentIndex(group), position, position)
+        del group.order[position]
+        del self.entries[path]
+        self.endRemoveRows()
+
+        # drop the group row once its last light is gone
+        if group is not self.flat and not group.order:
+            position = bisect_left(self.groupNames, group.name)
+            self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+            del self.groupNames[position]
+            del self.groups[group.name]
+            self.endRemoveRows()
+
+    def updateLight(self, row):
+        # move a light whose values changed to its new place, O(log N) comparisons
+        path = self.sourceModel().store.paths[row]
+        item = self.entries.get(path)
+        if item is None:
+            return
+
+        entry, group = item
+        if group is not self.flat and self.groupName(row) != group.name:
+            self.removeLight(path)
+            self.insertLight(row)
+            return
+
+        changed = (self.sortKey(row),) + entry[1:]
+        position = bisect_left(group.order, entry)
+        parent = self.parentIndex(group)
+
+        if changed == entry:
+            final = position
+        else:
+            target = bisect_left(group.order, changed)
+            if target in (position, position + 1):
+                # still sorts into the same spot
+                final = position
+                group.order[position] = changed
+            else:
+                self.beginMoveRows(parent, position, position, parent, target)
+                del group.order[position]
+                final = target - 1 if target > position else target
+                group.order.insert(final, changed)
+                self.endMoveRows()
+            self.entries[path] = (changed, group)
+
+        self.dataChanged.emit(self.index(final, 0, parent),
+                              self.index(final, self.columnCount() - 1, parent))
+
+    def sourceReset(self):
+        store = self.sourceModel().store
+        self.beginResetModel()
+        self.nameIndex.clear()
+        self.sequence = {}
+        self.nextSequence = 0
+        for row in range(len(store)):
+            self.indexLight(row)
+        self.rebuild()
+        self.endResetModel()
+        self.facetsChanged.emit()
+
+    def indexLight(self, row):
+        store = self.sourceModel().store
+        path = store.paths[row]
+        self.sequence[path] = self.nextSequence
+        self.nextSequence += 1
+        return self.nameIndex.add(path, store.name(row), store.lightType(row))
+
+    def sourceRowsInserted(self, parent, first, last):
+        store = self.sourceModel().store
+        newFacet = False
+        for row in range(first, last + 1):
+            newFacet |= self.indexLight(row)
+
+        if last - first + 1 > self.incrementalLimit:
+            self.beginResetModel()
+            self.rebuild()
+            self.endResetModel()
+        else:
+            for row in range(first, last + 1):
+                if self.accepts(store.paths[row]):
+                    self.insertLight(row)
+
+        if newFacet:
+            self.facetsChanged.emit()
+
+    def sourceRowsAboutToBeRemoved(self, parent, first, last):
+        paths = self.sourceModel().store.paths[first:last + 1]
+
+        # big removals reset once the source rows are gone, small ones go light by light
+        self.resetting = len(paths) > self.incrementalLimit
+        if self.resetting:
+            self.beginResetModel()
+        else:
+            for path in paths:
+                self.removeLight(path)
+
+        self.emptied = False
+        for path in paths:
+            self.emptied |= self.nameIndex.discard(path)
+            del self.sequence[path]
+            if self.region is not None:
+                self.region.discard(path)
+
+    def sourceRowsRemoved(self, parent, first, last):
+        if self.resetting:
+            self.rebuild()
+            self.endResetModel()
+            self.resetting = False
+
+        if self.emptied:
+            self.facetsChanged.emit()
+
+    def sourceDataChanged(self, topLeft, bottomRight, *args):
+        rows = range(topLeft.row(), bottomRight.row() + 1)
+        if len(rows) > self.incrementalLimit:
+            # a bulk edit, re-sort once instead of moving lights one at a time
+            self.relayout()
+            return
+
+        for row in rows:
+            self.updateLight(row)
+
+    # -- QAbstractProxyModel
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not 0 <= column < self.columnCount():
+            return QtCore.QModelIndex()
+
+        if not parent.isValid():
+            if self.grouping is None:
+                if 0 <= row < len(self.flat.order):
+                    return self.createIndex(row, column, self.flat)
+            elif 0 <= row < len(self.groupNames):
+                return self.createIndex(row, column, self.top)
+
+        elif parent.internalPointer() is self.top and parent.column() == 0:
+            group = self.groups[self.groupNames[parent.row()]]
+            if 0 <= row < len(group.order):
+                return self.createIndex(row, column, group)
+
+        return QtCore.QModelIndex()
+
+    def parent(self, index=None):
+        if index is None or not index.isValid():
+            return QtCore.QModelIndex()
+
+        group = index.internalPointer()
+        if group is self.top or group is self.flat:
+            return QtCore.QModelIndex()
+        return self.parentIndex(group)
+
+    def sibling(self, row, column, index):
+        return self.index(row, column, self.parent(index))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return len(self.flat.order) if self.grouping is None else len(self.groupNames)
+        if parent.internalPointer() is self.top and parent.column() == 0:
+            return len(self.groups[self.groupNames[parent.row()]].order)
+        return 0
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        return self.rowCount(parent) > 0
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def isGroup(self, index):
+        return index.isValid() and index.internalPointer() is self.top
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if self.isGroup(index):
+            if role == QtCore.Qt.DisplayRole and index.column() == 0:
+                name = self.groupNames[index.row()]
+                return '%s (%d)' % (name, len(self.groups[name].order))
+            return None
+        return super(LightProxyModel, self).data(index, role)
+
+    def flags(self, index):
+        if self.isGroup(index):
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        return super(LightProxyModel, self).flags(index)
+
+    def mapToSource(self, index):
+        if not index.isValid() or index.internalPointer() is self.top:
+            return QtCore.QModelIndex()
+
+        path = index.internalPointer().order[index.row()][-1]
+        return self.sourceModel().index(self.sourceModel().store.row(path), index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        path = self.sourceModel().store.paths[index.row()]
+        return self.indexFromKey((False, path, index.column()))
+
+    def groupRows(self, index):
+        # source rows of every light under a group row
+        store = self.sourceModel().store
+        group = self.groups[self.groupNames[index.row()]]
+        return [store.row(entry[-1]) for entry in group.order]
+
+
+# ways the light list can be limited to one area of the scene
+REGION_SELECTION, REGION_CAMERA, REGION_NEAREST, REGION_BOX = 'selection', 'camera', 'nearest', 'box'
+
+
+def removeCallbacks(callbacks, *args):
+    # remove the Maya callbacks in a path -> id dict, args soaks up what a signal passes
+    if callbacks:
+        om2.MMessage.removeCallbacks(list(callbacks.values()))
+        callbacks.clear()
+
+
+# Keeps a SpatialGrid of light positions up to date while the list is
+# limited to an area. Every tracked light gets a world matrix callback, the
+# callbacks only note which lights moved and the moved lights are read back
+# in one go once Maya is idle, so dragging a group of lights around doesn't
+# read them once per callback.
+class LightPositions(QtCore.QObject):
+
+    # emitted once moved lights have been read back into the grid
+    moved = Signal()
+
+    def __init__(self, parent=None):
+        super(LightPositions, self).__init__(parent)
+        self.grid = LightIndex.SpatialGrid()
+        # path -> world matrix callback id
+        self.callbacks = {}
+        self.dirty = set()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.update)
+
+        # Maya would keep calling into a closed manager, the callbacks go with it
+        self.destroyed.connect(partial(removeCallbacks, self.callbacks))
+
+    def __len__(self):
+        return len(self.callbacks)
+
+    def track(self, paths):
+        paths = [path for path in paths if path not in self.callbacks]
+        if not paths:
+            return
+
+        with span('readPositions', count=len(paths)):
+            items = list(zip(paths, readPositions(paths)))
+        if not self.grid:
+            # size the cells for the lights on hand
+            self.grid = LightIndex.SpatialGrid.fit(items)
+        else:
+            for path, position in items:
+                self.grid.move(path, position)
+
+        with span('addWorldMatrixModifiedCallback', count=len(paths)):
+            selection = om2.MSelectionList()
+            for path in paths:
+                selection.add(path)
+            for i, path in enumerate(paths):
+                self.callbacks[path] = om2.MDagMessage.addWorldMatrixModifiedCallback(
+                    selection.getDagPath(i), self.changed, path)
+
+        # anyone filtering by position needs to hear about the new lights
+        self.timer.start()
+
+    def untrack(self, paths):
+        ids = []
+        for path in paths:
+            callback = self.callbacks.pop(path, None)
+            if callback is not None:
+                ids.append(callback)
+                self.grid.discard(path)
+        if ids:
+            om2.MMessage.removeCallbacks(ids)
+
+    def clear(self):
+        removeCallbacks(self.callbacks)
+        self.dirty = set()
+        self.grid = LightIndex.SpatialGrid()
+
+    def changed(self, node, modified, path):
+        # called by Maya for every change to a light's world matrix
+        self.dirty.add(path)
+        self.timer.start()
+
+    def update(self):
+        paths = [path for path in self.dirty if path in self.callbacks]
+        self.dirty = set()
+        if paths:
+            with span('readPositions', count=len(paths)):
+                for path, position in zip(paths, readPositions(paths)):
+                    self.grid.move(path, position)
+        self.moved.emit()
+
+
+# The namespace tree, every referenced file brings its lights in under its
+# own namespace. Only the root namespace is read when the tree is shown, a
+# branch is read from the scene the first time it's expanded and dropped
+# again when it's collapsed, so a set dressed shot opens with just the lights
+# that live in the shot itself. A collapsed branch only knows how many lights
+# it holds, counted by name the first time it's drawn.
+
+
+def childNamespaces(namespace):
+    # namespaces directly under namespace, ":" is the root
+    with span('cmds.namespaceInfo'):
+        children = cmds.namespaceInfo(namespace, listOnlyNamespaces=True) or []
+    children = [child.lstrip(':') for child in children]
+    # Maya's own namespaces never hold lights
+    return sorted(child for child in children if child not in ('UI', 'shared'))
+
+
+def namespacePattern(namespace):
+    return '*' if namespace == ':' else '%s:*' % namespace
+
+
+def namespaceLights(namespace):
+    # full paths of the lights directly in namespace, not in the ones under it
+    with span('cmds.ls', namespace=namespace):
+        return cmds.ls(namespacePattern(namespace), type=LIGHT_TYPES, long=True) or []
+
+
+def referenceFiles():
+    # namespace -> file name of every referenced file, nested references too
+    files = {}
+    with span('referenceQuery'):
+        for node in cmds.ls(type='reference') or []:
+            try:
+                ns = cmds.referenceQuery(node, namespace=True)
+                path = cmds.referenceQuery(node, filename=True, withoutCopyNumber=True)
+            except RuntimeError:
+                # sharedReferenceNode and reference nodes that lost their file
+                continue
+            files[ns.lstrip(':')] = os.path.basename(path)
+    return files
+
+
+class LightBranch(object):
+    # a namespace in the tree, its child namespaces and lights are only
+    # there while the branch is expanded
+
+    __slots__ = ('namespace', 'parent', 'children', 'store', 'loaded')
+
+    def __init__(self, namespace, parent=None):
+        self.namespace = namespace
+        self.parent = parent
+        self.children = []
+        self.store = None
+        self.loaded = False
+
+    def __len__(self):
+        # child namespaces come first, then the lights
+        if not self.loaded:
+            return 0
+        return len(self.children) + len(self.store)
+
+    def row(self):
+        return self.parent.children.index(self)
+
+    def name(self):
+        return self.namespace.rsplit(':', 1)[-1]
+
+
+# Every index points at the branch holding it, the same way the proxy's rows
+# point at their group, so nothing is allocated per light for the view.
+class LightTreeModel(QtCore.QAbstractItemModel):
+
+    headers = LightModel.headers
+
+    def __init__(self, parent=None):
+        super(LightTreeModel, self).__init__(parent)
+        self.clear()
+
+    def clear(self):
+        # an empty tree, nothing read from the scene
+        self.beginResetModel()
+        self.root = LightBranch(':')
+        # namespace -> expanded branch, how edits find their lights
+        self.branches = {}
+        # namespace -> lights in and under it, filled in as branches are drawn
+        self.counts = {}
+        # namespace -> referenced file it came from
+        self.references = {}
+        self.load(self.root, [], LightStore.LightStore())
+        self.endResetModel()
+
+    @profiled('tree.reload')
+    def reload(self):
+        # start over with only the root namespace read in
+        self.beginResetModel()
+        self.root = LightBranch(':')
+        self.branches = {}
+        self.counts = {}
+        self.references = referenceFiles()
+        self.load(self.root, *self.read(self.root))
+        self.endResetModel()
+
+    def read(self, branch):
+        # a branch's child namespaces and lights, straight from the scene
+        paths = namespaceLights(branch.namespace)
+        store = LightStore.LightStore()
+        with span('readLights', count=len(paths)):
+            store.extend(readLights(paths))
+        return [LightBranch(ns, branch) for ns in childNamespaces(branch.namespace)], store
+
+    def load(self, branch, children, store):
+        branch.children = children
+        branch.store = store
+        branch.loaded = True
+        self.branches[branch.namespace] = branch
+
+    def count(self, namespace):
+        # lights in and under namespace, only their names are listed
+        count = self.counts.get(namespace)
+        if count is None:
+            with span('cmds.ls', namespace=namespace):
+                count = len(cmds.ls(namespacePattern(namespace), type=LIGHT_TYPES) or [])
+            count += sum(self.count(child) for child in childNamespaces(namespace))
+            self.counts[namespace] = count
+        return count
+
+    def recount(self, namespaces):
+        # forget the counts of namespaces and every namespace above them, and
+        # repaint any of their rows that are showing
+        chain = set()
+        for ns in namespaces:
+            while ns:
+                chain.add(ns)
+                ns = LightIndex.namespace(ns)
+
+        for ns in chain:
+            self.counts.pop(ns, None)
+            parent = self.branches.get(LightIndex.namespace(ns) or ':')
+            for branch in parent.children if parent else ():
+                if branch.namespace == ns:
+                    index = self.branchIndex(branch)
+                    self.dataChanged.emit(index, index)
+
+    @profiled('tree.fetchMore')
+    def fetchMore(self, parent):
+        branch = self.branch(parent)
+        if branch is None or branch.loaded:
+            return
+
+        # read first, the rows can only be announced once we know how many there are
+        children, store = self.read(branch)
+        rows = len(children) + len(store)
+        if rows:
+            self.beginInsertRows(parent, 0, rows - 1)
+        self.load(branch, children, store)
+        if rows:
+            self.endInsertRows()
+
+    def canFetchMore(self, parent):
+        branch = self.branch(parent)
+        return branch is not None and not branch.loaded
+
+    def unload(self, index):
+        # let go of a collapsed branch, it's read again the next time it's expanded
+        branch = self.branch(index)
+        if branch is None or branch is self.root or not branch.loaded:
+            return
+
+        rows = len(branch)
+        if rows:
+            self.beginRemoveRows(index, 0, rows - 1)
+        self.forget(branch)
+        branch.children = []
+        branch.store = None
+        branch.loaded = False
+        if rows:
+            self.endRemoveRows()
+
+    def forget(self, branch):
+        self.branches.pop(branch.namespace, None)
+        for child in branch.children:
+            self.forget(child)
+
+    def find(self, path):
+        # (branch, row) of a light, row is None unless its branch is expanded
+        ns = LightIndex.namespace(path.rsplit('|', 1)[-1]) or ':'
+        branch = self.branches.get(ns)
+        if branch is None:
+            return None, None
+        return branch, branch.store.row(path)
+
+    def indexOf(self, path):
+        branch, row = self.find(path)
+        if row is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(len(branch.children) + row, 0, branch)
+
+    def branchRows(self, paths):
+        # {branch: [(position in paths, row)]} for the lights in expanded branches
+        found = {}
+        for i, path in enumerate(paths):
+            branch, row = self.find(path)
+            if row is not None:
+                found.setdefault(branch, []).append((i, row))
+        return found
+
+    def updateLights(self, paths, column, values):
+        # same as LightModel.updateLights, lights in collapsed branches are skipped
+        typecode, width = LightStore.LightStore.columns[column]
+        for branch, found in self.branchRows(paths).items():
+            rows = [row for i, row in found]
+            branch.store.put(column, rows, [v for i, row in found for v in values[i * width:i * width + width]])
+
+            offset = len(branch.children)
+            parent = self.branchIndex(branch)
+            self.dataChanged.emit(self.index(offset + min(rows), 0, parent),
+                                  self.index(offset + max(rows), len(self.headers) - 1, parent))
+
+    def addLights(self, paths):
+        # new lights only get rows in expanded branches, the rest only change counts
+        byBranch = {}
+        for path in paths:
+            branch, row = self.find(path)
+            if branch is not None and row is None:
+                byBranch.setdefault(branch, []).append(path)
+
+        for branch, branchPaths in byBranch.items():
+            first = len(branch)
+            self.beginInsertRows(self.branchIndex(branch), first, first + len(branchPaths) - 1)
+            with span('readLights', count=len(branchPaths)):
+                branch.store.extend(readLights(branchPaths))
+            self.endInsertRows()
+
+        self.recount(LightIndex.namespace(path.rsplit('|', 1)[-1]) for path in paths)
+
+    def removePaths(self, paths):
+        for branch, found in self.branchRows(paths).items():
+            offset = len(branch.children)
+            parent = self.branchIndex(branch)
+            for first, last in LightStore.runs([row for i, row in found]):
+                self.beginRemoveRows(parent, offset + first, offset + last)
+                branch.store.removeRange(first, last)
+                self.endRemoveRows()
+
+        self.recount(LightIndex.namespace(path.rsplit('|', 1)[-1]) for path in paths)
+
+    def branch(self, index):
+        # the branch an index stands for, None for a light
+        if not index.isValid():
+            return self.root
+        owner = index.internalPointer()
+        if index.row() < len(owner.children):
+            return owner.children[index.row()]
+        return None
+
+    def branchIndex(self, branch):
+        if branch is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(branch.row(), 0, branch.parent)
+
+    def lightAt(self, index):
+        # (store, row) of the light an index stands for, None for a branch
+        owner = index.internalPointer()
+        row = index.row() - len(owner.children)
+        if row < 0:
+            return None
+        return owner.store, row
+
+    def paths(self, indexes):
+        # full paths of the lights under indexes, a branch stands for every
+        # light in and under its namespace, expanded or not
+        paths = []
+        for index in indexes:
+            branch = self.branch(index)
+            if branch is None:
+                store, row = self.lightAt(index)
+                paths.append(store.paths[row])
+            else:
+                paths.extend(self.namespacePaths(branch.namespace))
+
+        seen = set()
+        return [path for path in paths if not (path in seen or seen.add(path))]
+
+    def namespacePaths(self, namespace):
+        paths = namespaceLights(namespace)
+        for child in childNamespaces(namespace):
+            paths.extend(self.namespacePaths(child))
+        return paths
+
+    # -- QAbstractItemModel
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        # only the first column has children
+        branch = self.branch(parent) if parent.column() <= 0 else None
+        if branch is None or not 0 <= row < len(branch) or not 0 <= column < len(self.headers):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, branch)
+
+    def parent(self, index=None):
+        if index is None or not index.isValid():
+            return QtCore.QModelIndex()
+        return self.branchIndex(index.internalPointer())
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        branch = self.branch(parent) if parent.column() <= 0 else None
+        return len(branch) if branch is not None else 0
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        # collapsed branches answer with a count, no rows are made for them
+        branch = self.branch(parent) if parent.column() <= 0 else None
+        if branch is None:
+            return False
+        if branch.loaded:
+            return len(branch) > 0
+        return self.count(branch.namespace) > 0
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        branch = self.branch(index)
+        if branch is None:
+            store, row = self.lightAt(index)
+            return lightData(store, row, index.column(), role)
+
+        if role == QtCore.Qt.DisplayRole:
+            if index.column() == NAME:
+                return '%s (%d)' % (branch.name(), self.count(branch.namespace))
+            elif index.column() == TYPE:
+                # referenced namespaces show the file they came from
+                return self.references.get(branch.namespace, 'namespace')
+        elif role == QtCore.Qt.ToolTipRole and index.column() == NAME:
+            return branch.namespace
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        if self.branch(index) is not None:
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        return lightFlags(index.column())
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or self.branch(index) is not None:
+            return False
+
+        store, row = self.lightAt(index)
+        if not setLightData(store, row, index.column(), value, role):
+            return False
+
+        self.dataChanged.emit(index, index)
+        return True
+
+
+# spin box for editing intensity in place, the default one stops at 99.99
+class IntensityDelegate(QtWidgets.QStyledItemDelegate):
+
+    def createEditor(self, parent, option, index):
+        editor = QtWidgets.QDoubleSpinBox(parent)
+        editor.setRange(0, 100000)
+        editor.setDecimals(3)
+        return editor
 
-        # multiply members of color by 255 to get the correct number
-        r, g, b = [c * 255 for c in color]
-        self.colorBtn.setStyleSheet('background-color: rgba(%s, %s, %s, 1.0);' % (r, g, b))
 
 # Main Lighting Manager
 class LightingManager(QtWidgets.QWidget):
 
+    # a rig file finished writing on its thread, the file name and why it
+    # couldn't be written, empty when it was
+    rigSaved = Signal(str, str)
+
     lightTypes = {
         "Point Light": pm.pointLight,
         "Spot Light": pm.spotLight,
@@ -206,78 +1491,682 @@ class LightingManager(QtWidgets.QWidget):
         createBtn.clicked.connect(self.createLight)
         layout.addWidget(createBtn, 0, 2)
 
-        # scroll container widget
-        scrollWidget = QtWidgets.QWidget()
-        scrollWidget.setSizePolicy(QtWidgets.QSizePolicy.Maximum, QtWidgets.QSizePolicy.Maximum)
-        self.scrollLayout = QtWidgets.QVBoxLayout(scrollWidget)
-
-        scrollArea = QtWidgets.QScrollArea()
-        scrollArea.setWidgetResizable(True)
-        scrollArea.setWidget(scrollWidget)
-        layout.addWidget(scrollArea, 1, 0, 1, 3)
+        # search bar, typing filters the list as you go
+        searchLayout = QtWidgets.QHBoxLayout()
+        self.searchLE = QtWidgets.QLineEdit()
+        self.searchLE.setPlaceholderText('Search lights...')
+        self.searchLE.textChanged.connect(lambda text: self.filterLights())
+        searchLayout.addWidget(self.searchLE)
+
+        # plain text, glob (key_*) or regular expression searches
+        self.searchModeCB = QtWidgets.QComboBox()
+        for mode in (LightIndex.TEXT, LightIndex.GLOB, LightIndex.REGEX):
+            self.searchModeCB.addItem(mode.capitalize(), mode)
+        self.searchModeCB.currentIndexChanged.connect(lambda index: self.filterLights())
+        searchLayout.addWidget(self.searchModeCB)
+
+        # narrow the search down to one light type or namespace
+        self.typeFilterCB = QtWidgets.QComboBox()
+        self.typeFilterCB.currentIndexChanged.connect(lambda index: self.filterLights())
+        searchLayout.addWidget(self.typeFilterCB)
+
+        self.namespaceFilterCB = QtWidgets.QComboBox()
+        self.namespaceFilterCB.currentIndexChanged.connect(lambda index: self.filterLights())
+        searchLayout.addWidget(self.namespaceFilterCB)
+        layout.addLayout(searchLayout, 1, 0, 1, 3)
+
+        # limit the list to the lights in one area of the scene
+        regionLayout = QtWidgets.QHBoxLayout()
+        regionLayout.addWidget(QtWidgets.QLabel('Area'))
+        self.regionCB = QtWidgets.QComboBox()
+        for region, label in ((None, 'Anywhere'), (REGION_SELECTION, 'Within Radius of Selection'),
+                              (REGION_CAMERA, 'Within Radius of Camera'), (REGION_NEAREST, 'Nearest to Selection'),
+                              (REGION_BOX, 'Inside Selection Bounding Box')):
+            self.regionCB.addItem(label, region)
+        self.regionCB.currentIndexChanged.connect(lambda index: self.pickRegion())
+        regionLayout.addWidget(self.regionCB)
+
+        # the radius, or how many lights for nearest
+        self.regionSB = QtWidgets.QDoubleSpinBox()
+        self.regionSB.setRange(0, 1000000)
+        self.regionSB.setValue(100)
+        self.regionSB.valueChanged.connect(lambda value: self.regionLights())
+        regionLayout.addWidget(self.regionSB)
+
+        # the area is taken from the selection or camera when it's picked, this takes it again
+        regionBtn = QtWidgets.QPushButton('Update')
+        regionBtn.clicked.connect(lambda: self.pickRegion())
+        regionLayout.addWidget(regionBtn)
+        layout.addLayout(regionLayout, 2, 0, 1, 3)
+
+        # light positions, only followed while the list is limited to an area
+        self.positions = LightPositions(self)
+        self.positions.moved.connect(lambda: self.regionLights())
+        self.region = None
+
+        # sorting and grouping, the list stays in order as lights change
+        sortLayout = QtWidgets.QHBoxLayout()
+        sortLayout.addWidget(QtWidgets.QLabel('Sort'))
+        sortKeys = ((None, 'None'), (SORT_NAME, 'Name'), (SORT_TYPE, 'Type'),
+                    (SORT_INTENSITY, 'Intensity'), (SORT_VISIBILITY, 'Visibility'))
+        self.sortCB = QtWidgets.QComboBox()
+        self.thenCB = QtWidgets.QComboBox()
+        for comboBox in (self.sortCB, self.thenCB):
+            for sortKey, label in sortKeys:
+                comboBox.addItem(label, sortKey)
+            comboBox.currentIndexChanged.connect(lambda index: self.sortLights())
+        sortLayout.addWidget(self.sortCB)
+
+        self.descendingCB = QtWidgets.QCheckBox('Descending')
+        self.descendingCB.toggled.connect(lambda val: self.sortLights())
+        sortLayout.addWidget(self.descendingCB)
+
+        sortLayout.addWidget(QtWidgets.QLabel('Then'))
+        sortLayout.addWidget(self.thenCB)
+
+        sortLayout.addWidget(QtWidgets.QLabel('Group'))
+        self.groupCB = QtWidgets.QComboBox()
+        for grouping, label in ((None, 'None'), (GROUP_TYPE, 'Type'),
+                                (GROUP_NAMESPACE, 'Namespace'), (GROUP_PARENT, 'Parent')):
+            self.groupCB.addItem(label, grouping)
+        self.groupCB.currentIndexChanged.connect(lambda index: self.groupLights())
+        sortLayout.addWidget(self.groupCB)
+
+        # show lights by namespace instead, read a branch at a time as they're expanded
+        self.treeCB = QtWidgets.QCheckBox('Namespace Tree')
+        self.treeCB.toggled.connect(lambda val: self.setTreeMode(val))
+        sortLayout.addWidget(self.treeCB)
+        layout.addLayout(sortLayout, 3, 0, 1, 3)
+
+        # searching, sorting and grouping only work on the flat list
+        self.listControls = (self.searchLE, self.searchModeCB, self.typeFilterCB, self.namespaceFilterCB,
+                             self.regionCB, self.regionSB, regionBtn,
+                             self.sortCB, self.descendingCB, self.thenCB, self.groupCB)
+
+        # list of lights, the view only ever paints the rows on screen
+        self.model = LightModel(self)
+        self.proxy = LightProxyModel(self)
+        self.proxy.facetsChanged.connect(self.updateFacets)
+        self.proxy.setSourceModel(self.model)
+        # keep the light positions in step with the list
+        self.model.modelReset.connect(lambda: self.trackLights())
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: self.trackLights(self.model.store.paths[first:last + 1]))
+        self.model.rowsAboutToBeRemoved.connect(
+            lambda parent, first, last: self.positions.untrack(self.model.store.paths[first:last + 1]))
+        self.treeModel = LightTreeModel(self)
+        self.view = QtWidgets.QTreeView()
+        self.view.setModel(self.proxy)
+        self.view.setRootIsDecorated(False)
+        self.view.setUniformRowHeights(True)
+        self.view.setAlternatingRowColors(True)
+        # ctrl and shift click select several lights at once
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.view.setItemDelegateForColumn(LightModel.INTENSITY, IntensityDelegate(self.view))
+        self.view.doubleClicked.connect(self.setColor)
+        # collapsed branches give their rows back
+        self.view.collapsed.connect(lambda index: self.isTree() and self.treeModel.unload(index))
+        layout.addWidget(self.view, 4, 0, 1, 3)
+
+        # button to solo the selected lights
+        self.soloBtn = QtWidgets.QPushButton('Solo')
+        self.soloBtn.setCheckable(True)
+        self.soloBtn.toggled.connect(self.isolate)
+        layout.addWidget(self.soloBtn, 5, 0, 1, 2)
+
+        # delete the selected lights, the delete key does the same
+        deleteBtn = QtWidgets.QPushButton('Delete')
+        deleteBtn.setStyleSheet('background-color: rgba(255, 0, 0, 1.0);')
+        deleteBtn.clicked.connect(lambda: self.deleteLights())
+        layout.addWidget(deleteBtn, 5, 2)
+        deleteKey = QtWidgets.QShortcut(QtGui.QKeySequence.Delete, self.view, self.deleteLights)
+        # only while the list has focus, not while typing in an intensity box
+        deleteKey.setContext(QtCore.Qt.WidgetShortcut)
+
+        layout.addWidget(self.buildBulkEdit(), 6, 0, 1, 3)
+        layout.addWidget(self.buildCulling(), 7, 0, 1, 3)
 
         # Save button for lights setup
         saveBtn = QtWidgets.QPushButton('Save')
-        saveBtn.clicked.connect(self.saveLights)
-        layout.addWidget(saveBtn, 2, 0)
+        # lambdas keep the clicked state out of the (possibly profiled) methods
+        saveBtn.clicked.connect(lambda: self.saveLights())
+        # saves finish on a thread, rigWritten hears about it back on this one
+        self.rigSaved.connect(self.rigWritten)
+        layout.addWidget(saveBtn, 8, 0)
 
         # import button for lights
         importBtn = QtWidgets.QPushButton('Import')
-        importBtn.clicked.connect(self.importLights)
-        layout.addWidget(importBtn, 2, 1)
+        importBtn.clicked.connect(lambda: self.importLights())
+        layout.addWidget(importBtn, 8, 1)
 
         # Refresh button 
         refreshBtn = QtWidgets.QPushButton('Refresh')
-        refreshBtn.clicked.connect(self.refresh)
-        layout.addWidget(refreshBtn, 2, 2)
-
+        refreshBtn.clicked.connect(lambda: self.refresh())
+        layout.addWidget(refreshBtn, 8, 2)
+
+        saveLayout = QtWidgets.QHBoxLayout()
+        # USD files can be opened by anything that reads UsdLux lights
+        self.formatCB = QtWidgets.QComboBox()
+        # compact JSON leaves out default values and keeps repeated ones once
+        self.formatCB.addItems(['JSON', 'Compact JSON', 'USD', 'Binary'])
+        saveLayout.addWidget(self.formatCB)
+
+        # save the playback range instead of just the current frame
+        self.animationCB = QtWidgets.QCheckBox('Save Animation')
+        saveLayout.addWidget(self.animationCB)
+        saveLayout.addWidget(QtWidgets.QLabel('Tolerance'))
+        # how far saved curves can stray from the animation, 0 keeps it exact
+        self.toleranceSB = QtWidgets.QDoubleSpinBox()
+        self.toleranceSB.setRange(0, 1000)
+        self.toleranceSB.setDecimals(4)
+        self.animationCB.toggled.connect(self.toleranceSB.setEnabled)
+        self.toleranceSB.setEnabled(False)
+        saveLayout.addWidget(self.toleranceSB)
+        # compressed rigs are read back like any other, level 1 is fastest and 9 smallest
+        self.compressionCB = QtWidgets.QComboBox()
+        self.compressionCB.addItems(['Plain', 'gzip', 'bz2'] + (['lzma'] if LightRig.lzma else []))
+        saveLayout.addWidget(self.compressionCB)
+        saveLayout.addWidget(QtWidgets.QLabel('Level'))
+        self.levelSB = QtWidgets.QSpinBox()
+        self.levelSB.setRange(1, 9)
+        self.levelSB.setValue(6)
+        self.levelSB.setEnabled(False)
+        self.compressionCB.currentIndexChanged.connect(lambda index: self.levelSB.setEnabled(index > 0))
+        saveLayout.addWidget(self.levelSB)
+        saveLayout.addStretch()
+        layout.addLayout(saveLayout, 9, 0, 1, 3)
+        # USD files only hold the current frame
+        self.formatCB.currentIndexChanged.connect(lambda index: self.animationCB.setEnabled(self.formatCB.currentText() != 'USD'))
+
+        # profiling summary, only there when LIGHTING_MANAGER_PROFILE is set
+        if LightProfiler.PROFILE:
+            self.statusBar = QtWidgets.QStatusBar()
+            self.statusBar.setSizeGripEnabled(False)
+            layout.addWidget(self.statusBar, 10, 0, 1, 3)
+
+            traceBtn = QtWidgets.QPushButton('Trace')
+            traceBtn.clicked.connect(lambda: self.exportTrace())
+            self.statusBar.addPermanentWidget(traceBtn)
+
+        # open the way the manager was last used, without populating twice
+        tree = bool(cmds.optionVar(query='lightingManagerTree'))
+        self.treeCB.blockSignals(True)
+        self.treeCB.setChecked(tree)
+        self.treeCB.blockSignals(False)
+        self.showTree(tree)
+
+    def buildBulkEdit(self):
+        # controls that change every selected light at once
+        group = QtWidgets.QGroupBox('Bulk Edit')
+        layout = QtWidgets.QGridLayout(group)
+
+        # new intensity = intensity x scale + offset
+        layout.addWidget(QtWidgets.QLabel('Intensity x'), 0, 0)
+        self.scaleSB = QtWidgets.QDoubleSpinBox()
+        self.scaleSB.setRange(0, 1000)
+        self.scaleSB.setDecimals(3)
+        self.scaleSB.setValue(1)
+        layout.addWidget(self.scaleSB, 0, 1)
+
+        layout.addWidget(QtWidgets.QLabel('+'), 0, 2)
+        self.offsetSB = QtWidgets.QDoubleSpinBox()
+        self.offsetSB.setRange(-100000, 100000)
+        self.offsetSB.setDecimals(3)
+        layout.addWidget(self.offsetSB, 0, 3)
+
+        intensityBtn = QtWidgets.QPushButton('Apply')
+        intensityBtn.clicked.connect(lambda: self.bulkIntensity())
+        layout.addWidget(intensityBtn, 0, 4)
+
+        # tint the selected lights colors by the color picked here
+        layout.addWidget(QtWidgets.QLabel('Color x'), 1, 0)
+        self.tint = (1.0, 1.0, 1.0)
+        self.tintBtn = QtWidgets.QPushButton()
+        self.tintBtn.setMaximumWidth(20)
+        self.tintBtn.setMaximumHeight(20)
+        self.tintBtn.clicked.connect(self.setTint)
+        self.setTint(self.tint)
+        layout.addWidget(self.tintBtn, 1, 1)
+
+        colorBtn = QtWidgets.QPushButton('Apply')
+        colorBtn.clicked.connect(lambda: self.bulkColor())
+        layout.addWidget(colorBtn, 1, 4)
+
+        # exposure is Arnold's aiExposure, lights without it are left alone
+        layout.addWidget(QtWidgets.QLabel('Exposure'), 2, 0)
+        self.exposureSB = QtWidgets.QDoubleSpinBox()
+        self.exposureSB.setRange(-20, 20)
+        self.exposureSB.setDecimals(3)
+        layout.addWidget(self.exposureSB, 2, 1)
+
+        exposureBtn = QtWidgets.QPushButton('Set')
+        exposureBtn.clicked.connect(lambda: self.bulkExposure())
+        layout.addWidget(exposureBtn, 2, 4)
+
+        return group
+
+    def buildCulling(self):
+        # find the lights that barely reach the camera, or the selected objects
+        group = QtWidgets.QGroupBox('Culling')
+        layout = QtWidgets.QGridLayout(group)
+
+        layout.addWidget(QtWidgets.QLabel('Below'), 0, 0)
+        self.cullSB = QtWidgets.QDoubleSpinBox()
+        self.cullSB.setRange(0, 100)
+        self.cullSB.setDecimals(3)
+        self.cullSB.setValue(1)
+        self.cullSB.setSuffix('%')
+        self.cullSB.setToolTip('Percent of the brightest light')
+        layout.addWidget(self.cullSB, 0, 1)
+
+        layout.addWidget(QtWidgets.QLabel('at'), 0, 2)
+        self.cullCB = QtWidgets.QComboBox()
+        self.cullCB.addItem('Camera', REGION_CAMERA)
+        self.cullCB.addItem('Selection', REGION_SELECTION)
+        layout.addWidget(self.cullCB, 0, 3)
+
+        # select them to have a look first, or turn them all off in one undo
+        selectBtn = QtWidgets.QPushButton('Select')
+        selectBtn.clicked.connect(lambda: self.cullLights())
+        layout.addWidget(selectBtn, 0, 4)
+
+        disableBtn = QtWidgets.QPushButton('Disable')
+        disableBtn.clicked.connect(lambda: self.cullLights(disable=True))
+        layout.addWidget(disableBtn, 0, 5)
+
+        return group
+
+    @profiled('refresh')
     def refresh(self):
- 
-        # while scrollLayout.count() gives any Truth-y value, run logic
-        while self.scrollLayout.count():
-            widget = self.scrollLayout.takeAt(0).widget()
-           
-            if widget:
-                # Set visibility to False because there is a period where it will still be alive
-                widget.setVisible(False)
-                # kill the widget when it can
-                widget.deleteLater()
-
+        # populate swaps out every row, so there is nothing to tear down first
+        self.soloBtn.setChecked(False)
         self.populate()
 
+    @profiled('populate')
     def populate(self):
-        for light in pm.ls(type=["areaLight", "spotLight", "pointLight", "directionalLight", "volumeLight"]):
-            self.addLight(light)
+        if self.isTree():
+            # only the lights outside of any namespace, the rest wait for their branch
+            self.treeModel.reload()
+        else:
+            with span('cmds.ls'):
+                lights = cmds.ls(type=LIGHT_TYPES, long=True)
 
-    # save lights to JSON file
-    def saveLights(self):
-        properties = {}
+            self.model.setLights(lights)
+        self.showProfile()
+
+    def isTree(self):
+        return self.view.model() is self.treeModel
+
+    def activeModel(self):
+        # the model holding the lights on screen, both take the same edits
+        return self.treeModel if self.isTree() else self.model
+
+    def setTreeMode(self, val):
+        cmds.optionVar(intValue=('lightingManagerTree', int(val)))
+        self.soloBtn.setChecked(False)
+        self.showTree(val)
+        self.populate()
+
+    def showTree(self, val):
+        # whichever model isn't shown is emptied, it's filled again when it comes back
+        for widget in self.listControls:
+            widget.setEnabled(not val)
+
+        if val:
+            self.model.setLights([])
+            self.view.setModel(self.treeModel)
+            self.view.setRootIsDecorated(True)
+        else:
+            self.treeModel.clear()
+            self.view.setModel(self.proxy)
+            self.view.setRootIsDecorated(self.proxy.grouping is not None)
+
+    def selectedRows(self):
+        # rows of the selected lights in the model, not in the filtered view.
+        # A selected group row stands for every light in it.
+        rows = set()
+        for index in self.view.selectionModel().selectedRows():
+            if self.proxy.isGroup(index):
+                rows.update(self.proxy.groupRows(index))
+            else:
+                rows.add(self.proxy.mapToSource(index).row())
+        return sorted(rows)
+
+    def trackLights(self, paths=None):
+        # follow light positions while an area is picked, no paths starts over with every light
+        if self.region is None:
+            return
+        if paths is None:
+            self.positions.clear()
+            paths = self.model.store.paths
+        self.positions.track(paths)
+
+    def pickRegion(self):
+        # take the area from Maya's selection or camera as they are right now
+        mode = self.regionCB.itemData(self.regionCB.currentIndex())
+        self.region = None
+
+        if mode == REGION_CAMERA:
+            with span('camera'):
+                self.region = (mode, [cameraPosition()])
+        elif mode is not None:
+            selection = cmds.ls(selection=True, long=True)
+            if not selection:
+                logger.info('Select something in the scene to find the lights around it')
+            elif mode == REGION_BOX:
+                box = cmds.exactWorldBoundingBox(selection)
+                self.region = (mode, [box[:3], box[3:]])
+            else:
+                self.region = (mode, selectionPivots(selection))
+
+        if self.region is None:
+            # back to every light, stop following them around
+            self.positions.clear()
+            self.proxy.setRegion(None)
+            return
+
+        if not len(self.positions):
+            self.trackLights()
+        self.regionLights()
+
+    @profiled('regionLights')
+    def regionLights(self):
+        # run the spatial query for the picked area and show only what it finds
+        if self.region is None:
+            return
+
+        mode, points = self.region
+        grid = self.positions.grid
+        value = self.regionSB.value()
+        if mode == REGION_BOX:
+            keys = grid.box(*points)
+        elif mode == REGION_NEAREST:
+            keys = set(key for point in points for distance, key in grid.nearest(point, int(value)))
+        else:
+            keys = set()
+            for point in points:
+                keys |= grid.radius(point, value)
+
+        self.proxy.setRegion(keys)
+        self.showProfile()
+
+    @profiled('cullLights')
+    def cullLights(self, disable=False):
+        # rank every light that's on by how much it adds at the sample points,
+        # and select or turn off the ones under the threshold
+        if self.cullCB.itemData(self.cullCB.currentIndex()) == REGION_CAMERA:
+            with span('camera'):
+                points = [cameraPosition()]
+        else:
+            points = selectionPivots(cmds.ls(selection=True, long=True))
+        if not points:
+            logger.info('Select something in the scene to measure the lights at')
+            return
+
+        store = self.snapshot(self.allPaths())
+        rows = [row for row in range(len(store)) if store.visibility[row]]
+        paths = [store.paths[row] for row in rows]
+        with span('readEmitters', count=len(paths)):
+            emitters = readEmitters(paths)
+        with span('contribution', count=len(paths)):
+            values = LightStore.contribution([store.lightType(row) for row in rows],
+                                             store.take('intensity', rows), store.take('color', rows),
+                                             points=points, **emitters)
+
+        threshold = max(values or [0.0]) * self.cullSB.value() / 100.0
+        culled = [paths[i] for i in LightStore.rank(values) if values[i] < threshold]
+        logger.info('%d of %d lights add less than %.3f%% of the brightest light' % (
+            len(culled), len(paths), self.cullSB.value()))
+
+        if disable:
+            with span('cullLights.write', count=len(culled)), undoChunk('Cull Lights'):
+                setAttrs(culled, 'visibility', [False] * len(culled))
+            self.activeModel().updateLights(culled, 'visibility', [False] * len(culled))
+        else:
+            self.selectPaths(culled)
+        self.showProfile()
+
+    def selectPaths(self, paths):
+        # select lights in the view, ones that are filtered out or in a collapsed branch are skipped
+        selection = QtCore.QItemSelection()
+        for path in paths:
+            if self.isTree():
+                index = self.treeModel.indexOf(path)
+            else:
+                index = self.proxy.indexFromKey((False, path, 0))
+            if index.isValid():
+                selection.select(index, index)
+
+        flags = QtCore.QItemSelectionModel.ClearAndSelect | QtCore.QItemSelectionModel.Rows
+        self.view.selectionModel().select(selection, flags)
+
+    def sortLights(self):
+        # the first sort key can go either way, the second breaks ties
+        sortKeys = []
+        first = self.sortCB.itemData(self.sortCB.currentIndex())
+        then = self.thenCB.itemData(self.thenCB.currentIndex())
+        if first:
+            sortKeys.append((first, self.descendingCB.isChecked()))
+        if then and then != first:
+            sortKeys.append((then, False))
+        self.proxy.setSort(sortKeys)
+
+    def groupLights(self):
+        grouping = self.groupCB.itemData(self.groupCB.currentIndex())
+        self.proxy.setGrouping(grouping)
+        self.view.setRootIsDecorated(grouping is not None)
+        self.view.expandAll()
+
+    def filterLights(self):
+        text = self.searchLE.text()
+        mode = self.searchModeCB.itemData(self.searchModeCB.currentIndex())
+        lightType = self.typeFilterCB.itemData(self.typeFilterCB.currentIndex())
+        ns = self.namespaceFilterCB.itemData(self.namespaceFilterCB.currentIndex())
+
+        try:
+            self.proxy.setFilter(text, mode, lightType, ns)
+        except re.error:
+            # half typed regular expressions turn the search bar red until they're valid
+            self.searchLE.setStyleSheet('background-color: rgba(128, 32, 32, 1.0);')
+            return
+
+        self.searchLE.setStyleSheet('')
+
+    def updateFacets(self):
+        # refill the type and namespace filters, keeping whatever was picked
+        index = self.proxy.nameIndex
+        lost = False
+        for comboBox, label, values in ((self.typeFilterCB, 'All Types', index.types()),
+                                        (self.namespaceFilterCB, 'All Namespaces', index.namespaces())):
+            current = comboBox.itemData(comboBox.currentIndex())
+            comboBox.blockSignals(True)
+            comboBox.clear()
+            comboBox.addItem(label, None)
+            for value in values:
+                # lights outside of any namespace sit in the root namespace ":"
+                comboBox.addItem(value or ':', value)
+
+            if current is not None and current in values:
+                comboBox.setCurrentIndex(values.index(current) + 1)
+            else:
+                lost |= current is not None
+            comboBox.blockSignals(False)
+
+        # the picked type or namespace has no lights left, show everything again
+        if lost:
+            self.filterLights()
+
+    def selectedPaths(self):
+        # full DAG paths of the selected lights, names alone may not be unique
+        if self.isTree():
+            return self.treeModel.paths(self.view.selectionModel().selectedRows())
+        return [self.model.store.paths[row] for row in self.selectedRows()]
+
+    def allPaths(self):
+        # every light the manager looks after, the tree hasn't read most of them
+        if self.isTree():
+            with span('cmds.ls'):
+                return cmds.ls(type=LIGHT_TYPES, long=True) or []
+        return list(self.model.store.paths)
+
+    def snapshot(self, paths):
+        # a fresh columnar copy of lights from the scene, picks up edits made outside the manager
+        store = LightStore.LightStore()
+        with span('readLights', count=len(paths)):
+            store.extend(readLights(paths))
+        return store
+
+    def setTint(self, color=None):
+        # pick the color multiplier with Mayas color picker
+        if not color:
+            with span('pm.colorEditor'):
+                color = pm.colorEditor(rgbValue=self.tint)
+            color = [float(c) for c in color.split()][:3]
+
+        self.tint = tuple(color)
+        r, g, b = [min(max(c, 0.0), 1.0) * 255 for c in self.tint]
+        self.tintBtn.setStyleSheet('background-color: rgba(%s, %s, %s, 1.0);' % (r, g, b))
+
+    @profiled('bulkIntensity')
+    def bulkIntensity(self):
+        paths = self.selectedPaths()
+        if not paths:
+            return
+
+        # take a fresh columnar snapshot of the selection
+        store = self.snapshot(paths)
+        intensity = LightStore.scaleIntensity(store.intensity, self.scaleSB.value(), self.offsetSB.value())
+
+        with span('bulkEdit.write', count=len(store)), undoChunk('Bulk Edit Intensity'):
+            setAttrs(store.paths, 'intensity', intensity)
+
+        self.activeModel().updateLights(store.paths, 'intensity', intensity)
+        self.showProfile()
+
+    @profiled('bulkColor')
+    def bulkColor(self):
+        paths = self.selectedPaths()
+        if not paths:
+            return
+
+        store = self.snapshot(paths)
+        colors = LightStore.multiplyColor(store.color, self.tint)
+
+        with span('bulkEdit.write', count=len(store)), undoChunk('Bulk Edit Color'):
+            setColors(store.paths, colors)
 
-        for lightWidget in self.findChildren(LightWidget):
-            light = lightWidget.light
-            transform = light.getTransform()
+        self.activeModel().updateLights(store.paths, 'color', colors)
+        self.showProfile()
 
-            # add it to the dictionary.
-            properties[str(transform)] = {
-                'translate': list(transform.translate.get()),
-                'rotation': list(transform.rotate.get()),
-                'lightType': pm.objectType(light),
-                'intensity': light.intensity.get(),
-                'color': light.color.get()
-            }
+    @profiled('bulkExposure')
+    def bulkExposure(self):
+        # only lights with Arnold's exposure attribute can take an exposure
+        paths = [path for path in self.selectedPaths() if cmds.objExists('%s.aiExposure' % path)]
+        if not paths:
+            logger.info('None of the selected lights have an aiExposure attribute')
+            return
+
+        exposure = LightStore.fillValue(len(paths), self.exposureSB.value())
+
+        with span('bulkEdit.write', count=len(paths)), undoChunk('Bulk Edit Exposure'):
+            setAttrs(paths, 'aiExposure', exposure)
+
+        self.showProfile()
+
+    # save lights to JSON file
+    @profiled('saveLights')
+    def saveLights(self):
+        # read everything the rig needs from the scene, then hand it to a thread
+        # that puts the file together and writes it, Maya only waits for the read.
+        # The tree only has expanded branches read in, so it saves a fresh read of everything.
+        with span('saveLights.read'):
+            if self.isTree():
+                store = self.snapshot(self.allPaths())
+            else:
+                self.model.refreshRows(range(len(self.model.store)))
+                # the model's store keeps changing while the file is written
+                store = self.model.store.copy()
+
+        fileFormat = self.formatCB.currentText().lower()
+        compact = fileFormat == 'compact json'
+        if compact:
+            fileFormat = 'json'
+        animation = None
+        if self.animationCB.isChecked() and fileFormat != 'usd':
+            animation = self.sampleAnimation(store)
+
+        # translate and rotate are only right for lights that aren't in a group,
+        # the world matrix puts a light back exactly where it was
+        with span('saveLights.placements', count=len(store)):
+            placements = readPlacements(store.paths)
 
         # fetch the light manager directory to save in
         directory = self.getDirectory()
 
         # construct name of the lightFile to save
         # %m%d%S = (month/day/secounds)
-        lightFile = os.path.join(directory, 'lightFile_%s.json' % time.strftime('%m%d%S'))
-
-        # open file to write
-        with open(lightFile, 'w') as f:
-            json.dump(properties, f, indent=4)
+        extension = LightRig.EXTENSIONS['usda' if fileFormat == 'usd' else fileFormat]
+        lightFile = os.path.join(directory, 'lightFile_%s%s' % (time.strftime('%m%d%S'), extension))
+        metersPerUnit = om2.MDistance(1.0, om2.MDistance.uiUnit()).asUnits(om2.MDistance.kMeters)
+        options = {'compact': compact}
+        if self.compressionCB.currentIndex() > 0:
+            options.update(compression=self.compressionCB.currentText(), level=self.levelSB.value())
 
         logger.info('Saving file to %s' % lightFile)
+        # not a daemon, quitting Maya waits for the file to be finished
+        threading.Thread(target=self.writeLights, name='saveLights',
+                         args=(lightFile, store, animation, placements, metersPerUnit, options)).start()
+        self.showProfile()
+
+    def writeLights(self, lightFile, store, animation, placements, metersPerUnit, options):
+        # runs on its own thread, nothing in here may touch Maya or the widgets
+        error = ''
+        try:
+            with span('saveLights.write', count=len(store)):
+                names = store.savedNames()
+                properties = store.toDicts(names)
+                if animation is not None:
+                    compressAnimation(names, properties, *animation)
+
+                matrices, parents, orders = placements
+                for row in range(len(store)):
+                    properties[names[row]].update(matrix=list(matrices[row * 16:row * 16 + 16]),
+                                                  parent=parents[row], rotateOrder=orders[row])
+
+                LightRig.writeRig(lightFile, properties, metersPerUnit, **options)
+        except Exception as e:
+            # reported through rigSaved, a thread has nobody else to tell
+            error = str(e) or type(e).__name__
+
+        try:
+            self.rigSaved.emit(lightFile, error)
+        except RuntimeError:
+            # the manager was closed while the file was being written
+            pass
+
+    def rigWritten(self, lightFile, error):
+        # back on the main thread once writeLights is done
+        if error:
+            logger.error('Could not save %s: %s' % (lightFile, error))
+        else:
+            logger.info('Saved %s' % lightFile)
+        self.showProfile()
+
+    @profiled('sampleAnimation')
+    def sampleAnimation(self, store):
+        # sample every keyed channel over the timeline's playback range, gives back
+        # what compressAnimation needs to keep just enough keys to rebuild them
+        start = int(round(cmds.playbackOptions(query=True, minTime=True)))
+        end = int(round(cmds.playbackOptions(query=True, maxTime=True)))
+        frames = list(range(start, end + 1))
+
+        plugs = animatedPlugs(store.paths)
+        with span('sampleChannels', count=len(plugs), frames=len(frames)):
+            samples = sampleChannels(plugs, start, end)
+
+        channels = [(row, channel) for row, channel, plug in plugs]
+        return frames, channels, samples, self.toleranceSB.value()
 
     def getDirectory(self):
         #  gives us back the name of our library directory and create it if it doesn't exist
@@ -286,36 +2175,104 @@ class LightingManager(QtWidgets.QWidget):
             os.mkdir(directory)
         return directory
 
+    @profiled('importLights')
     def importLights(self):
         directory = self.getDirectory()
 
-        fileName = QtWidgets.QFileDialog.getOpenFileName(self, "Light Browser", directory)
+        fileName = QtWidgets.QFileDialog.getOpenFileName(self, "Light Browser", directory,
+                                                         "Light Files (*.json *.usda *.lrig)")
+        if not fileName[0]:
+            return
 
-        # open fileName in read mode
-        with open(fileName[0], 'r') as f:
-            properties = json.load(f)
-
-        for light, info in properties.items():
-
-            lightType = info.get('lightType')
-            for lt in self.lightTypes:
-                # the light type for Point Light is pointLight, convert Point Light to pointLight and then compare
-                if ('%sLight' % lt.split()[0].lower()) == lightType:
-                    # If match found, break out
-                    break
-            else:
-                logger.info('Cannot find a corresponding light type for %s (%s)' % (light, lightType))
+        # check the whole file before making anything, a bad file leaves the scene as it was
+        with span('importLights.read'):
+            try:
+                properties, problems = LightRig.validateRig(LightRig.iterRig(fileName[0]), limit=20)
+            except (IOError, ValueError) as error:
+                properties, problems = {}, [str(error)]
+        if problems:
+            logger.error('Cannot import %s:\n%s' % (fileName[0], '\n'.join(problems)))
+            return
+
+        store = LightStore.LightStore.fromDicts(properties)
+
+        # the light type for Point Light is pointLight, so map pointLight back to Point Light
+        lightTypes = dict(('%sLight' % lt.split()[0].lower(), lt) for lt in self.lightTypes)
+
+        paths = []
+        # (path, world matrix, rotate order) of lights saved with their world matrix
+        placed = []
+        # (path, animation) of lights saved with animation
+        animated = []
+        # fromDicts keeps the order of properties, so records and saved dicts line up
+        for record, info in zip(store, properties.values()):
+            lt = lightTypes.get(record.lightType)
+            if not lt:
+                logger.info('Cannot find a corresponding light type for %s (%s)' % (record.name, record.lightType))
                 continue
 
-            light = self.createLight(lightType=lt)
-
-            light.intensity.set(info.get('intensity'))
-            light.color.set(info.get('color'))
-            transform = light.getTransform()
-            transform.translate.set(info.get('translate'))
-            transform.rotate.set(info.get('rotation'))
-
-        self.populate()
+            # the new lights are added to the list in one go at the end
+            light = self.createLight(lightType=lt, add=False)
+
+            parent = info.get('parent')
+            if info.get('matrix') and parent and cmds.objExists(parent):
+                # back under the group it came from, placeLights works out where in it
+                with span('importLights.parent'):
+                    cmds.parent(lightPath(light).rsplit('|', 1)[0], parent, relative=True)
+
+            path = lightPath(light)
+            transform = path.rsplit('|', 1)[0]
+
+            with span('importLights.set'):
+                cmds.setAttr('%s.intensity' % path, record.intensity)
+                cmds.setAttr('%s.color' % path, *record.color, type='double3')
+                cmds.setAttr('%s.visibility' % path, record.visibility)
+                if not info.get('matrix'):
+                    # saved before world matrices were
+                    cmds.setAttr('%s.translate' % transform, *record.translate, type='double3')
+                    cmds.setAttr('%s.rotate' % transform, *record.rotate, type='double3')
+
+            if info.get('matrix'):
+                placed.append((path, info['matrix'], info.get('rotateOrder', 0)))
+            if info.get('animation'):
+                animated.append((path, info['animation']))
+            paths.append(path)
+
+        self.placeLights(placed)
+        # keys go on after the placement so they aren't overwritten by it
+        with span('importLights.animation', count=len(animated)):
+            for path, animation in animated:
+                setKeys(path, animation)
+        self.activeModel().addLights(paths)
+
+    @profiled('placeLights')
+    def placeLights(self, placed):
+        # give every light the world matrix it was saved with, wherever it's
+        # parented now. All of them are decomposed in one pass.
+        if not placed:
+            return
+
+        paths = [path for path, matrix, order in placed]
+        orders = [order for path, matrix, order in placed]
+        world = array('d')
+        for path, matrix, order in placed:
+            world.extend(matrix)
+
+        with span('readParentInverses', count=len(paths)):
+            local = LightStore.multiplyMatrices(world, readParentInverses(paths))
+        with span('decompose', count=len(paths)):
+            translate, rotate, scale, shear = LightStore.decompose(local, orders)
+
+        toAngle = om2.MAngle(1.0, om2.MAngle.kRadians).asUnits(om2.MAngle.uiUnit())
+        with span('importLights.place', count=len(paths)):
+            for i, path in enumerate(paths):
+                transform = path.rsplit('|', 1)[0]
+                cmds.setAttr('%s.rotateOrder' % transform, orders[i])
+                cmds.setAttr('%s.translate' % transform, *translate[i * 3:i * 3 + 3], type='double3')
+                cmds.setAttr('%s.rotate' % transform, *[a * toAngle for a in rotate[i * 3:i * 3 + 3]],
+                             type='double3')
+                cmds.setAttr('%s.scale' % transform, *scale[i * 3:i * 3 + 3], type='double3')
+                cmds.setAttr('%s.shear' % transform, *shear[i * 3:i * 3 + 3], type='double3')
 
     def createLight(self, lightType=None, add=True):
         # get text from the combobox if no light is given
@@ -325,28 +2282,93 @@ class LightingManager(QtWidgets.QWidget):
         # look up lightTypes dictionary to find function to call
         func = self.lightTypes[lightType]
 
-        light = func()
+        with span('createLight', lightType=lightType):
+            light = func()
         # pass to addLight if the method has been told to add it
         if add:
             self.addLight(light)
 
         return light
 
-  # create a LightWidget for light and add it to the UI
+  # add a row for light to the UI
+    @profiled('addLight')
     def addLight(self, light):
-        widget = LightWidget(light)
+        self.activeModel().addLights([lightPath(light)])
+
+    @profiled('deleteLights')
+    def deleteLights(self):
+        paths = self.selectedPaths()
+        if not paths:
+            return
+
+        # lights from referenced files can't be deleted, one of them would stop
+        # the whole delete. A namespace picked in the tree can hold both kinds.
+        with span('referenceQuery', count=len(paths)):
+            referenced = [path for path in paths
+                          if cmds.referenceQuery(path.rsplit('|', 1)[0], isNodeReferenced=True)]
+        if referenced:
+            logger.info('Cannot delete %d referenced light(s): %s' % (
+                len(referenced), ', '.join(path.rsplit('|', 2)[-2] for path in referenced)))
+            referenced = set(referenced)
+            paths = [path for path in paths if path not in referenced]
+            if not paths:
+                return
+
+        # one delete for every selected light, undone with a single ctrl+z
+        transforms = [path.rsplit('|', 1)[0] for path in paths]
+        with undoChunk('Delete Lights'), span('cmds.delete', count=len(transforms)):
+            cmds.delete(transforms)
+
+        self.activeModel().removePaths(paths)
+        self.showProfile()
+
+    def setColor(self, index):
+        # double clicking the color swatch opens up Mayas color picker
+        if index.column() != LightModel.COLOR:
+            return
+
+        model = self.activeModel()
+        if not self.isTree():
+            index = self.proxy.mapToSource(index)
+        light = model.lightAt(index) if index.isValid() else None
+        if light is None:
+            return
+
+        store, row = light
+        with span('pm.colorEditor'):
+            color = pm.colorEditor(rgbValue=store.vector('color', row))
 
-        # connect the onSolo signal from the widget to isolate method
-        widget.onSolo.connect(self.isolate)
-        self.scrollLayout.addWidget(widget)
+        # it gives back a string instead of a list of numbers.
+        # split the string, then convert it to floats
+        r, g, b, a = [float(c) for c in color.split()]
+        model.setData(index, (r, g, b))
 
-  # function for isolateing a single light
+  # function for isolateing the selected lights
     def isolate(self, val):
-
-        lightWidgets = self.findChildren(LightWidget)
-        for widget in lightWidgets:
-            if widget != self.sender():
-                widget.disableLight(val)
+        selected = set(self.selectedPaths())
+
+        # turn every other light off while solo is on, and back on when it's released
+        others = [path for path in self.allPaths() if path not in selected]
+        with span('isolate'), undoChunk('Solo Lights'):
+            setAttrs(others, 'visibility', [not val] * len(others))
+
+        self.activeModel().updateLights(others, 'visibility', [not val] * len(others))
+        self.showProfile()
+
+    def showProfile(self):
+        # put the slowest spans in the status bar, the full table goes in its tooltip
+        if not LightProfiler.PROFILE:
+            return
+
+        self.statusBar.showMessage(LightProfiler.summaryLine())
+        self.statusBar.setToolTip('<pre>%s</pre>' % LightProfiler.summaryTable())
+
+    def exportTrace(self):
+        # write every recorded span to a Chrome trace file in the library directory
+        traceFile = os.path.join(self.getDirectory(), 'trace_%s.json' % time.strftime('%m%d%H%M%S'))
+        LightProfiler.exportChromeTrace(traceFile)
+        logger.info('Saving trace to %s' % traceFile)
+        self.statusBar.showMessage('Trace saved to %s' % traceFile)
 
 
 def getMayaMainWindow():
@@ -39,9 +39,15 @@ LICENSE
 
 import os
 import sys
+import zlib
 import types
+import atexit
 import shutil
+import collections
+import marshal
 import importlib
+import threading
+import weakref
 
 
 __version__ = "1.2.2"
@@ -53,10 +59,12 @@ __all__ = []
 QT_VERBOSE = bool(os.getenv("QT_VERBOSE"))
 QT_PREFERRED_BINDING = os.getenv("QT_PREFERRED_BINDING", "")
 QT_SIP_API_HINT = os.getenv("QT_SIP_API_HINT")
+QT_NO_CACHE = bool(os.getenv("QT_NO_CACHE"))
+QT_CACHE_DIR = os.getenv("QT_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "Qt.py")
 
 # Reference to Qt.py
 Qt = sys.modules[__name__]
-Qt.QtCompat = types.ModuleType("QtCompat")
 
 try:
     long
@@ -726,6 +734,14 @@ def _getcpppointer(object):
     raise AttributeError("'module' has no attribute 'getCppPointer'")
 
 
+# Wrapper class of every meta-object class seen by _wrapinstance
+_wrapper_classes = {}
+
+# Wrapped objects still in use, by pointer and base. Held weakly, an
+# entry goes with its wrapper so nothing is kept alive by the cache
+_wrapped = weakref.WeakValueDictionary()
+
+
 def _wrapinstance(ptr, base=None):
     """Enable implicit cast of pointer to most suitable class
 
@@ -733,6 +749,9 @@ def _wrapinstance(ptr, base=None):
 
     Based on http://nathanhorne.com/pyqtpyside-wrap-instance
 
+    Wrapping the same pointer again gives back the same object,
+    for as long as that object is in use and valid.
+
     Usage:
         This mechanism kicks in under these circumstances.
         1. Qt.py is using PySide 1 or 2.
@@ -751,6 +770,11 @@ def _wrapinstance(ptr, base=None):
     assert (base is None) or issubclass(base, Qt.QtCore.QObject), (
         "Argument 'base' must be of type <QObject>")
 
+    key = (long(ptr), base)
+    wrapped = _wrapped.get(key)
+    if wrapped is not None and _isvalid(wrapped):
+        return wrapped
+
     if Qt.IsPyQt4 or Qt.IsPyQt5:
         func = getattr(Qt, "_sip").wrapinstance
     elif Qt.IsPySide2:
@@ -764,6 +788,9 @@ def _wrapinstance(ptr, base=None):
         q_object = func(long(ptr), Qt.QtCore.QObject)
         meta_object = q_object.metaObject()
         class_name = meta_object.className()
+        base = _wrapper_classes.get(class_name)
+
+    if base is None:
         super_class_name = meta_object.superClass().className()
 
         if hasattr(Qt.QtWidgets, class_name):
@@ -775,7 +802,16 @@ def _wrapinstance(ptr, base=None):
         else:
             base = Qt.QtCore.QObject
 
-    return func(long(ptr), base)
+        _wrapper_classes[class_name] = base
+
+    wrapped = func(long(ptr), base)
+    try:
+        _wrapped[key] = wrapped
+    except TypeError:
+        # Wrappers that can't be weakly referenced aren't cached
+        pass
+
+    return wrapped
 
 
 def _isvalid(object):
@@ -804,6 +840,52 @@ def _isvalid(object):
         raise AttributeError("'module' has no attribute isValid")
 
 
+# Translations looked up by _translate, most recently used last. Emptied
+# whenever a translator is installed or removed, see _watch_translators
+_translations = collections.OrderedDict()
+_translations_size = 4096
+_translators_watched = []
+
+
+def _watch_translators(app):
+    """Empty the translation cache whenever a translator comes or goes
+
+    Installing or removing a translator sends the application a
+    LanguageChange event, an event filter on the application sees it.
+    The binding's own classes are left as they are. Qt sends nothing for
+    a translator that says it's empty, a Python translator that doesn't
+    load a .qm file should return False from isEmpty. Returns the filter,
+    None if there's no application to watch yet or False if it can't be
+    watched.
+
+    """
+
+    instance = app.instance()
+    if instance is None:
+        return None
+
+    class TranslatorWatcher(Qt.QtCore.QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == Qt.QtCore.QEvent.LanguageChange:
+                _translations.clear()
+            return False
+
+    def forget(*args):
+        # A new application could have other translators
+        _translations.clear()
+        del _translators_watched[:]
+
+    try:
+        watcher = TranslatorWatcher(instance)
+        instance.installEventFilter(watcher)
+        instance.destroyed.connect(forget)
+    except (AttributeError, TypeError) as e:
+        _log("Translations won't be cached: %s" % e)
+        return False
+
+    return watcher
+
+
 def _translate(context, sourceText, *args):
     # In Qt4 bindings, translate can be passed 2 or 3 arguments
     # In Qt5 bindings, translate can be passed 2 arguments
@@ -819,6 +901,18 @@ def _translate(context, sourceText, *args):
         raise TypeError(
             "Expected 4 or 5 arguments, got {0}.".format(len(args) + 2))
 
+    key = (context, sourceText, disambiguation, encoding, n)
+    try:
+        translation = _translations.pop(key)
+    except KeyError:
+        pass
+    except TypeError:
+        # Arguments that can't be a key, look them up every time
+        key = None
+    else:
+        _translations[key] = translation
+        return translation
+
     if hasattr(Qt.QtCore, "QCoreApplication"):
         app = getattr(Qt.QtCore, "QCoreApplication")
     else:
@@ -827,6 +921,12 @@ def _translate(context, sourceText, *args):
                 binding=Qt.__binding__,
             )
         )
+
+    if not _translators_watched:
+        watcher = _watch_translators(app)
+        if watcher is not None:
+            _translators_watched.append(watcher)
+
     if Qt.__binding__ in ("PySide2", "PyQt5"):
         sanitized_args = [context, sourceText, disambiguation, n]
     else:
@@ -837,7 +937,197 @@ def _translate(context, sourceText, *args):
             encoding or app.CodecForTr,
             n
         ]
-    return app.translate(*sanitized_args)
+    translation = app.translate(*sanitized_args)
+
+    if key is not None and _translators_watched and _translators_watched[0]:
+        if len(_translations) >= _translations_size:
+            _translations.popitem(last=False)
+        _translations[key] = translation
+
+    return translation
+
+
+"""Compiled user interfaces
+
+Rather than reading a .ui file every time it's loaded, the file is
+compiled to Python once with the compiler that comes with the binding,
+and the resulting class is what builds the interface from then on.
+
+The Python source is kept in QT_CACHE_DIR/ui, named after the contents of
+the .ui file and the binding, and the compiled builders of the files used
+most recently stay in memory, so loading the same file again doesn't read
+anything from disk.
+
+"""
+
+_ui_builders = collections.OrderedDict()
+_ui_cache_size = 32
+
+
+def _compile_ui(uifile):
+    """Return the Python source for `uifile`, or None
+
+    Arguments:
+        uifile (str): Absolute path to Qt Designer file.
+
+    """
+
+    if hasattr(Qt, "_uic"):
+        return _compile_ui_with(Qt._uic, uifile)
+
+    compiler = {"PySide2": "pyside2uic",
+                "PySide": "pysideuic"}.get(Qt.__binding__)
+
+    # Maya ships the compiler as a module
+    try:
+        compiler = importlib.import_module(compiler)
+    except (ImportError, TypeError):
+        pass
+    else:
+        return _compile_ui_with(compiler, uifile)
+
+    if not hasattr(Qt, "_QtUiTools"):
+        return None
+
+    # Later PySide2 wheels ship uic itself, with a Python generator
+    directory = os.path.dirname(Qt._QtUiTools.__file__)
+    for name in ("uic", "uic.exe"):
+        executable = os.path.join(directory, name)
+        if os.path.isfile(executable):
+            import subprocess
+            return subprocess.check_output(
+                [executable, "-g", "python", uifile],
+                stderr=subprocess.STDOUT).decode("utf-8")
+
+    return None
+
+
+def _compile_ui_with(compiler, uifile):
+    try:
+        from StringIO import StringIO
+    except ImportError:
+        # Python 3
+        from io import StringIO
+
+    source = StringIO()
+    compiler.compileUi(uifile, source)
+    return source.getvalue()
+
+
+def _ui_builder(uifile):
+    """Return a function building the user interface in `uifile`, or None
+
+    None means the file couldn't be compiled, and should be loaded
+    the usual way instead.
+
+    Arguments:
+        uifile (str): Absolute path to Qt Designer file.
+
+    """
+
+    if not isinstance(uifile, ("".__class__, u"".__class__)):
+        # Files and devices are read once anyway
+        return None
+
+    try:
+        stat = os.stat(uifile)
+    except OSError:
+        return None
+
+    key = (os.path.abspath(uifile), stat.st_mtime, stat.st_size)
+    build = _ui_builders.pop(key, None)
+    if build is None:
+        try:
+            build = _ui_builder_from_source(uifile)
+        except ValueError:
+            # Nothing to build, loading it the usual way won't do better
+            raise
+        except Exception as e:
+            _log("Could not compile %s: %s" % (uifile, e))
+            return None
+
+        if len(_ui_builders) >= _ui_cache_size:
+            _ui_builders.popitem(last=False)
+
+    # Most recently used last
+    _ui_builders[key] = build
+    return build
+
+
+def _ui_builder_from_source(uifile):
+    import hashlib
+    from xml.etree.ElementTree import fromstring
+
+    with open(uifile, "rb") as f:
+        data = f.read()
+
+    checksum = hashlib.sha1(data)
+    checksum.update(("%s %s %s" % (Qt.__binding__,
+                                   Qt.__binding_version__,
+                                   __version__)).encode("utf-8"))
+    path = os.path.join(QT_CACHE_DIR, "ui", checksum.hexdigest() + ".py")
+
+    try:
+        with open(path, "rb") as f:
+            source = f.read().decode("utf-8")
+    except (IOError, OSError):
+        # Class of the top-level widget, to create when
+        # there is no base instance to build in
+        widget = fromstring(data).find("widget")
+        if widget is None:
+            raise ValueError("%s has no top-level form" % uifile)
+
+        source = _compile_ui(uifile)
+        if source is None:
+            raise RuntimeError("No compiler available for %s"
+                               % Qt.__binding__)
+        source += "\n__qt_base__ = %r\n" % str(widget.get("class"))
+
+        if not QT_NO_CACHE:
+            try:
+                _replace_file(path, source.encode("utf-8"))
+            except (IOError, OSError) as e:
+                _log("Could not write %s: %s" % (path, e))
+
+    namespace = {"__name__": "Qt.ui", "__file__": uifile}
+    exec(compile(source, uifile, "exec"), namespace)
+
+    form = None
+    for name, value in namespace.items():
+        if name.startswith("Ui_") and hasattr(value, "setupUi"):
+            form = value
+
+    if form is None or "__qt_base__" not in namespace:
+        raise ValueError("%s has no top-level form" % uifile)
+
+    base_name = namespace["__qt_base__"]
+
+    def build(baseinstance=None):
+        if baseinstance is None:
+            # Custom widgets are imported by the compiled source
+            base = namespace.get(base_name) or getattr(Qt.QtWidgets,
+                                                       base_name)
+            baseinstance = base()
+
+        ui = form()
+        ui.setupUi(baseinstance)
+
+        if hasattr(Qt, "_uic"):
+            # Give the base instance an attribute for every child,
+            # just like PyQt5.uic.loadUi does.
+            children = vars(ui).items()
+        else:
+            # Just the child widgets, like the QUiLoader path. A layout
+            # called "layout" would hide QWidget.layout()
+            children = [(name, value) for name, value in vars(ui).items()
+                        if isinstance(value, Qt.QtWidgets.QWidget)]
+
+        for name, value in children:
+            setattr(baseinstance, name, value)
+
+        return baseinstance
+
+    return build
 
 
 def _loadUi(uifile, baseinstance=None):
@@ -846,6 +1136,9 @@ def _loadUi(uifile, baseinstance=None):
     This function calls `uic.loadUi` if using PyQt bindings,
     else it implements a comparable binding for PySide.
 
+    Files are compiled the first time they are loaded,
+    see Compiled user interfaces.
+
     Documentation:
         http://pyqt.sourceforge.net/Docs/PyQt5/designer.html#PyQt5.uic.loadUi
 
@@ -858,6 +1151,10 @@ def _loadUi(uifile, baseinstance=None):
         return the newly created instance of the user interface.
 
     """
+    build = _ui_builder(uifile)
+    if build is not None:
+        return build(baseinstance)
+
     if hasattr(Qt, "_uic"):
         return Qt._uic.loadUi(uifile, baseinstance)
 
@@ -1218,8 +1515,247 @@ def _apply_site_config():
                 members=_compatibility_members)
 
 
+class _LazyModule(types.ModuleType):
+    """Qt.py submodule that binds its members the first time it is used
+
+    Copying every member of every binding submodule is most of the cost
+    of importing Qt.py, yet most programs only use a handful of them.
+    Members are copied over from the original submodule on first access
+    instead, importing that submodule too if it wasn't needed before.
+
+    """
+
+    def __getattr__(self, name):
+        # Leave the import machinery's own probing alone
+        if name.startswith("__") and name != "__all__":
+            raise AttributeError(name)
+
+        if not _bind(self):
+            raise AttributeError(
+                "'module' object has no attribute '%s'" % name)
+
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(
+                "'module' object has no attribute '%s'" % name)
+
+    def __dir__(self):
+        _bind(self)
+        return sorted(self.__dict__)
+
+
+# QtCompat makes its classes the first time it is used
+Qt.QtCompat = _LazyModule("QtCompat")
+
+
+# Names of submodules whose members have been bound
+_bound_modules = set()
+_bind_lock = threading.RLock()
+
+# Names of submodules found but not yet imported from the binding
+_deferred_modules = set()
+
+# Submodule name -> {member: value} of misplaced members named after
+# one of the submodule's own members. The binding's member goes first,
+# as when every member was copied over on import, e.g. qApp is placed
+# under QtWidgets.QApplication yet QApplication is the class.
+_shadowed_members = {}
+
+# Binding and decorators to make the QtCompat classes from on first use
+_compat_pending = []
+
+
+def _bind(module):
+    """Copy members of the original submodule onto `module`
+
+    Returns False if that already happened.
+
+    """
+
+    name = module.__name__.rsplit(".", 1)[-1]
+    with _bind_lock:
+        if name in _bound_modules:
+            return False
+        _bound_modules.add(name)
+
+        if name in _deferred_modules:
+            _deferred_modules.discard(name)
+            try:
+                submodule = _import_sub_module(
+                    sys.modules[Qt.__binding__], name)
+            except ImportError as e:
+                _log("ImportError: %s" % e)
+            else:
+                setattr(Qt, "_" + name, submodule)
+
+        if name == "QtCompat":
+            while _compat_pending:
+                _make_compatibility_members(*_compat_pending.pop(0))
+
+        their_submodule = getattr(Qt, "_" + name, None)
+        if their_submodule is None:
+            return True
+
+        # Members known to be missing from last time
+        missing = _cache.get("missing", {}).get(name)
+        skip = set(missing or [])
+
+        found_missing = []
+        for member in _common_members.get(name, []):
+            if member in skip:
+                continue
+
+            # Accept that a submodule may miss certain members.
+            try:
+                their_member = getattr(their_submodule, member)
+            except AttributeError:
+                _log("'%s.%s' was missing." % (name, member))
+                found_missing.append(member)
+                continue
+
+            setattr(module, member, their_member)
+
+        if missing is None and "missing" in _cache:
+            _cache["missing"][name] = found_missing
+            _cache["dirty"] = True
+
+        # Misplaced members the binding doesn't have itself
+        for member, value in _shadowed_members.pop(name, {}).items():
+            if member not in module.__dict__:
+                setattr(module, member, value)
+
+        return True
+
+
+"""Binding cache
+
+What was found out about the binding is kept in a small file per
+interpreter, so later startups don't have to find it out again: which
+binding was picked, which submodules it has, which members are missing
+from them and which misplaced members have no source. The cache belongs
+to the installed binding, reinstalling or adding anything next to it
+starts a new one. The files live in QT_CACHE_DIR, ~/.cache/Qt.py by
+default, set QT_NO_CACHE to go without.
+
+"""
+
+_cache = {}
+
+
+def _cache_key():
+    return "%s\n%s\n%s\n%s" % (sys.executable, sys.version, __version__,
+                              QT_PREFERRED_BINDING)
+
+
+def _cache_path():
+    # marshal is quick to load, and its format only has to
+    # be read by the same interpreter
+    name = "%08x" % (zlib.crc32(_cache_key().encode("utf-8")) & 0xffffffff)
+    return os.path.join(QT_CACHE_DIR, name + ".marshal")
+
+
+def _load_cache():
+    if QT_NO_CACHE:
+        return
+
+    try:
+        with open(_cache_path(), "rb") as f:
+            cache = marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return
+
+    if isinstance(cache, dict) and cache.get("key") == _cache_key():
+        _cache.update(cache)
+
+
+def _save_cache():
+    if QT_NO_CACHE or not _cache.pop("dirty", False):
+        return
+
+    try:
+        _replace_file(_cache_path(), marshal.dumps(_cache))
+    except (IOError, OSError) as e:
+        _log("Could not write binding cache: %s" % e)
+
+
+def _replace_file(path, data):
+    """Replace the file at `path` with `data` in one go
+
+    A process reading the file at the same time sees either
+    the old or the new contents, never half of them.
+
+    """
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    temp = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(data)
+
+    try:
+        os.rename(temp, path)
+    except OSError:
+        # Windows won't rename over an existing file
+        os.remove(path)
+        os.rename(temp, path)
+
+
+def _binding_stamp(path):
+    """Identify the binding package installed at `path`
+
+    Changes when the package, or anything next to it, is installed
+    or removed.
+
+    """
+
+    try:
+        return [path,
+                os.path.getmtime(path),
+                os.path.getmtime(os.path.dirname(path))]
+    except OSError:
+        return None
+
+
+def _find_binding(name):
+    """Return the package directory of binding `name`, without importing it"""
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        # Python 2
+        import imp
+        try:
+            return imp.find_module(name)[1]
+        except ImportError:
+            return None
+
+    try:
+        spec = find_spec(name)
+    except (ImportError, ValueError):
+        return None
+
+    if spec is None or not spec.origin:
+        return None
+    return os.path.dirname(spec.origin)
+
+
+def __getattr__(name):
+    """Import deferred original submodules, e.g. Qt._QtSql, on first use
+
+    Only used by Python 3.7 and above, see PEP 562
+
+    """
+
+    if name.startswith("_") and name[1:] in _deferred_modules:
+        _bind(getattr(Qt, name[1:]))
+        return getattr(Qt, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
 def _new_module(name):
-    return types.ModuleType(__name__ + "." + name)
+    return _LazyModule(__name__ + "." + name)
 
 
 def _import_sub_module(module, name):
@@ -1230,12 +1766,72 @@ def _import_sub_module(module, name):
     return module
 
 
+def _find_sub_module(module, name):
+    """Return whether `module` has submodule `name`, without importing it"""
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        # Python 2
+        import imp
+        try:
+            imp.find_module(name, module.__path__)
+        except (ImportError, AttributeError):
+            return False
+        return True
+
+    try:
+        return find_spec(module.__name__ + "." + name) is not None
+    except (ImportError, ValueError, AttributeError):
+        return False
+
+
+def _eager_modules(binding):
+    """Submodules Qt.py reaches into itself while installing `binding`"""
+    names = set()
+    for src in _misplaced_members.get(binding, {}):
+        names.add(src.split(".")[0])
+
+    for members in _compatibility_members.get(binding, {}).values():
+        for target in members.values():
+            names.add(target.split(".")[0])
+
+    return names
+
+
 def _setup(module, extras):
-    """Install common submodules"""
+    """Install common submodules
+
+    Submodules used while installing the binding are imported right away,
+    the rest are imported the first time they're used. A submodule that is
+    found but fails to import then stays empty.
+
+    """
 
     Qt.__binding__ = module.__name__
 
+    stamp = _binding_stamp(os.path.dirname(module.__file__))
+    if _cache.get("binding") != module.__name__ or \
+            _cache.get("stamp") != stamp:
+        # Nothing known about this binding yet
+        _cache.clear()
+        _cache.update(key=_cache_key(), binding=module.__name__,
+                      stamp=stamp, submodules={}, missing={}, misplaced=[],
+                      dirty=True)
+
+    submodules = _cache["submodules"]
+    eager = _eager_modules(module.__name__)
     for name in list(_common_members) + extras:
+        if name not in extras and name not in eager:
+            found = submodules.get(name)
+            if found is None:
+                found = submodules[name] = _find_sub_module(module, name)
+                _cache["dirty"] = True
+
+            if found:
+                _deferred_modules.add(name)
+                setattr(Qt, name, _new_module(name))
+                continue
+
         try:
             submodule = _import_sub_module(
                 module, name)
@@ -1264,7 +1860,13 @@ def _reassign_misplaced_members(binding):
 
     """
 
+    # Members found to have no source last time
+    no_source = set(_cache.get("misplaced", []))
+
     for src, dst in _misplaced_members[binding].items():
+        if src in no_source:
+            continue
+
         dst_value = None
 
         src_parts = src.split(".")
@@ -1296,6 +1898,9 @@ def _reassign_misplaced_members(binding):
                 # request was made to rename a member that didn't exist, for
                 # example if QtWidgets isn't available on the target platform.
                 _log("Misplaced member has no source: {0}".format(src))
+                if "misplaced" in _cache:
+                    _cache["misplaced"].append(src)
+                    _cache["dirty"] = True
                 continue
 
         try:
@@ -1321,6 +1926,14 @@ def _reassign_misplaced_members(binding):
             if src_member:
                 dst_value = getattr(dst_value, src_member)
 
+        if (isinstance(src_object, _LazyModule) and
+                dst_module not in _bound_modules and
+                dst_member in _common_members.get(dst_module, ())):
+            # Left for _bind, the binding's own member goes first
+            _shadowed_members.setdefault(dst_module, {})[dst_member] = \
+                dst_value
+            continue
+
         setattr(
             src_object,
             dst_member or dst_module,
@@ -1331,6 +1944,9 @@ def _reassign_misplaced_members(binding):
 def _build_compatibility_members(binding, decorators=None):
     """Apply `binding` to QtCompat
 
+    The classes are made the first time QtCompat is used, as most
+    programs never touch them. See _bind.
+
     Arguments:
         binding (str): Top level binding in _compatibility_members.
         decorators (dict, optional): Provides the ability to decorate the
@@ -1341,17 +1957,16 @@ def _build_compatibility_members(binding, decorators=None):
 
     """
 
-    decorators = decorators or dict()
+    _compat_pending.append((binding, decorators or dict()))
 
+
+def _make_compatibility_members(binding, decorators):
     # Allow optional site-level customization of the compatibility members.
-    # This method does not need to be implemented in QtSiteConfig.
-    try:
-        import QtSiteConfig
-    except ImportError:
-        pass
-    else:
-        if hasattr(QtSiteConfig, 'update_compatibility_decorators'):
-            QtSiteConfig.update_compatibility_decorators(binding, decorators)
+    # This method does not need to be implemented in QtSiteConfig, which
+    # _apply_site_config has imported already if there is one.
+    QtSiteConfig = sys.modules.get("QtSiteConfig")
+    if hasattr(QtSiteConfig, 'update_compatibility_decorators'):
+        QtSiteConfig.update_compatibility_decorators(binding, decorators)
 
     _QtCompat = type("QtCompat", (object,), {})
 
@@ -1625,6 +2240,18 @@ def _pyqt4():
             "getSaveFileName": _standardizeQFileDialog,
         }
     }
+
+    # PyQt4.6 and above return the filter themselves,
+    # use those as they are rather than through a wrapper
+    file_dialog = getattr(getattr(Qt, "_QtGui", None), "QFileDialog", None)
+    dialogs = _compatibility_members["PyQt4"]["QFileDialog"]
+    for target in list(decorators["QFileDialog"]):
+        native = target + "AndFilter"
+        if hasattr(file_dialog, native) and \
+                dialogs.get(target) == "QtWidgets.QFileDialog." + target:
+            dialogs[target] = "QtWidgets.QFileDialog." + native
+            del decorators["QFileDialog"][target]
+
     _build_compatibility_members('PyQt4', decorators)
 
 
@@ -1661,8 +2288,24 @@ def _convert(lines):
 
     """
 
-    def parse(line):
+    return list(_convert_lines(lines))
+
+
+def _convert_lines(lines):
+    """Convert compiled .ui file from PySide2 to Qt.py, a line at a time
+
+    Arguments:
+        lines (iterable): Lines of .ui file, such as a file object
+
+    Usage:
+        >> for line in _convert_lines(sys.stdin):
+        ..   sys.stdout.write(line)
+
+    """
+
+    for line in lines:
         line = line.replace("from PySide2 import", "from Qt import QtCompat,")
+        line = line.replace("from PySide2.", "from Qt.")
         line = line.replace("QtWidgets.QApplication.translate",
                             "QtCompat.translate")
         if "QtCore.SIGNAL" in line:
@@ -1670,23 +2313,154 @@ def _convert(lines):
                                       "and so Qt.py does not support it: you "
                                       "should avoid defining signals inside "
                                       "your ui files.")
-        return line
+        yield line
 
-    parsed = list()
-    for line in lines:
-        line = parse(line)
-        parsed.append(line)
 
-    return parsed
+def _is_compiled_ui(text):
+    """Was `text` written by a .ui compiler"""
+    return "def setupUi(" in text and "will be lost" in text
+
+
+def _convert_tree_file(job):
+    """Convert one module of a tree in place
+
+    Run in a separate process by _convert_tree.
+
+    Arguments:
+        job (tuple): Path to module and checksum of it after
+            it was last looked at, or None
+
+    Return:
+        Path, status, checksum and stat of the module as it is now,
+        and an error message when it failed
+
+    """
+
+    import hashlib
+
+    path, known = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        checksum = hashlib.sha1(data).hexdigest()
+        status = "unchanged"
+
+        if checksum != known:
+            text = data.decode("utf-8")
+            if not _is_compiled_ui(text):
+                status = "skipped"
+            else:
+                converted = "".join(_convert_lines(text.splitlines(True)))
+                if converted != text:
+                    data = converted.encode("utf-8")
+                    _replace_file(path, data)
+                    checksum = hashlib.sha1(data).hexdigest()
+                    status = "converted"
+
+        stat = os.stat(path)
+
+    except (IOError, OSError, UnicodeDecodeError, NotImplementedError) as e:
+        return path, "failed", None, None, str(e)
+
+    return path, status, checksum, [stat.st_mtime, stat.st_size], None
+
+
+def _convert_tree(root, processes=None):
+    """Convert every compiled .ui module under `root` in place
+
+    Modules are converted across processes. What each module looked
+    like last time is kept in QT_CACHE_DIR/convert, and modules that
+    haven't changed since are left alone.
+
+    Arguments:
+        root (str): Directory to convert
+        processes (int, optional): Number of modules to convert at once,
+            defaults to one per core
+
+    Return:
+        Iterator of path, status and error message of every module,
+        status is one of "converted", "unchanged", "skipped" or "failed"
+
+    """
+
+    root = os.path.abspath(root)
+    name = "%08x" % (zlib.crc32(root.encode("utf-8")) & 0xffffffff)
+    manifest_path = os.path.join(QT_CACHE_DIR, "convert", name + ".marshal")
+
+    manifest = {}
+    if not QT_NO_CACHE:
+        try:
+            with open(manifest_path, "rb") as f:
+                manifest = marshal.load(f)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+
+    current = {}
+    pending = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            known = manifest.get(path)
+            if known and known[0] == [stat.st_mtime, stat.st_size]:
+                # Untouched since it was last looked at
+                current[path] = known
+                yield path, "unchanged", None
+                continue
+
+            pending.append((path, known[1] if known else None))
+
+    if len(pending) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(processes or
+                                        multiprocessing.cpu_count(),
+                                        len(pending)))
+        results = pool.imap_unordered(_convert_tree_file, pending)
+    else:
+        pool = None
+        results = (_convert_tree_file(job) for job in pending)
+
+    try:
+        for path, status, checksum, stat, error in results:
+            if checksum is not None:
+                current[path] = [stat, checksum]
+            yield path, status, error
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+        if not QT_NO_CACHE and current != manifest:
+            try:
+                _replace_file(manifest_path, marshal.dumps(current))
+            except (IOError, OSError) as e:
+                _log("Could not write %s: %s" % (manifest_path, e))
 
 
 def _cli(args):
-    """Qt.py command-line interface"""
+    """Qt.py command-line interface
+
+    Usage:
+        $ python Qt.py --convert my_ui.py
+        $ python Qt.py --convert ui/ --jobs 8
+        $ pyside2-uic my.ui | python Qt.py --stdin > my_ui.py
+        $ python Qt.py --compile my.ui --stdout
+
+    """
     import argparse
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--convert",
-                        help="Path to compiled Python module, e.g. my_ui.py")
+                        help="Path to compiled Python module, e.g. my_ui.py, "
+                             "or a directory of them")
     parser.add_argument("--compile",
                         help="Accept raw .ui file and compile with native "
                              "PySide2 compiler.")
@@ -1696,17 +2470,55 @@ def _cli(args):
     parser.add_argument("--stdin",
                         help="Read from stdin instead of file",
                         action="store_true")
+    parser.add_argument("--jobs",
+                        type=int,
+                        help="Number of modules to convert at once in a "
+                             "directory, one per core by default")
 
     args = parser.parse_args(args)
 
-    if args.stdout:
-        raise NotImplementedError("--stdout")
-
     if args.stdin:
-        raise NotImplementedError("--stdin")
+        for line in _convert_lines(sys.stdin):
+            sys.stdout.write(line)
+        return 0
 
     if args.compile:
-        raise NotImplementedError("--compile")
+        source = _compile_ui(args.compile)
+        if source is None:
+            sys.stderr.write("No .ui compiler available for %s\n"
+                             % Qt.__binding__)
+            return 1
+
+        lines = _convert_lines(source.splitlines(True))
+        if args.stdout:
+            sys.stdout.writelines(lines)
+        else:
+            output = "%s_ui.py" % os.path.splitext(args.compile)[0]
+            with open(output, "w") as f:
+                f.writelines(lines)
+            sys.stdout.write("Compiled \"%s\"\n" % output)
+        return 0
+
+    if args.convert and os.path.isdir(args.convert):
+        counts = dict.fromkeys(("converted", "unchanged",
+                                "skipped", "failed"), 0)
+        for path, status, error in _convert_tree(args.convert, args.jobs):
+            counts[status] += 1
+            if status == "converted":
+                sys.stdout.write("Converted \"%s\"\n" % path)
+            elif status == "failed":
+                sys.stderr.write("Could not convert \"%s\": %s\n"
+                                 % (path, error))
+
+        sys.stdout.write("%(converted)d converted, %(unchanged)d unchanged, "
+                         "%(skipped)d skipped, %(failed)d failed\n" % counts)
+        return 1 if counts["failed"] else 0
+
+    if args.convert and args.stdout:
+        with open(args.convert) as f:
+            for line in _convert_lines(f):
+                sys.stdout.write(line)
+        return 0
 
     if args.convert:
         sys.stdout.write("#\n"
@@ -1715,23 +2527,30 @@ def _cli(args):
                          "# for details.\n"
                          "#\n")
 
-        #
-        # ------> Read
-        #
-        with open(args.convert) as f:
-            lines = _convert(f.readlines())
-
+        # The original becomes the backup
         backup = "%s_backup%s" % os.path.splitext(args.convert)
         sys.stdout.write("Creating \"%s\"..\n" % backup)
-        shutil.copy(args.convert, backup)
+        shutil.move(args.convert, backup)
 
         #
-        # <------ Write
+        # ------> Read, <------ Write
         #
-        with open(args.convert, "w") as f:
-            f.write("".join(lines))
+        try:
+            with open(backup) as source:
+                with open(args.convert, "w") as f:
+                    for line in _convert_lines(source):
+                        f.write(line)
+        except Exception:
+            # Put the original back
+            os.remove(args.convert)
+            shutil.move(backup, args.convert)
+            raise
 
         sys.stdout.write("Successfully converted \"%s\"\n" % args.convert)
+        return 0
+
+    parser.print_usage()
+    return 1
 
 
 def _install():
@@ -1751,11 +2570,19 @@ def _install():
         "None": _none
     }
 
-    _log("Order: '%s'" % "', '".join(order))
-
     # Allow site-level customization of the available modules.
     _apply_site_config()
 
+    # Go straight to the binding found last time, unless
+    # anything changed where it is installed
+    _load_cache()
+    cached = _cache.get("binding")
+    if cached in order and cached != order[0] and \
+            _cache.get("stamp") == _binding_stamp(_find_binding(cached)):
+        order = [cached] + [name for name in order if name != cached]
+
+    _log("Order: '%s'" % "', '".join(order))
+
     found_binding = False
     for name in order:
         _log("Trying %s" % name)
@@ -1775,11 +2602,10 @@ def _install():
         # If not binding were found, throw this error
         raise ImportError("No Qt binding were found.")
 
-    # Install individual members
-    for name, members in _common_members.items():
-        try:
-            their_submodule = getattr(Qt, "_%s" % name)
-        except AttributeError:
+    # Install submodules, their individual members are
+    # installed the first time they're used, see _LazyModule
+    for name in _common_members:
+        if name not in _deferred_modules and not hasattr(Qt, "_%s" % name):
             continue
 
         our_submodule = getattr(Qt, name)
@@ -1791,19 +2617,14 @@ def _install():
         # e.g. import Qt.QtCore
         sys.modules[__name__ + "." + name] = our_submodule
 
-        for member in members:
-            # Accept that a submodule may miss certain members.
-            try:
-                their_member = getattr(their_submodule, member)
-            except AttributeError:
-                _log("'%s.%s' was missing." % (name, member))
-                continue
-
-            setattr(our_submodule, member, their_member)
-
     # Enable direct import of QtCompat
     sys.modules['Qt.QtCompat'] = Qt.QtCompat
 
+    # Missing members are found as submodules are used, keep those too
+    if _cache.get("binding") == Qt.__binding__:
+        _save_cache()
+        atexit.register(_save_cache)
+
     # Backwards compatibility
     if hasattr(Qt.QtCompat, 'loadUi'):
         Qt.QtCompat.load_ui = Qt.QtCompat.loadUi
@@ -1831,7 +2652,7 @@ Qt.QtCompat._convert = _convert
 
 # Enable command-line interface
 if __name__ == "__main__":
-    _cli(sys.argv[1:])
+    sys.exit(_cli(sys.argv[1:]))
 
 
 # The MIT License (MIT)
@@ -0,0 +1,69 @@
+import fnmatch
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LightIndex
+
+NAMES = ['abc_light', 'area', 'bat', 'cab', 'key_light', 'set01:rim', 'set01:lamps:fill', 'x]y', 'dog']
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = LightIndex.NameIndex()
+        for name in NAMES:
+            self.index.add('|%s|%sShape' % (name, name), name, 'pointLight')
+
+    def names(self, keys):
+        return sorted(self.index.entries[key][0] for key in keys)
+
+    def assertGlob(self, pattern):
+        # the index has to find every name fnmatch does, the n-grams only narrow it down
+        expected = sorted(name.lower() for name in NAMES if fnmatch.fnmatchcase(name.lower(), pattern.lower()))
+        self.assertEqual(self.names(self.index.search(pattern, LightIndex.GLOB)), expected)
+
+    def testText(self):
+        self.assertEqual(self.names(self.index.search('light')), ['abc_light', 'key_light'])
+
+    def testGlob(self):
+        for pattern in ('*light', 'key*', 'set01:*', '?a?', 'x]y'):
+            self.assertGlob(pattern)
+
+    def testGlobClass(self):
+        # what's in a class isn't a run of characters every match has
+        for pattern in ('*[abc]*', '*[!abc]*', '[]x]*', 'a[rb]ea*', '*_li[g]ht', '*[abc'):
+            self.assertGlob(pattern)
+
+    def testRegex(self):
+        self.assertEqual(self.names(self.index.search('^(bat|cab)$', LightIndex.REGEX)), ['bat', 'cab'])
+
+    def testFacets(self):
+        self.assertEqual(self.index.namespaces(), ['', 'set01', 'set01:lamps'])
+        self.assertEqual(self.names(self.index.search(ns='set01')), ['set01:rim'])
+        self.index.discard('|set01:rim|set01:rimShape')
+        self.assertEqual(self.index.namespaces(), ['', 'set01:lamps'])
+
+
+class SpatialGridTest(unittest.TestCase):
+
+    def testNearest(self):
+        positions = [(x * 3.0, (x * 7) % 5, -x * 2.0) for x in range(50)]
+        grid = LightIndex.SpatialGrid.fit(enumerate(positions))
+        point = (20.0, 1.0, -10.0)
+        expected = sorted((LightIndex.distance2(point, p), key) for key, p in enumerate(positions))[:5]
+        self.assertEqual([key for distance, key in grid.nearest(point, 5)], [key for distance, key in expected])
+
+    def testRadius(self):
+        grid = LightIndex.SpatialGrid(1.0)
+        grid.move('a', (0.0, 0.0, 0.0))
+        grid.move('b', (5.0, 0.0, 0.0))
+        self.assertEqual(grid.radius((1.0, 0.0, 0.0), 2.0), set(['a']))
+        grid.move('a', (10.0, 0.0, 0.0))
+        self.assertEqual(grid.radius((1.0, 0.0, 0.0), 2.0), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
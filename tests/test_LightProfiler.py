@@ -0,0 +1,24 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LightProfiler
+
+
+class LimitTest(unittest.TestCase):
+
+    def testLimit(self):
+        self.assertEqual(LightProfiler._limit('250', 100), 250)
+        self.assertEqual(LightProfiler._limit(None, 100), 100)
+        self.assertEqual(LightProfiler._limit('', 100), 100)
+
+    def testBadLimit(self):
+        # a bad value falls back to the default instead of failing the import
+        for value in ('lots', '1.5', '-1'):
+            self.assertEqual(LightProfiler._limit(value, 100), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import LightRig
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# the lights tests/data/rig.usda was written from
+LIGHTS = [
+    ('key', {
+        'lightType': 'spotLight', 'intensity': 2.5, 'color': [1.0, 0.9, 0.75], 'visibility': True,
+        'translate': [1.0, 2.0, 3.0], 'rotation': [-45.0, 30.0, 0.0], 'rotateOrder': 2, 'parent': '|lights|keys',
+        'matrix': [0.5, 0.0, -0.8660254037844386, 0.0, 0.0, 1.0, 0.0, 0.0, 0.8660254037844386, 0.0, 0.5, 0.0,
+                   1.0, 2.0, 3.0, 1.0],
+    }),
+    ('set01:fill', {
+        'lightType': 'areaLight', 'intensity': 0.1, 'color': [0.2, 0.4, 1.0], 'visibility': False,
+        'translate': [-4.0, 0.5, 0.0], 'rotation': [0.0, 90.0, 0.0], 'rotateOrder': 0, 'parent': None,
+        'matrix': [0.0, 0.0, -1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, -4.0, 0.5, 0.0, 1.0],
+    }),
+    ('sun', {
+        'lightType': 'directionalLight', 'intensity': 1.0, 'color': [1.0, 1.0, 1.0], 'visibility': True,
+        'translate': [0.0, 0.0, 0.0], 'rotation': [-60.0, 15.0, 0.0], 'rotateOrder': 5,
+    }),
+    ('bulb', {
+        'lightType': 'pointLight', 'intensity': 30.0, 'color': [1.0, 0.5, 0.25], 'visibility': True,
+        'translate': [0.0, 10.0, 0.0], 'rotation': [0.0, 0.0, 0.0], 'rotateOrder': 0,
+    }),
+]
+
+
+def golden(name):
+    with io.open(os.path.join(DATA, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class AnimationTest(unittest.TestCase):
+
+    def assertWithin(self, frames, values, keys, tolerance, stepped=False):
+        for frame, value in zip(frames, values):
+            self.assertLessEqual(abs(LightRig.evaluateChannel(keys, frame, stepped) - value), tolerance + 1e-9)
+
+    def testConstant(self):
+        self.assertIsNone(LightRig.compressChannel([1, 2, 3], [2.0, 2.0, 2.0]))
+        self.assertIsNone(LightRig.compressChannel([1, 2, 3], [1.0, 1.0, 1.0], stepped=True))
+
+    def testLinearRun(self):
+        frames = list(range(1, 101))
+        keys = LightRig.compressChannel(frames, [frame * 0.5 for frame in frames])
+        self.assertEqual(keys, [[1, 100], [0.5, 50.0]])
+
+    def testTolerance(self):
+        frames = list(range(0, 200))
+        values = [math.sin(frame * 0.1) for frame in frames]
+        for tolerance in (0.0, 0.01, 0.2):
+            keys = LightRig.compressChannel(frames, values, tolerance)
+            self.assertWithin(frames, values, keys, tolerance)
+        self.assertLess(len(LightRig.compressChannel(frames, values, 0.2)[0]), 20)
+
+    def testStepped(self):
+        # every change of a stepped channel is kept, however loose the tolerance
+        frames = list(range(1, 31))
+        values = [1.0 if 5 <= frame < 12 or frame == 20 else 0.0 for frame in frames]
+        for tolerance in (0.0, 0.5, 2.0):
+            keys = LightRig.compressChannel(frames, values, tolerance, stepped=True)
+            self.assertEqual(keys, [[1, 5, 12, 20, 21], [0.0, 1.0, 0.0, 1.0, 0.0]])
+            self.assertWithin(frames, values, keys, 0.0, stepped=True)
+
+
+class UsdaTest(unittest.TestCase):
+
+    def testWrite(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'rig.usda')
+        try:
+            with open(path, 'w') as f:
+                # lights are written as they come, a generator is enough
+                LightRig.writeUsda(f, (light for light in LIGHTS), 0.01)
+            with io.open(path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), golden('rig.usda'))
+        finally:
+            shutil.rmtree(directory)
+
+    def testRead(self):
+        lights = list(LightRig.readUsda(io.StringIO(golden('rig.usda'))))
+        expected = []
+        for name, light in LIGHTS:
+            if 'matrix' in light:
+                # only the world matrix is written, import places lights by it
+                light = dict(light, translate=light['matrix'][12:15], rotation=[0.0, 0.0, 0.0])
+            expected.append((name, light))
+        self.assertEqual(lights, expected)
+
+    def testReadForeign(self):
+        # plain UsdLux from another tool, exposure is folded into intensity and
+        # time samples are skipped
+        lights = dict(LightRig.readUsda(io.StringIO(golden('foreign.usda'))))
+        self.assertEqual(sorted(lights), ['Practical', 'Sun'])
+        self.assertEqual(lights['Practical'], {
+            'lightType': 'areaLight', 'intensity': 16.0, 'color': [1, 0.5, 0], 'visibility': True,
+            'translate': [0, 2.5, -1], 'rotation': [0, 45, 0], 'rotateOrder': 4,
+        })
+        self.assertEqual(lights['Sun'], {
+            'lightType': 'directionalLight', 'intensity': 1.0, 'color': [1.0, 1.0, 1.0], 'visibility': False,
+            'matrix': [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 10, 20, 30, 1], 'translate': [10, 20, 30],
+            'rotation': [0.0, 0.0, 0.0],
+        })
+
+    def testValidates(self):
+        lights, problems = LightRig.validateRig(dict(LightRig.readUsda(io.StringIO(golden('rig.usda')))))
+        self.assertEqual(problems, [])
+        self.assertEqual(len(lights), len(LIGHTS))
+
+
+class BinaryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rig.lrig')
+        LightRig.writeRig(self.path, dict(LIGHTS))
+        with open(self.path, 'rb') as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        return LightRig.readRig(self.path)
+
+    def testRoundTrip(self):
+        lights, problems = LightRig.validateRig(self.read(self.data))
+        self.assertEqual(problems, [])
+        self.assertEqual(sorted(lights), sorted(dict(LIGHTS)))
+        self.assertEqual(lights['key']['parent'], '|lights|keys')
+        self.assertEqual(lights['key']['matrix'], dict(LIGHTS)['key']['matrix'])
+
+    def testCutShort(self):
+        # a file cut short anywhere is reported, not read wrong
+        for size in range(0, len(self.data), 7):
+            self.assertRaises(ValueError, self.read, self.data[:size])
+
+    def testDamaged(self):
+        # damage anywhere either still reads or raises ValueError
+        for offset in range(len(self.data)):
+            damaged = bytearray(self.data)
+            damaged[offset] ^= 0xff
+            try:
+                self.read(bytes(damaged))
+            except ValueError:
+                pass
+
+
+class StreamTest(unittest.TestCase):
+
+    def testReadJson(self):
+        # however the file is cut into chunks, the entries come out the same
+        rig = {'#version': 1, 'a': {'intensity': 12345.678, 'name': u'l\u00e4mp', 'keys': [[1, 2], [3e-5, -4]]},
+               'b': [], 'c': 1234567, 'd': None, 'e': {}, 'f': True}
+        text = u'%s' % json.dumps(rig, indent=4)
+        for size in (1, 2, 3, 7, 64, 65536):
+            self.assertEqual(dict(LightRig.readJson(io.StringIO(text), size)), rig)
+        self.assertEqual(list(LightRig.readJson(io.StringIO(u' { } '))), [])
+
+    def testReadJsonDamaged(self):
+        text = u'%s' % json.dumps(dict(LIGHTS))
+        for size in range(0, len(text) - 1, 11):
+            self.assertRaises(ValueError, list, LightRig.readJson(io.StringIO(text[:size]), 16))
+        for damaged in (u'[]', u'{"a": 1,}', u'{"a" 1}', u'{1: 2}', u'{"a": 1} x', u'{"a": 1 "b": 2}'):
+            self.assertRaises(ValueError, list, LightRig.readJson(io.StringIO(damaged)))
+
+    def testLazy(self):
+        # a light is brought up to date as soon as it's read, with the
+        # version ahead of the lights nothing is held back
+        read = []
+
+        def records():
+            for record in [('#version', 0), ('a', {'color': [1, 1, 1, 1]}), ('b', {'intensity': None})]:
+                read.append(record[0])
+                yield record
+
+        lights = LightRig.iterLights(records())
+        self.assertEqual(next(lights), ('a', {'color': [1, 1, 1], 'visibility': True}))
+        self.assertEqual(read, ['#version', 'a'])
+        self.assertEqual(next(lights), ('b', {'visibility': True}))
+
+    def testVersionLast(self):
+        # files from before the version went first still come up to date
+        records = [('a', {'color': [1, 1, 1, 1]}), ('#version', 1)]
+        self.assertEqual(list(LightRig.iterLights(records)), [('a', {'color': [1, 1, 1, 1]})])
+        records = [('a', {'color': [1, 1, 1, 1]})]
+        self.assertEqual(list(LightRig.iterLights(records)), [('a', {'color': [1, 1, 1], 'visibility': True})])
+        self.assertRaises(ValueError, list, LightRig.iterLights([('#version', 99), ('a', {})]))
+
+    def testFiles(self):
+        # every format and codec reads back through iterRig with its header first
+        directory = tempfile.mkdtemp()
+        try:
+            codecs = [None, 'gzip', 'bz2'] + (['lzma'] if LightRig.lzma else [])
+            for compression in codecs:
+                for name, compact in (('rig.json', False), ('rig.json', True), ('rig.lrig', False)):
+                    path = os.path.join(directory, name)
+                    LightRig.writeRig(path, dict(LIGHTS), compression=compression, compact=compact)
+                    records = list(LightRig.iterRig(path))
+                    self.assertEqual(records[compact][0], '#version')
+                    lights, problems = LightRig.validateRig(iter(records))
+                    self.assertEqual(problems, [])
+                    self.assertEqual(lights, dict(LIGHTS))
+        finally:
+            shutil.rmtree(directory)
+
+
+class CompressedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testDamaged(self):
+        # a compressed rig cut short or damaged raises ValueError whatever the
+        # codec raised
+        codecs = ['gzip', 'bz2'] + (['lzma'] if LightRig.lzma else [])
+        for compression in codecs:
+            for name in ('rig.lrig', 'rig.json', 'rig.usda'):
+                path = os.path.join(self.directory, name)
+                LightRig.writeRig(path, dict(LIGHTS), compression=compression)
+                self.assertEqual(LightRig.rigCompression(path), compression)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                header = len(LightRig.COMPRESSION[compression])
+                damaged = bytearray(data)
+                for offset in range(header + 16, len(data) - 8, 5):
+                    damaged[offset] ^= 0x55
+                for broken in (data[:len(data) // 2], data[:20], bytes(damaged)):
+                    with open(path, 'wb') as f:
+                        f.write(broken)
+                    self.assertRaises(ValueError, LightRig.readRig, path)
+
+
+def hasFutures():
+    try:
+        import concurrent.futures
+    except ImportError:
+        return False
+    return True
+
+
+@unittest.skipUnless(hasFutures(), 'needs concurrent.futures, the futures package on python 2')
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        lights = dict(LIGHTS)
+        animated = dict(lights, sun=dict(lights['sun'], animation={'intensity': [[1, 10], [1.0, 2.0]]}))
+        for folder, rig in (('a', lights), ('b', animated)):
+            os.makedirs(os.path.join(self.directory, 'rigs', folder))
+            LightRig.writeRig(os.path.join(self.directory, 'rigs', folder, 'shot.json'), rig)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def command(self, *args):
+        # exit code of LightRig.py run on the command line, progress is thrown away
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call([sys.executable, os.path.join(ROOT, 'LightRig.py')] + list(args),
+                                   cwd=self.directory, stderr=devnull)
+
+    def report(self):
+        with open(os.path.join(self.directory, 'report.jsonl')) as f:
+            return [json.loads(line) for line in f]
+
+    def testConvert(self):
+        # the documented command line, options after the command. Files of the
+        # same name keep their folders, animation left out is reported.
+        code = self.command('convert', 'rigs', '--to', 'usda', '--output', 'usd',
+                            '--jobs', '2', '--report', 'report.jsonl')
+        self.assertEqual(code, 0)
+        statuses = dict((os.path.relpath(result['path'], 'rigs'), result['status'])
+                        for result in self.report() if 'path' in result)
+        self.assertEqual(statuses, {os.path.join('a', 'shot.json'): 'ok', os.path.join('b', 'shot.json'): 'lossy'})
+        for folder in ('a', 'b'):
+            self.assertTrue(os.path.exists(os.path.join(self.directory, 'usd', folder, 'shot.usda')))
+
+    def testOptionsFirst(self):
+        self.assertEqual(self.command('--jobs', '1', '--report', 'report.jsonl', 'validate', 'rigs'), 0)
+        self.assertEqual(self.report()[-1], {'summary': 'validate', 'counts': {'ok': 2}})
+
+    def testCollision(self):
+        # two files that would be written to the same place stop the conversion
+        code = self.command('convert', os.path.join('rigs', 'a', 'shot.json'), os.path.join('rigs', 'b', 'shot.json'),
+                        '--to', 'usda', '--output', 'usd')
+        self.assertEqual(code, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'usd')))
+
+
+if __name__ == '__main__':
+    unittest.main()
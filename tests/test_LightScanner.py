@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LightScanner
+
+SCENE = '''//Maya ASCII 2020 scene
+requires maya "2020";
+currentUnit -l centimeter -a degree -t film;
+createNode transform -n "grp";
+createNode transform -n "key" -p "grp";
+	setAttr ".t" -type "double3" 1 2 3 ;
+createNode pointLight -n "keyShape" -p "|grp|key";
+	setAttr ".in" 2.5;
+createNode transform -n "grp2";
+	setAttr ".tx" 10;
+createNode transform -n "key" -p "grp2";
+	setAttr ".ro" 3;
+createNode spotLight -n "keyShape" -p "|grp2|key";
+	setAttr ".cl" -type "float3" 1 0.5 0.25 ;
+	setAttr ".v" no;
+createNode transform -n "fill";
+createNode areaLight -n "fillShape" -p "fill";
+createNode mesh -n "groundShape" -p "fill";
+	setAttr -s 4 ".vt[0:3]" -1 0 -1 1 0 -1
+		-1 0 1 1 0 1;
+'''
+
+
+class SceneScannerTest(unittest.TestCase):
+
+    def setUp(self):
+        scanner = LightScanner.SceneScanner()
+        scanner.scan(SCENE.splitlines(True))
+        self.lights = scanner.records()
+
+    def testSameNames(self):
+        # lights called the same in different groups are both kept
+        self.assertEqual(sorted(self.lights), ['fill', 'grp2|key', 'grp|key'])
+        self.assertEqual(self.lights['grp|key']['lightType'], 'pointLight')
+        self.assertEqual(self.lights['grp2|key']['lightType'], 'spotLight')
+
+    def testValues(self):
+        key = self.lights['grp|key']
+        self.assertEqual(key['intensity'], 2.5)
+        self.assertEqual(key['translate'], [1.0, 2.0, 3.0])
+        self.assertEqual(key['parent'], '|grp')
+        self.assertEqual(key['matrix'][12:15], [1.0, 2.0, 3.0])
+
+        spot = self.lights['grp2|key']
+        self.assertEqual(spot['color'], [1.0, 0.5, 0.25])
+        self.assertFalse(spot['visibility'])
+        self.assertEqual(spot['rotateOrder'], 3)
+        self.assertEqual(spot['matrix'][12:15], [10.0, 0.0, 0.0])
+
+        self.assertEqual(self.lights['fill']['parent'], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
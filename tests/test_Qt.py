@@ -0,0 +1,219 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def hasBinding():
+    for binding in ('PySide2', 'PyQt5', 'PySide', 'PyQt4'):
+        try:
+            __import__(binding + '.QtCore')
+        except ImportError:
+            continue
+        return True
+    return False
+
+
+# imports Qt.py in a fresh interpreter, with the modules every Qt program
+# needs already imported, and times it against then binding every submodule
+TIMING = '''
+import importlib, json, sys, time
+sys.path.insert(0, %r)
+clock = getattr(time, 'perf_counter', time.time)
+for binding in ('PySide2', 'PyQt5', 'PySide', 'PyQt4'):
+    try:
+        importlib.import_module(binding + '.QtCore')
+    except ImportError:
+        continue
+    for name in ('QtGui', 'QtWidgets'):
+        try:
+            importlib.import_module(binding + '.' + name)
+        except ImportError:
+            pass
+    break
+
+start = clock()
+import Qt
+imported = clock()
+modules = len([name for name in sys.modules if name.startswith(Qt.__binding__ + '.')])
+for name in Qt._common_members:
+    dir(getattr(Qt, name, None))
+bound = clock()
+json.dump({'import': imported - start, 'bind': bound - start, 'modules': modules,
+           'allModules': len([name for name in sys.modules if name.startswith(Qt.__binding__ + '.')])},
+          sys.stdout)
+''' % ROOT
+
+
+@unittest.skipUnless(hasBinding(), 'needs a Qt binding')
+class QtTest(unittest.TestCase):
+
+    def setUp(self):
+        # no cache from earlier runs, no display needed
+        self.env = dict(os.environ, QT_NO_CACHE='1', QT_QPA_PLATFORM='offscreen')
+
+    def python(self, code):
+        output = subprocess.check_output([sys.executable, '-c', code], env=self.env)
+        return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    def testLazyImport(self):
+        # importing only binds what's used, taking the fastest of a few
+        # runs as the timing of each
+        runs = [self.python(TIMING) for i in range(5)]
+        imported = min(run['import'] for run in runs)
+        bound = min(run['bind'] for run in runs)
+        self.assertLess(imported, bound * 0.9)
+        self.assertLess(runs[0]['modules'], runs[0]['allModules'])
+
+    def testMembers(self):
+        # members of the binding go before misplaced members named after them,
+        # qApp is misplaced under QApplication
+        members = self.python('''
+import json, sys
+sys.path.insert(0, %r)
+import Qt
+app = Qt.QtWidgets.QApplication([])
+json.dump({'class': isinstance(Qt.QtWidgets.QApplication, type),
+           'app': isinstance(app, Qt.QtWidgets.QApplication),
+           'signal': hasattr(Qt.QtCore, 'Signal'),
+           'loadUi': hasattr(Qt.QtCompat, 'loadUi')}, sys.stdout)
+''' % ROOT)
+        self.assertEqual(members, {'class': True, 'app': True, 'signal': True, 'loadUi': True})
+
+    def testWrapInstance(self):
+        # the same wrapper comes back while it's in use, and the cache keeps
+        # no widget alive
+        wrapped = self.python('''
+import gc, json, sys, weakref
+sys.path.insert(0, %r)
+from Qt import QtCompat, QtWidgets
+app = QtWidgets.QApplication([])
+window = QtWidgets.QMainWindow()
+pointer = QtCompat.getCppPointer(window)
+same = QtCompat.wrapInstance(pointer) is QtCompat.wrapInstance(pointer)
+widget = QtWidgets.QWidget()
+QtCompat.wrapInstance(QtCompat.getCppPointer(widget), QtWidgets.QWidget)
+reference = weakref.ref(widget)
+del widget
+gc.collect()
+json.dump({'same': same, 'released': reference() is None}, sys.stdout)
+''' % ROOT)
+        self.assertEqual(wrapped, {'same': True, 'released': True})
+
+    def testTranslate(self):
+        # translations are cached until a translator comes or goes, without
+        # touching the binding's QCoreApplication
+        translated = self.python('''
+import json, sys
+sys.path.insert(0, %r)
+import Qt
+from Qt import QtCompat, QtCore
+app = QtCore.QCoreApplication([])
+
+
+class Translator(QtCore.QTranslator):
+    def isEmpty(self):
+        return False
+
+    def translate(self, context, sourceText, disambiguation=None, n=-1):
+        return 'hej'
+
+
+results = [QtCompat.translate('form', 'hello', None, -1), QtCompat.translate('form', 'hello', None, -1),
+           len(Qt._translations)]
+translator = Translator()
+QtCore.QCoreApplication.installTranslator(translator)
+results.append(QtCompat.translate('form', 'hello', None, -1))
+QtCore.QCoreApplication.removeTranslator(translator)
+results.append(QtCompat.translate('form', 'hello', None, -1))
+results.append(getattr(QtCore.QCoreApplication.installTranslator, '__module__', None) == 'Qt')
+json.dump(results, sys.stdout)
+''' % ROOT)
+        self.assertEqual(translated, ['hello', 'hello', 1, 'hej', 'hello', False])
+
+    def testLoadUi(self):
+        # a compiled .ui gives the base instance its child widgets like the
+        # binding's own loader does, with PySide a layout called "layout"
+        # doesn't hide layout()
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'form.ui')
+            with open(path, 'w') as f:
+                f.write(FORM)
+            loaded = self.python('''
+import json, sys
+sys.path.insert(0, %r)
+import Qt
+from Qt import QtCompat, QtWidgets
+app = QtWidgets.QApplication([])
+results = []
+for i in range(2):
+    base = QtWidgets.QWidget()
+    QtCompat.loadUi(%r, base)
+    # PyQt's own loadUi sets an attribute for every object, layouts too
+    layout = base.layout if Qt.__binding__.startswith('PyQt') else base.layout()
+    results.append({'button': isinstance(base.button, QtWidgets.QPushButton),
+                    'layout': isinstance(layout, QtWidgets.QVBoxLayout)})
+json.dump(results, sys.stdout)
+''' % (ROOT, path))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(loaded, [{'button': True, 'layout': True}] * 2)
+
+    def testLoadUiNoForm(self):
+        # a .ui file without a form says so, naming the file
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'empty.ui')
+            with open(path, 'w') as f:
+                f.write(EMPTY_FORM)
+            error = self.python('''
+import json, sys
+sys.path.insert(0, %r)
+from Qt import QtCompat, QtWidgets
+app = QtWidgets.QApplication([])
+try:
+    QtCompat.loadUi(%r)
+except ValueError as e:
+    json.dump(str(e), sys.stdout)
+''' % (ROOT, path))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(error, '%s has no top-level form' % path)
+
+
+FORM = '''<?xml version="1.0" encoding="UTF-8"?>
+<ui version="4.0">
+ <class>Form</class>
+ <widget class="QWidget" name="Form">
+  <layout class="QVBoxLayout" name="layout">
+   <item>
+    <widget class="QPushButton" name="button">
+     <property name="text">
+      <string>Press</string>
+     </property>
+    </widget>
+   </item>
+  </layout>
+ </widget>
+ <resources/>
+ <connections/>
+</ui>
+'''
+
+EMPTY_FORM = '''<?xml version="1.0" encoding="UTF-8"?>
+<ui version="4.0">
+ <class>Form</class>
+ <resources/>
+ <connections/>
+</ui>
+'''
+
+
+if __name__ == '__main__':
+    unittest.main()